@@ -25,6 +25,7 @@ class EmoRand(EmotionPlugin):
     name = 'emotion-random'
     author = '@balkian'
     version = '0.1'
+    cacheable = False
     url = "https://github.com/gsi-upm/senpy-plugins-community"
     onyx__usesEmotionModel = "emoml:big6"
 
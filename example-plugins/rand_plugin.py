@@ -23,6 +23,7 @@ class RandSent(SentimentPlugin):
     name = 'sentiment-random'
     author = "@balkian"
     version = '0.1'
+    cacheable = False
     url = "https://github.com/gsi-upm/senpy-plugins-community"
     marl__maxPolarityValue = '1'
     marl__minPolarityValue = "-1"
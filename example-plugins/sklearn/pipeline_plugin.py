@@ -14,23 +14,22 @@
 #    limitations under the License.
 #
 
-from senpy import SentimentBox, easy_test
+from senpy import SklearnBox, SentimentBox, easy_test
 
 from mypipeline import pipeline
 
 
-class PipelineSentiment(SentimentBox):
+class PipelineSentiment(SklearnBox, SentimentBox):
     '''This is a pipeline plugin that wraps a classifier defined in another module
 (mypipeline).'''
     author = '@balkian'
     version = 0.1
     maxPolarityValue = 1
     minPolarityValue = -1
+    labels = {1: 'marl:Positive', -1: 'marl:Negative'}
 
-    def predict_one(self, features, **kwargs):
-        if pipeline.predict(features) > 0:
-            return [1, 0, 0]
-        return [0, 0, 1]
+    def activate(self):
+        self.estimator = pipeline
 
     test_cases = [
         {
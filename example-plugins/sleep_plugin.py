@@ -22,6 +22,7 @@ class Sleep(AnalysisPlugin):
     '''Dummy plugin to test async'''
     author = "@balkian"
     version = "0.2"
+    cacheable = False
     timeout = 0.05
     extra_params = {
         "timeout": {
@@ -23,7 +23,7 @@ from flask import Flask
 from senpy.extensions import Senpy
 from senpy.utils import easy_test
 from senpy.plugins import list_dependencies
-from senpy import config
+from senpy import config, server
 
 import logging
 import os
@@ -120,6 +120,83 @@ def main():
         action='store_true',
         default=False,
         help='Run a single-threaded server')
+    parser.add_argument(
+        '--processes',
+        type=int,
+        default=config.processes,
+        help=('Number of processes used to analyse the entries of a request with '
+              'parallel plugins. It can be set with the SENPY_PROCESSES environment '
+              'variable as well.'))
+    parser.add_argument(
+        '--cache-size',
+        type=int,
+        default=config.cache_size,
+        help=('Maximum number of annotated entries kept in the cache (0 to disable). '
+              'It can be set with the SENPY_CACHE_SIZE environment variable as well.'))
+    parser.add_argument(
+        '--cache-bytes',
+        type=int,
+        default=config.cache_bytes,
+        help=('Maximum size of the cache, in bytes (0 for no limit). '
+              'It can be set with the SENPY_CACHE_BYTES environment variable as well.'))
+    parser.add_argument(
+        '--disk-cache',
+        action='store_true',
+        default=config.disk_cache,
+        help=('Keep a persistent cache of annotations in the data folder, shared by all the '
+              'workers. It can be set with the SENPY_DISK_CACHE environment variable as well.'))
+    parser.add_argument(
+        '--cache-ttl',
+        type=int,
+        default=config.cache_ttl,
+        help=('Seconds before an element of the persistent cache expires (0 to disable). '
+              'It can be set with the SENPY_CACHE_TTL environment variable as well.'))
+    parser.add_argument(
+        '--job-workers',
+        type=int,
+        default=config.job_workers,
+        help=('Number of threads that run asynchronous jobs (0 to disable). Jobs are '
+              'disabled if there are several server processes (see --workers). '
+              'It can be set with the SENPY_JOB_WORKERS environment variable as well.'))
+    parser.add_argument(
+        '--max-jobs',
+        type=int,
+        default=config.max_jobs,
+        help=('Maximum number of jobs waiting in the queue. '
+              'It can be set with the SENPY_MAX_JOBS environment variable as well.'))
+    parser.add_argument(
+        '--activation-workers',
+        type=int,
+        default=config.activation_workers,
+        help=('Number of threads that activate plugins at startup. '
+              'It can be set with the SENPY_ACTIVATION_WORKERS environment variable as well.'))
+    parser.add_argument(
+        '--lazy',
+        action='store_true',
+        default=config.lazy,
+        help=('Activate analysis plugins the first time they are used. '
+              'It can be set with the SENPY_LAZY environment variable as well.'))
+    parser.add_argument(
+        '--idle-timeout',
+        type=int,
+        default=config.idle_timeout,
+        help=('Seconds before an unused plugin is deactivated (0 to disable). '
+              'It can be set with the SENPY_IDLE_TIMEOUT environment variable as well.'))
+    parser.add_argument(
+        '--memory-budget',
+        type=int,
+        default=config.memory_budget,
+        help=('Maximum memory (in bytes) of the activated plugins. The least recently '
+              'used plugins are deactivated when it is exceeded (0 to disable). '
+              'It can be set with the SENPY_MEMORY_BUDGET environment variable as well.'))
+    parser.add_argument(
+        '--workers',
+        '-w',
+        type=int,
+        default=config.workers,
+        help=('Number of server processes. They are forked once the plugins are activated, '
+              'so they share their memory. '
+              'It can be set with the SENPY_WORKERS environment variable as well.'))
     parser.add_argument(
         '--no-deps',
         '-n',
@@ -159,12 +236,30 @@ def main():
     app = Flask(__name__)
     app.debug = args.debug
 
+    job_workers = args.job_workers
+    if args.workers > 1 and job_workers:
+        # Every worker would have its own jobs, and the requests about a job may reach
+        # any of them (see senpy.server)
+        logging.warning('Asynchronous jobs are disabled with several workers')
+        job_workers = 0
+
     sp = Senpy(app,
                plugin_folder=None,
                default_plugins=not args.no_default_plugins,
                install=args.install,
                strict=args.strict,
-               data_folder=args.data_folder)
+               data_folder=args.data_folder,
+               processes=args.processes,
+               cache_size=args.cache_size,
+               cache_bytes=args.cache_bytes,
+               disk_cache=args.disk_cache,
+               cache_ttl=args.cache_ttl,
+               job_workers=job_workers,
+               max_jobs=args.max_jobs,
+               activation_workers=args.activation_workers,
+               lazy=args.lazy,
+               idle_timeout=args.idle_timeout,
+               memory_budget=args.memory_budget)
     folders = list(args.plugins_folder) if args.plugins_folder else []
     if not folders:
         folders.append(".")
@@ -216,7 +311,15 @@ def main():
         return
 
     sp.activate_all(sync=True)
-    if sp.strict:
+    report = sp.activation_report()
+    if report:
+        print('Activation times:')
+        for stats in report:
+            print('\t{: <{maxname}} {: >8.2f}s {: >10.1f} MiB'.format(stats['plugin'],
+                                                                     stats['time'],
+                                                                     stats['memory'] / 2**20,
+                                                                     maxname=maxname))
+    if sp.strict and not sp.lazy:
         inactive = sp.plugins(is_activated=False)
         assert not inactive
 
@@ -232,10 +335,17 @@ def main():
         app.wsgi_app = ProxyFix(app.wsgi_app)
 
     try:
-        app.run(args.host,
-                args.port,
-                threaded=not args.no_threaded,
-                debug=app.debug)
+        if args.workers > 1:
+            server.serve(app,
+                         args.host,
+                         args.port,
+                         workers=args.workers,
+                         threaded=not args.no_threaded)
+        else:
+            app.run(args.host,
+                    args.port,
+                    threaded=not args.no_threaded,
+                    debug=app.debug)
     except KeyboardInterrupt:
         print('Bye!')
     sp.deactivate_all()
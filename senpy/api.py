@@ -15,8 +15,12 @@
 #
 
 from future.utils import iteritems
-from .models import Error, Results, Entry, from_string
+from collections import OrderedDict
+from .models import Error, Results, Entry, from_string, from_dict
+import codecs
+import json
 import logging
+import threading
 logger = logging.getLogger(__name__)
 
 boolean = [True, False]
@@ -56,9 +60,10 @@ API_PARAMS = {
         "default": "json-ld",
         "description": """The data can be semantically formatted (JSON-LD, turtle or n-triples),
 given as a list of comma-separated fields (see the fields option) or constructed from a Jinja2
-template (see the template option).""",
+template (see the template option).
+With ndjson, the entries are streamed one per line, after a line with the rest of the results.""",
         "required": True,
-        "options": ["json-ld", "turtle", "ntriples"],
+        "options": ["json-ld", "turtle", "ntriples", "ndjson"],
     },
     "template": {
         "@id": "template",
@@ -190,6 +195,30 @@ PLUGINS_PARAMS = {
     }
 }
 
+JOB_PARAMS = {
+    "task": {
+        "@id": "task",
+        "aliases": ["job-type", "job_type"],
+        "description": "What the job should do",
+        "required": True,
+        "default": "analysis",
+        "options": ["analysis", "evaluation"],
+    },
+    "page": {
+        "@id": "page",
+        "description": ("Get a page of the results of a job (starting from 0), "
+                        "instead of the state of the job"),
+        "required": False,
+    },
+    "page-size": {
+        "@id": "pageSize",
+        "aliases": ["page_size", "pageSize"],
+        "description": "Number of entries in a page of results",
+        "required": True,
+        "default": 100,
+    },
+}
+
 WEB_PARAMS = {
     "in-headers": {
         "aliases": ["headers", "inheaders", "inHeaders", "in-headers", "in_headers"],
@@ -198,6 +227,12 @@ WEB_PARAMS = {
         "default": False,
         "options": boolean
     },
+    "compact": {
+        "description": "Do not indent or sort the JSON output",
+        "required": True,
+        "default": False,
+        "options": boolean
+    },
 }
 
 CLI_PARAMS = {
@@ -258,49 +293,135 @@ BUILTIN_PARAMS = {}
 
 for d in [
         NIF_PARAMS, CLI_PARAMS, WEB_PARAMS, PLUGINS_PARAMS, EVAL_PARAMS,
-        API_PARAMS
+        API_PARAMS, JOB_PARAMS
 ]:
     for k, v in d.items():
         BUILTIN_PARAMS[k] = v
 
 
+class ParamSpec(object):
+    '''
+    A compiled set of parameter specifications.
+
+    The aliases, defaults, processors and valid options of every parameter are
+    resolved once, so parsing a call only has to look at the values that were supplied.
+    Specifications are compiled the first time they are used (see `compile_params`),
+    so they should not be modified afterwards.
+    '''
+
+    def __init__(self, *specs):
+        self.specs = specs
+        self.params = []
+        self.aliases = {}
+        for spec in specs:
+            for param, options in iteritems(spec):
+                aliases = [alias for alias in options.get('aliases', []) if alias != param]
+                for alias in aliases:
+                    self.aliases.setdefault(alias, set()).add(len(self.params))
+                processor = options.get('processor', None)
+                if processor:
+                    processor = processors[processor]
+                valid = options.get('options', None)
+                isboolean = valid == boolean
+                if valid is not None and not isboolean:
+                    try:
+                        valid = frozenset(valid)
+                    except TypeError:
+                        pass
+                self.params.append((param, aliases, 'default' in options,
+                                    options.get('default', None),
+                                    options.get('required', False),
+                                    processor, valid, isboolean, spec[param]))
+
+    def parse(self, indict):
+        outdict = indict.copy()
+        wrong_params = {}
+        renamed = set()
+        for k in indict:
+            if k in self.aliases:
+                renamed.update(self.aliases[k])
+        for ix, (param, aliases, hasdefault, default, required,
+                 processor, valid, isboolean, spec) in enumerate(self.params):
+            if ix in renamed:
+                for alias in aliases:
+                    # Replace each alias with the correct name of the parameter
+                    if alias in indict:
+                        outdict[param] = indict[alias]
+                        outdict.pop(alias, None)
+                        break
+            if param not in outdict:
+                if hasdefault:
+                    # We assume the default is correct
+                    outdict[param] = default
+                elif required:
+                    wrong_params[param] = spec
+                continue
+            if processor:
+                outdict[param] = processor(outdict[param])
+            if isboolean:
+                outdict[param] = str(outdict[param]).lower() in ['true', '1', '']
+            elif valid is not None:
+                try:
+                    ok = outdict[param] in valid
+                except TypeError:  # Unhashable value
+                    ok = False
+                if not ok:
+                    wrong_params[param] = spec
+        if wrong_params:
+            logger.debug("Error parsing: %s", wrong_params)
+            message = Error(
+                status=400,
+                message='Missing or invalid parameters',
+                parameters=outdict,
+                errors=wrong_params)
+            raise message
+        return outdict
+
+
+class _LRU(object):
+    '''
+    A small LRU of objects built from a tuple of other objects (e.g. specs or plugins),
+    indexed by their identity. The keys are kept alive, so their ids are not reused.
+    '''
+
+    def __init__(self, factory, size=128):
+        self.factory = factory
+        self.size = size
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, objs):
+        key = tuple(id(obj) for obj in objs)
+        with self._lock:
+            found = self._data.get(key, None)
+            if found is not None and all(a is b for a, b in zip(found[0], objs)):
+                self._data.move_to_end(key)
+                return found[1]
+        value = self.factory(*objs)
+        with self._lock:
+            self._data[key] = (tuple(objs), value)
+            while len(self._data) > self.size:
+                self._data.popitem(last=False)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+_compiled_params = _LRU(ParamSpec, size=256)
+
+
+def compile_params(*specs):
+    '''Get the compiled version of a list of specifications'''
+    return _compiled_params.get(specs)
+
+
 def parse_params(indict, *specs):
     if not specs:
         specs = [NIF_PARAMS]
     logger.debug("Parsing: {}\n{}".format(indict, specs))
-    outdict = indict.copy()
-    wrong_params = {}
-    for spec in specs:
-        for param, options in iteritems(spec):
-            for alias in options.get("aliases", []):
-                # Replace each alias with the correct name of the parameter
-                if alias in indict and alias != param:
-                    outdict[param] = indict[alias]
-                    del outdict[alias]
-                    break
-            if param not in outdict:
-                if "default" in options:
-                    # We assume the default is correct
-                    outdict[param] = options["default"]
-                elif options.get("required", False):
-                    wrong_params[param] = spec[param]
-                continue
-            if 'processor' in options:
-                outdict[param] = processors[options['processor']](outdict[param])
-            if "options" in options:
-                if options["options"] == boolean:
-                    outdict[param] = str(outdict[param]).lower() in ['true', '1', '']
-                elif outdict[param] not in options["options"]:
-                    wrong_params[param] = spec[param]
-    if wrong_params:
-        logger.debug("Error parsing: %s", wrong_params)
-        message = Error(
-            status=400,
-            message='Missing or invalid parameters',
-            parameters=outdict,
-            errors=wrong_params)
-        raise message
-    return outdict
+    return compile_params(*specs).parse(indict)
 
 
 def get_all_params(plugins, *specs):
@@ -314,6 +435,11 @@ def get_all_params(plugins, *specs):
 
 def get_extra_params(plugins):
     '''Get a list of possible parameters given a list of plugins'''
+    return dict(request_plan(plugins).extra_params)
+
+
+def _resolve_extra_params(plugins):
+    '''Merge the parameters of several plugins, resolving their conflicts'''
     params = {}
     extra_params = {}
     for plugin in plugins:
@@ -362,20 +488,79 @@ def get_extra_params(plugins):
     return params
 
 
+class AnalysisPlan(list):
+    '''
+    A list of analyses, which also knows which of them are independent.
+
+    Consecutive analyses whose plugins only append annotations (i.e., they do not modify
+    the entries nor read the annotations from other plugins) are grouped in the same stage,
+    and they can be run concurrently. Any other analysis (e.g., a transformation like
+    split) is a stage of its own, so the order of the chain is kept.
+    '''
+
+    @property
+    def stages(self):
+        stages = []
+        for analysis in self:
+            if stages and _independent(analysis) and _independent(stages[-1][0]):
+                stages[-1].append(analysis)
+            else:
+                stages.append([analysis])
+        return stages
+
+
+def _independent(analysis):
+    plugin = analysis.plugin
+    streams = getattr(plugin, 'streams', None)
+    return bool(getattr(plugin, 'only_annotates', False) and streams and streams())
+
+
+class RequestPlan(object):
+    '''
+    The compiled parameter specifications of a chain of plugins.
+    Plans are cached (see `request_plan`), so requests that use the same plugins
+    do not need to compile them again.
+    '''
+
+    def __init__(self, *plugins):
+        self.plugins = plugins
+        self.specs = [compile_params(plugin.get('extra_params', {})) if plugin else None
+                      for plugin in plugins]
+        self._extra_params = None
+
+    @property
+    def extra_params(self):
+        if self._extra_params is None:
+            self._extra_params = _resolve_extra_params(self.plugins)
+        return self._extra_params
+
+    def analyses(self, params):
+        analysis_list = AnalysisPlan()
+        for i, (plugin, spec) in enumerate(zip(self.plugins, self.specs)):
+            if not plugin:
+                continue
+            this_params = filter_params(params, plugin, i)
+            parsed = spec.parse(this_params)
+            analysis = plugin.activity(parsed)
+            analysis_list.append(analysis)
+        return analysis_list
+
+
+_request_plans = _LRU(RequestPlan)
+
+
+def request_plan(plugins):
+    '''Get the (cached) plan for a list of plugins'''
+    return _request_plans.get(tuple(plugins))
+
+
 def parse_analyses(params, plugins):
     '''
     Parse the given parameters individually for each plugin, and get a list of the parameters that
     belong to each of the plugins. Each item can then be used in the plugin.analyse_entries method.
+    The result is an AnalysisPlan.
     '''
-    analysis_list = []
-    for i, plugin in enumerate(plugins):
-        if not plugin:
-            continue
-        this_params = filter_params(params, plugin, i)
-        parsed = parse_params(this_params, plugin.get('extra_params', {}))
-        analysis = plugin.activity(parsed)
-        analysis_list.append(analysis)
-    return analysis_list
+    return request_plan(plugins).analyses(params)
 
 
 def filter_params(params, plugin, ith=-1):
@@ -423,3 +608,107 @@ def parse_call(params):
             params['informat']))
     results.parameters = params
     return results
+
+
+BULK_FORMATS = {
+    'application/json': 'json',
+    'application/x-ndjson': 'ndjson',
+    'application/jsonl': 'ndjson',
+    'text/plain': 'text',
+}
+
+
+def read_bulk(stream, mimetype=None, read_size=1 << 16):
+    '''
+    Read the entries of a bulk request from a (binary) stream, incrementally.
+
+    The body may be a JSON array of texts or entries (``application/json``), one JSON text
+    or entry per line (``application/x-ndjson``), or one text per line (``text/plain``).
+    The format is guessed from the first character if the mimetype is not known.
+    '''
+    fmt = BULK_FORMATS.get(mimetype, None)
+    first = b''
+    if fmt is None:
+        first = stream.read(1)
+        while first.isspace():
+            first = stream.read(1)
+        fmt = 'json' if first == b'[' else 'ndjson'
+    if fmt == 'json':
+        items = _json_items(stream, first, read_size)
+    else:
+        items = _lines(stream, first, fmt == 'ndjson')
+    for ix, item in enumerate(items):
+        yield _bulk_entry(item, ix)
+
+
+def _bulk_entry(item, ix):
+    if isinstance(item, dict):
+        entry = from_dict(item, cls=Entry)
+    else:
+        entry = Entry(nif__isString=str(item))
+    if '@id' not in entry:
+        entry.id = 'prefix:entry{}'.format(ix)
+    return entry
+
+
+def _lines(stream, first, parse):
+    decoder = codecs.getincrementaldecoder('utf-8')()
+    lines = iter(stream.readline, b'')
+    if first:
+        lines = _prepend(first + stream.readline(), lines)
+    for line in lines:
+        line = decoder.decode(line).strip()
+        if not line:
+            continue
+        if parse and line[0] in '{"':
+            try:
+                line = json.loads(line)
+            except ValueError:
+                raise Error('Invalid JSON line in bulk request: {}'.format(line), status=400)
+        yield line
+
+
+def _prepend(first, rest):
+    yield first
+    for i in rest:
+        yield i
+
+
+def _json_items(stream, first, read_size):
+    '''Decode the items of a JSON array, one at a time'''
+    decoder = json.JSONDecoder()
+    text = codecs.getincrementaldecoder('utf-8')()
+    buf = text.decode(first)
+    pos = 0
+    started = False
+    eof = False
+    while True:
+        while pos < len(buf) and (buf[pos].isspace() or (started and buf[pos] == ',')):
+            pos += 1
+        if pos < len(buf):
+            if not started:
+                if buf[pos] != '[':
+                    raise Error('The body of a bulk request should be a JSON array',
+                                status=400)
+                started = True
+                pos += 1
+                continue
+            if buf[pos] == ']':
+                return
+            try:
+                item, end = decoder.raw_decode(buf, pos)
+            except ValueError:
+                if eof:
+                    raise Error('Invalid JSON in bulk request', status=400)
+            else:
+                # Numbers at the end of the buffer may be incomplete
+                if end < len(buf) or eof:
+                    yield item
+                    pos = end
+                    continue
+        if eof:
+            raise Error('Unterminated JSON array in bulk request', status=400)
+        data = stream.read(read_size)
+        eof = not data
+        buf = buf[pos:] + text.decode(data, final=eof)
+        pos = 0
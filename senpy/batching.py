@@ -0,0 +1,146 @@
+#
+#    Copyright 2014 Grupo de Sistemas Inteligentes (GSI) DIT, UPM
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#    limitations under the License.
+#
+'''
+Dynamic batching of the predictions of black box plugins.
+
+Under heavy traffic of small requests, each call to ``predict_many`` gets very few
+features, which wastes vectorised models. A scheduler gathers the features of concurrent
+requests (with the same parameters) and sends them to ``predict_many`` together.
+
+A batch is sent when it is full, or when its first features have waited ``max_wait``
+seconds. If a ``target_latency`` is given, the size of the batches is tuned so that
+every call to ``predict_many`` takes about that time.
+'''
+from concurrent.futures import Future
+
+import os
+import queue
+import threading
+import time
+import logging
+
+from . import cache
+
+logger = logging.getLogger(__name__)
+
+
+class BatchScheduler(object):
+    '''
+    Send the features of concurrent requests to a plugin in shared batches.
+    '''
+
+    def __init__(self, plugin, max_batch_size=256, max_wait=0.005, target_latency=None):
+        self.plugin = plugin
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.target_latency = target_latency
+        self.batch_size = max_batch_size
+        self.batches = 0
+        # Moving average of the time it takes to predict a single element
+        self.item_latency = None
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+        self._queue = None
+
+    def predict(self, features, activity):
+        '''Get the predictions for a list of features. It blocks until they are ready.'''
+        if not features:
+            return []
+        future = Future()
+        self._start()
+        self._queue.put((cache.analysis_key(activity), activity, features, future))
+        return future.result()
+
+    def close(self):
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid():
+                self._queue.put(None)
+                self._thread.join()
+            self._thread = None
+
+    def _start(self):
+        with self._lock:
+            # Threads do not survive a fork, so forked processes need their own
+            if self._thread is None or self._pid != os.getpid():
+                self._queue = queue.Queue()
+                self._pid = os.getpid()
+                self._thread = threading.Thread(target=self._run,
+                                                args=(self._queue, ),
+                                                name='senpy-batch-{}'.format(self.plugin.name),
+                                                daemon=True)
+                self._thread.start()
+
+    def _run(self, pending):
+        while True:
+            item = pending.get()
+            if item is None:
+                return
+            batch = [item]
+            size = len(item[2])
+            deadline = time.monotonic() + self.max_wait
+            while size < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = pending.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if item is None:
+                    pending.put(None)
+                    break
+                batch.append(item)
+                size += len(item[2])
+            groups = {}
+            for item in batch:
+                groups.setdefault(item[0], []).append(item)
+            for group in groups.values():
+                self._predict(group)
+
+    def _predict(self, group):
+        activity = group[0][1]
+        features = []
+        for (_, _, feats, _) in group:
+            features.extend(feats)
+        try:
+            results = []
+            for start in range(0, len(features), self.batch_size):
+                chunk = features[start:start + self.batch_size]
+                before = time.monotonic()
+                results.extend(self.plugin.predict_many(features=chunk, activity=activity))
+                self._tune(len(chunk), time.monotonic() - before)
+        except Exception as ex:
+            for (_, _, _, future) in group:
+                future.set_exception(ex)
+            return
+        offset = 0
+        for (_, _, feats, future) in group:
+            future.set_result(results[offset:offset + len(feats)])
+            offset += len(feats)
+
+    def _tune(self, size, latency):
+        self.batches += 1
+        if not self.target_latency:
+            return
+        latency = latency / size
+        if self.item_latency is None:
+            self.item_latency = latency
+        else:
+            self.item_latency = 0.8 * self.item_latency + 0.2 * latency
+        if self.item_latency > 0:
+            size = int(self.target_latency / self.item_latency)
+            self.batch_size = max(1, min(self.max_batch_size, size))
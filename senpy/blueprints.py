@@ -20,7 +20,8 @@ Blueprints for Senpy
 """
 from flask import (Blueprint, request, current_app, render_template, url_for,
                    jsonify, redirect)
-from .models import Error, Response, Help, Plugins, read_schema, dump_schema, Datasets
+from .models import (Error, Response, Help, Plugins, Results, read_schema, dump_schema,
+                     Datasets)
 from . import api
 from .version import __version__
 from functools import wraps
@@ -40,6 +41,7 @@ ns_blueprint = Blueprint("ns", __name__)
 _mimetypes_r = {'json-ld': ['application/ld+json'],
                 'turtle': ['text/turtle'],
                 'ntriples': ['application/n-triples'],
+                'ndjson': ['application/x-ndjson'],
                 'text': ['text/plain']}
 
 MIMETYPES = {}
@@ -58,8 +60,10 @@ DEFAULT_FORMAT = 'json-ld'
 
 def get_params(req):
     if req.method == 'POST':
-        indict = req.form.to_dict(flat=True)
-    elif req.method == 'GET':
+        # Bulk requests use the body for the entries, so their parameters go in the URL
+        indict = req.args.to_dict(flat=True)
+        indict.update(req.form.to_dict(flat=True))
+    elif req.method in ['GET', 'DELETE']:
         indict = req.args.to_dict(flat=True)
     else:
         raise Error(message="Invalid data")
@@ -131,6 +135,21 @@ def schema(schema="definitions"):
         return Error(message="Schema not found: {}".format(ex), status=404).flask()
 
 
+def _explicit(raw_params, param, spec=api.API_PARAMS):
+    '''Whether a parameter was given in a request, instead of taking its default value'''
+    names = [param] + spec[param].get('aliases', [])
+    return any(name in raw_params for name in names)
+
+
+def streaming(params):
+    '''
+    Whether the entries of a response should be streamed, instead of collected in the results.
+    The streamed entries go in the `_stream` attribute of the response.
+    '''
+    return (params.get('outformat') in ('ndjson', 'turtle', 'ntriples') and
+            not params.get('template') and not params.get('fields'))
+
+
 def basic_api(f):
     default_params = {
         'in-headers': False,
@@ -157,6 +176,8 @@ def basic_api(f):
         try:
             params = api.parse_params(raw_params, api.WEB_PARAMS, api.API_PARAMS)
             outformat = params.get('outformat', mimeformat)
+            if mimeformat == 'ndjson' and not _explicit(raw_params, 'outformat'):
+                outformat = params['outformat'] = mimeformat
             if hasattr(request, 'parameters'):
                 request.parameters.update(params)
             else:
@@ -181,10 +202,12 @@ def basic_api(f):
                                     _external=True),
                 outformat=outformat,
                 expanded=params['expanded-jsonld'],
+                compact=params['compact'],
                 template=params.get('template'),
                 verbose=params['verbose'],
                 aliases=params['aliases'],
-                fields=params.get('fields'))
+                fields=params.get('fields'),
+                entries=getattr(response, '_stream', None))
 
         except (Exception) as ex:
             if current_app.debug or current_app.config['TESTING']:
@@ -236,10 +259,84 @@ def api_root(plugins):
         return response
     req = api.parse_call(request.parameters)
     analyses = api.parse_analyses(req.parameters, plugins)
+    if streaming(request.parameters):
+        req._stream = current_app.senpy.stream(req, analyses)
+        return req
     results = current_app.senpy.analyse(req, analyses)
     return results
 
 
+@api_blueprint.route('/bulk', methods=['POST'], strict_slashes=False)
+@basic_api
+def bulk():
+    '''
+    Analyse many texts or entries in a single call.
+    The body is read incrementally, and analysed in chunks (see `api.read_bulk`).
+    '''
+    sp = current_app.senpy
+    plugins = sp.get_plugins(request.parameters['algorithm'])
+    analyses = api.parse_analyses(request.parameters, plugins)
+    entries = api.read_bulk(request.stream, request.mimetype)
+    results = Results()
+    results.parameters = request.parameters
+    results.activities = list(analyses)
+    chunks = sp.analyse_bulk(entries, request.parameters, analyses)
+    entries = (entry for chunk in chunks for entry in chunk.entries)
+    if streaming(request.parameters):
+        results._stream = entries
+    else:
+        results.entries = list(entries)
+    return results
+
+
+@api_blueprint.route('/jobs', methods=['POST'], strict_slashes=False)
+@basic_api
+def submit_job():
+    '''
+    Run an analysis or an evaluation in the background.
+    The entries to analyse are taken from the input parameter or, if it is missing,
+    from the body of the request (as in a bulk request).
+    '''
+    sp = current_app.senpy
+    params = api.parse_params(request.parameters, api.JOB_PARAMS)
+    if params['task'] == 'evaluation':
+        return sp.jobs.evaluate(api.parse_params(params, api.EVAL_PARAMS))
+    plugins = sp.get_plugins(params['algorithm'])
+    if _explicit(params, 'input', api.NIF_PARAMS):
+        req = api.parse_call(params)
+        analyses = api.parse_analyses(req.parameters, plugins)
+        return sp.jobs.analyse(req, analyses)
+    req = Results()
+    req.parameters = params
+    analyses = api.parse_analyses(params, plugins)
+    return sp.jobs.analyse(req, analyses, body=request.stream, mimetype=request.mimetype)
+
+
+@api_blueprint.route('/jobs/<job>', methods=['GET', 'DELETE'], strict_slashes=False)
+@basic_api
+def job(job):
+    '''
+    Get the state of a job or, if a page is given, a page of its results.
+    Jobs are cancelled with DELETE.
+    '''
+    sp = current_app.senpy
+    if request.method == 'DELETE':
+        return sp.jobs.cancel(job)
+    params = api.parse_params(request.parameters, api.JOB_PARAMS)
+    if params.get('page') is None:
+        return sp.jobs.get(job)
+    try:
+        page = int(params['page'])
+        page_size = int(params['page-size'])
+    except ValueError:
+        raise Error(message='Invalid page: {}'.format(params['page']), status=400)
+    if page < 0:
+        raise Error(message='Invalid page: {}'.format(page), status=400)
+    if page_size <= 0:
+        raise Error(message='Invalid page size: {}'.format(page_size), status=400)
+    return sp.jobs.results(job, page=page, page_size=page_size)
+
+
 @api_blueprint.route('/evaluate', methods=['POST', 'GET'], strict_slashes=False)
 @basic_api
 def evaluate():
@@ -0,0 +1,317 @@
+#
+#    Copyright 2014 Grupo de Sistemas Inteligentes (GSI) DIT, UPM
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#    limitations under the License.
+#
+'''
+Caches for the annotations produced by plugins.
+
+Annotations are indexed by the plugin (including its version), the parameters of
+the analysis and the text of the entry. Only plugins that only append annotations
+(see ``Plugin.only_annotates``) can be cached, and they can opt out by setting
+``cacheable = False`` (e.g., plugins with random outputs).
+'''
+from collections import OrderedDict
+
+import hashlib
+import json
+import os
+import pickle
+import sqlite3
+import threading
+import time
+import logging
+
+from . import models
+
+logger = logging.getLogger(__name__)
+
+
+def is_cacheable(plugin):
+    return bool(getattr(plugin, 'cacheable', True) and
+                getattr(plugin, 'only_annotates', False) and
+                plugin.streams())
+
+
+def analysis_key(analysis):
+    '''The part of the key that depends on the analysis: the plugin and its parameters'''
+    params = json.dumps(analysis.params, sort_keys=True, default=str)
+    return '{}\n{}'.format(analysis.plugin.id, params)
+
+
+def key(prefix, text):
+    '''Key of the annotations for a text, given the key of the analysis (see analysis_key)'''
+    text = hashlib.sha1(str(text).encode('utf-8')).hexdigest()
+    return '{}\n{}'.format(prefix, text)
+
+
+def _plain(value):
+    if hasattr(value, 'serializable'):
+        return value.serializable()
+    return value
+
+
+def _model(value):
+    if isinstance(value, dict):
+        return models.from_dict(value, warn=False)
+    return value
+
+
+def _replace_prov(value, old, new):
+    if isinstance(value, dict):
+        for k, v in value.items():
+            if k == 'prov:wasGeneratedBy' and v == old:
+                value[k] = new
+            else:
+                _replace_prov(v, old, new)
+    elif isinstance(value, list):
+        for v in value:
+            _replace_prov(v, old, new)
+
+
+def snapshot(entry):
+    '''Take note of the annotations in an entry before it is analysed'''
+    return {k: len(v) if isinstance(v, list) else None for k, v in entry.items()}
+
+
+# Fields of an activity that do not depend on the analysis of the entries
+_ACTIVITY_KEYS = ('@id', '@type', 'prov:used', 'prov:wasAssociatedWith')
+
+
+def dumps(entry, before, activity):
+    '''
+    Encode the annotations added to an entry since its snapshot was taken, and the
+    fields that the plugin added to its activity (e.g. polarity ranges).
+    '''
+    annotations = {}
+    for k, v in entry.items():
+        if k not in before:
+            annotations[k] = _plain(v)
+        elif isinstance(v, list) and before[k] is not None and len(v) > before[k]:
+            annotations[k] = [_plain(i) for i in v[before[k]:]]
+    info = {k: _plain(v) for k, v in activity.items() if k not in _ACTIVITY_KEYS}
+    return pickle.dumps((activity.id, annotations, info), protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def loads(data, entry, activity):
+    '''
+    Add the annotations encoded with `dumps` to an entry.
+    The annotations are new objects, and they are linked to the given activity.
+    The fields of the original activity are added to the activity, unless it has them.
+    '''
+    decoded = pickle.loads(data)
+    old, annotations = decoded[:2]
+    # Elements stored by previous versions do not include the activity
+    info = decoded[2] if len(decoded) > 2 else {}
+    _replace_prov(annotations, old, activity.id)
+    for k, v in annotations.items():
+        if isinstance(v, list) and isinstance(entry.get(k, None), list):
+            entry[k].extend(_model(i) for i in v)
+        elif isinstance(v, list):
+            entry[k] = [_model(i) for i in v]
+        else:
+            entry[k] = _model(v)
+    for k, v in info.items():
+        if k not in activity:
+            activity[k] = _model(v)
+    return entry
+
+
+class MemoryCache(object):
+    '''
+    An in-memory LRU cache, bounded by number of elements and size (in bytes).
+    '''
+
+    def __init__(self, max_entries=10000, max_bytes=None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.size = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            value = self._data.get(key, None)
+            if value is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._data.move_to_end(key)
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            if key in self._data:
+                self.size -= len(self._data.pop(key))
+            self._data[key] = value
+            self.size += len(value)
+            while self._data and ((self.max_entries and len(self._data) > self.max_entries) or
+                                  (self.max_bytes and self.size > self.max_bytes)):
+                _, evicted = self._data.popitem(last=False)
+                self.size -= len(evicted)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.size = 0
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self):
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'entries': len(self._data),
+            'bytes': self.size,
+        }
+
+
+class SQLiteCache(object):
+    '''
+    A persistent cache, stored in an SQLite database.
+
+    The database can be shared by several processes (e.g., gunicorn workers),
+    and it survives restarts. Elements older than `ttl` seconds are ignored,
+    and the least recently used elements are evicted when the database grows
+    over `max_entries` elements or `max_bytes` bytes.
+    '''
+
+    # Check the limits of the cache after this number of insertions
+    evict_every = 1000
+
+    def __init__(self, path, max_entries=1000000, max_bytes=None, ttl=None):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._puts = 0
+        self._local = threading.local()
+        with self._connection() as conn:
+            conn.execute('CREATE TABLE IF NOT EXISTS annotations ('
+                         ' key TEXT PRIMARY KEY,'
+                         ' value BLOB NOT NULL,'
+                         ' created REAL NOT NULL,'
+                         ' accessed REAL NOT NULL)')
+            conn.execute('CREATE INDEX IF NOT EXISTS annotations_accessed '
+                         'ON annotations (accessed)')
+
+    def _connection(self):
+        '''One connection per thread and process'''
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def get(self, key):
+        now = time.time()
+        conn = self._connection()
+        row = conn.execute('SELECT value, created FROM annotations WHERE key = ?',
+                           (key, )).fetchone()
+        if row is None or (self.ttl and row[1] < now - self.ttl):
+            self.misses += 1
+            return None
+        with conn:
+            conn.execute('UPDATE annotations SET accessed = ? WHERE key = ?', (now, key))
+        self.hits += 1
+        return row[0]
+
+    def put(self, key, value):
+        now = time.time()
+        with self._connection() as conn:
+            conn.execute('INSERT OR REPLACE INTO annotations VALUES (?, ?, ?, ?)',
+                         (key, sqlite3.Binary(value), now, now))
+        self._puts += 1
+        if self._puts % self.evict_every == 0:
+            self.evict()
+
+    def evict(self):
+        '''Remove expired elements, and the least recently used ones over the limits'''
+        with self._connection() as conn:
+            if self.ttl:
+                conn.execute('DELETE FROM annotations WHERE created < ?',
+                             (time.time() - self.ttl, ))
+            if self.max_entries:
+                conn.execute('DELETE FROM annotations WHERE key IN ('
+                             ' SELECT key FROM annotations ORDER BY accessed DESC'
+                             ' LIMIT -1 OFFSET ?)', (self.max_entries, ))
+            if self.max_bytes:
+                conn.execute('DELETE FROM annotations WHERE key IN ('
+                             ' SELECT key FROM ('
+                             '  SELECT key, SUM(LENGTH(value)) OVER'
+                             '   (ORDER BY accessed DESC, key) AS total'
+                             '  FROM annotations)'
+                             ' WHERE total > ?)', (self.max_bytes, ))
+
+    def clear(self):
+        with self._connection() as conn:
+            conn.execute('DELETE FROM annotations')
+
+    def __len__(self):
+        return self._connection().execute('SELECT COUNT(*) FROM annotations').fetchone()[0]
+
+    def stats(self):
+        count, size = self._connection().execute(
+            'SELECT COUNT(*), COALESCE(SUM(LENGTH(value)), 0) FROM annotations').fetchone()
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'entries': count,
+            'bytes': size,
+        }
+
+
+class LayeredCache(object):
+    '''
+    A combination of caches, from the fastest to the slowest (e.g., memory and disk).
+    Elements found in a slow layer are copied to the faster ones.
+    '''
+
+    def __init__(self, *layers):
+        self.layers = layers
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        for ix, layer in enumerate(self.layers):
+            value = layer.get(key)
+            if value is not None:
+                for upper in self.layers[:ix]:
+                    upper.put(key, value)
+                self.hits += 1
+                return value
+        self.misses += 1
+        return None
+
+    def put(self, key, value):
+        for layer in self.layers:
+            layer.put(key, value)
+
+    def clear(self):
+        for layer in self.layers:
+            layer.clear()
+
+    def stats(self):
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'layers': [layer.stats() for layer in self.layers],
+        }
@@ -5,3 +5,18 @@ data_folder = os.environ.get('SENPY_DATA', None)
 if data_folder:
     data_folder = os.path.abspath(data_folder)
 testing = os.environ.get('SENPY_TESTING', "") != ""
+processes = int(os.environ.get('SENPY_PROCESSES', 0))
+cache_size = int(os.environ.get('SENPY_CACHE_SIZE', 0))
+cache_bytes = int(os.environ.get('SENPY_CACHE_BYTES', 0))
+disk_cache = os.environ.get('SENPY_DISK_CACHE', '').lower() not in ["", "false", "f"]
+cache_ttl = int(os.environ.get('SENPY_CACHE_TTL', 0))
+job_workers = int(os.environ.get('SENPY_JOB_WORKERS', 2))
+max_jobs = int(os.environ.get('SENPY_MAX_JOBS', 100))
+job_max_entries = int(os.environ.get('SENPY_JOB_MAX_ENTRIES', 0))
+job_max_time = int(os.environ.get('SENPY_JOB_MAX_TIME', 0))
+activation_workers = int(os.environ.get('SENPY_ACTIVATION_WORKERS', 4))
+lazy = os.environ.get('SENPY_LAZY', '').lower() not in ["", "false", "f"]
+idle_timeout = int(os.environ.get('SENPY_IDLE_TIMEOUT', 0))
+memory_budget = int(os.environ.get('SENPY_MEMORY_BUDGET', 0))
+workers = int(os.environ.get('SENPY_WORKERS', 1))
+template_cache_size = int(os.environ.get('SENPY_TEMPLATE_CACHE_SIZE', 256))
@@ -21,16 +21,21 @@ from future import standard_library
 standard_library.install_aliases()
 
 from . import config
-from . import plugins, api
-from .models import Error, AggregatedEvaluation
+from . import plugins, api, parallel, cache, jobs, residency, isolation
+from .models import Error, AggregatedEvaluation, Results
 from .plugins import AnalysisPlugin
 from .blueprints import api_blueprint, demo_blueprint, ns_blueprint
+from . import utils
 
-from threading import Thread
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from contextlib import nullcontext
+from threading import Lock, Thread
 from functools import partial
 import os
 import copy
+import inspect
 import errno
+import time
 import logging
 
 from . import gsitk_compat
@@ -38,16 +43,75 @@ from . import gsitk_compat
 logger = logging.getLogger(__name__)
 
 
+def _annotation_copy(entry):
+    """
+    Shallow copy of an entry for an analysis that only appends annotations.
+    Annotation lists are empty in the copy, so they only contain the new annotations.
+    """
+    branch = copy.copy(entry)
+    for k, v in entry.items():
+        if isinstance(v, list):
+            branch[k] = []
+    return branch
+
+
+def _per_entry(plugin):
+    '''Whether a plugin processes the entries one by one, with `process_entry`'''
+    return plugin.streams() and type(plugin).process_entries is plugins.Plugin.process_entries
+
+
+def _apply(entry, steps):
+    if not steps:
+        yield entry
+        return
+    plug, activity = steps[0]
+    results = plug.process_entry(entry, activity)
+    if not inspect.isgenerator(results):
+        results = [results]
+    for result in results:
+        for i in _apply(result, steps[1:]):
+            yield i
+
+
+def _fused(entries, steps):
+    '''Pipe each entry through a list of (plugin, activity) steps, in a single pass'''
+    if not steps:
+        return entries
+    return (result for entry in entries for result in _apply(entry, steps))
+
+
+def _merge_annotations(entry, annotated):
+    for k, v in annotated.items():
+        if isinstance(v, list) and isinstance(entry.get(k), list):
+            entry[k].extend(v)
+        else:
+            entry[k] = v
+
+
 class Senpy(object):
     """ Default Senpy extension for Flask """
 
+    # Number of entries that are processed at the same time by independent analyses
+    window_size = 1000
+
     def __init__(self,
                  app=None,
                  plugin_folder=".",
                  data_folder=None,
                  install=False,
                  strict=None,
-                 default_plugins=False):
+                 default_plugins=False,
+                 processes=None,
+                 cache_size=None,
+                 cache_bytes=None,
+                 disk_cache=None,
+                 cache_ttl=None,
+                 job_workers=None,
+                 max_jobs=None,
+                 activation_workers=None,
+                 lazy=None,
+                 idle_timeout=None,
+                 memory_budget=None):
 
 
         default_data = os.path.join(os.getcwd(), 'senpy_data')
@@ -63,7 +127,42 @@ class Senpy(object):
         self._default = None
         self.strict = strict if strict is not None else config.strict
         self.install = install
-        self._plugins = {}
+        self.processes = processes if processes is not None else config.processes
+        self._pool = None
+        self._executor = None
+        self.job_workers = job_workers if job_workers is not None else config.job_workers
+        self.max_jobs = max_jobs if max_jobs is not None else config.max_jobs
+        self._jobs = None
+        self.activation_workers = (activation_workers if activation_workers is not None
+                                   else config.activation_workers)
+        # Plugins that are being activated, and those that overlapped with others
+        self._activating = set()
+        self._overlapped = set()
+        self._activation_lock = Lock()
+        self.lazy = lazy if lazy is not None else config.lazy
+        idle_timeout = idle_timeout if idle_timeout is not None else config.idle_timeout
+        memory_budget = memory_budget if memory_budget is not None else config.memory_budget
+        self.residency = None
+        if self.lazy or idle_timeout or memory_budget:
+            self.residency = residency.ResidencyManager(self,
+                                                        idle_timeout=idle_timeout or None,
+                                                        memory_budget=memory_budget or None)
+        cache_size = cache_size if cache_size is not None else config.cache_size
+        cache_bytes = cache_bytes if cache_bytes is not None else config.cache_bytes
+        disk_cache = disk_cache if disk_cache is not None else config.disk_cache
+        cache_ttl = cache_ttl if cache_ttl is not None else config.cache_ttl
+        layers = []
+        if cache_size or cache_bytes:
+            layers.append(cache.MemoryCache(max_entries=cache_size, max_bytes=cache_bytes))
+        if disk_cache:
+            path = os.path.join(self.data_folder, 'senpy-cache.sqlite')
+            layers.append(cache.SQLiteCache(path, ttl=cache_ttl or None))
+        self.cache = None
+        if len(layers) > 1:
+            self.cache = cache.LayeredCache(*layers)
+        elif layers:
+            self.cache = layers[0]
+        self._plugins = plugins.PluginRegistry()
         if plugin_folder:
             self.add_folder(plugin_folder)
 
@@ -77,6 +176,7 @@ class Senpy(object):
         if app is not None:
             self.init_app(app)
         self._conversion_candidates = {}
+        self._postprocessing = None
 
     def init_app(self, app):
         """ Initialise a flask app to add plugins to its context """
@@ -96,19 +196,26 @@ class Senpy(object):
         app.register_blueprint(demo_blueprint, url_prefix="/")
 
     def add_plugin(self, plugin):
-        self._plugins[plugin.name.lower()] = plugin
-        self._conversion_candidates = {}
+        self._plugins.add(plugin)
+        self._plugins_changed(plugin)
+        self.refresh_pool()
 
     def delete_plugin(self, plugin):
-        del self._plugins[plugin.name.lower()]
+        self._plugins.remove(plugin)
+        self._plugins_changed(plugin)
+        self.refresh_pool()
+
+    def _plugins_changed(self, plugin):
+        if isinstance(plugin, plugins.EmotionConversion):
+            self._conversion_candidates = {}
+        if isinstance(plugin, plugins.PostProcessing):
+            self._postprocessing = None
 
     def plugins(self, plugin_type=None, is_activated=True, **kwargs):
         """ Return the plugins registered for a given application. Filtered by criteria  """
-        return sorted(plugins.pfilter(self._plugins,
-                                      plugin_type=plugin_type,
-                                      is_activated=is_activated,
-                                      **kwargs),
-                      key=lambda x: x.id)
+        return self._plugins.filter(plugin_type=plugin_type,
+                                    is_activated=is_activated,
+                                    **kwargs)
 
     def get_plugin(self, name, default=None):
         if name == 'default':
@@ -119,20 +226,15 @@ class Senpy(object):
         if name.lower() in self._plugins:
             return self._plugins[name.lower()]
 
-        results = self.plugins(id='endpoint:plugins/{}'.format(name.lower()),
-                               plugin_type=None)
-        if results:
-            return results[0]
-
-        results = self.plugins(id=name,
-                               plugin_type=None)
-        if results:
-            return results[0]
+        for pid in ('endpoint:plugins/{}'.format(name.lower()), name):
+            plugin = self._plugins.by_id(pid)
+            if plugin and plugin.is_activated:
+                return plugin
 
         msg = ("Plugin not found: '{}'\n"
                "Make sure it is ACTIVATED\n"
                "Valid algorithms: {}").format(name,
-                                              self._plugins.keys())
+                                              ', '.join(self._plugins))
         raise Error(message=msg, status=404)
 
     def get_plugins(self, name):
@@ -161,20 +263,142 @@ class Senpy(object):
         else:
             raise AttributeError("Not a folder or does not exist: %s", folder)
 
-    def _process(self, req, pending, done=None):
+    def _process(self, req, pending):
+        """
+        Link the analyses in `pending`, so that each entry goes through all of them
+        without waiting for the rest of entries.
+        Independent analyses (see api.AnalysisPlan) are run concurrently.
+        The activities are added to the request, and a lazy iterator of the processed
+        entries is returned.
+        """
+        entries = iter(req.entries)
+        for stage in api.AnalysisPlan(pending).stages:
+            if len(stage) > 1:
+                entries = self._process_concurrently(entries, stage)
+            else:
+                entries = self._process_one(req, entries, stage[0])
+            req.activities.extend(stage)
+        return entries
+
+    def _process_one(self, req, entries, analysis):
+        if self.cache is not None and cache.is_cacheable(analysis.plugin):
+            return self._process_cached(entries, analysis)
+        return self._process_uncached(req, entries, analysis)
+
+    def _process_uncached(self, req, entries, analysis):
+        proxy = getattr(analysis.plugin, '_proxy', None)
+        if proxy is not None and analysis.plugin.streams():
+            return proxy.process_entries(entries, analysis)
+        elif proxy is not None:
+            return self._process_batch(req, entries, partial(proxy.process, activity=analysis))
+        elif analysis.plugin.streams() and self._is_parallel(analysis.plugin):
+            return self.pool.process_entries(entries, analysis)
+        elif analysis.plugin.streams():
+            return analysis.plugin.process_entries(entries, analysis)
+        return self._process_batch(req, entries, analysis.run)
+
+    def _process_cached(self, entries, analysis):
+        """
+        Reuse the annotations in the cache, and only analyse the entries that were not found.
+        """
+        prefix = cache.analysis_key(analysis)
+        for window in utils.windows(entries, self.window_size):
+            misses = []
+            for ix, entry in enumerate(window):
+                key = cache.key(prefix, entry.get('nif:isString', None))
+                hit = self.cache.get(key)
+                if hit is None:
+                    misses.append((ix, key, cache.snapshot(entry)))
+                else:
+                    cache.loads(hit, entry, analysis)
+            results = self._process_uncached(None,
+                                             [window[ix] for (ix, _, _) in misses],
+                                             analysis)
+            for (ix, key, before), result in zip(misses, results):
+                self.cache.put(key, cache.dumps(result, before, analysis))
+                window[ix] = result
+            for entry in window:
+                yield entry
+
+    def _process_concurrently(self, entries, analyses):
+        """
+        Run several independent analyses at the same time, on windows of entries.
+        Each analysis gets its own copy of the entries, and the new annotations
+        are merged into the original entries in the same order as the analyses.
+        """
+        for window in utils.windows(entries, self.window_size):
+            jobs = []
+            for analysis in analyses:
+                copies = [_annotation_copy(entry) for entry in window]
+                jobs.append(self.executor.submit(
+                    lambda a, c: list(self._process_one(None, c, a)), analysis, copies))
+            results = [job.result() for job in jobs]
+            for result in results:
+                for entry, annotated in zip(window, result):
+                    _merge_annotations(entry, annotated)
+            for entry in window:
+                yield entry
+
+    def _process_batch(self, req, entries, func):
+        """
+        Fallback for plugins that need the whole request (e.g. plugins that override `process`).
+        The entries so far are collected in the request, which is passed to `func`.
+        """
+        req.entries = list(entries)
+        results = func(req)
+        for entry in results.entries:
+            yield entry
+
+    @property
+    def jobs(self):
+        """ Manager of the asynchronous jobs (see senpy.jobs) """
+        if not self.job_workers:
+            raise Error(message='Asynchronous jobs are disabled in this server', status=501)
+        if self._jobs is None:
+            self._jobs = jobs.JobManager(self,
+                                         os.path.join(self.data_folder, 'jobs'),
+                                         workers=self.job_workers,
+                                         max_queued=self.max_jobs,
+                                         max_entries=config.job_max_entries or None,
+                                         max_time=config.job_max_time or None)
+        return self._jobs
+
+    @property
+    def executor(self):
+        """ Thread pool used to run independent analyses concurrently """
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(thread_name_prefix='senpy')
+        return self._executor
+
+    def _is_parallel(self, plugin):
+        return self.processes > 1 and getattr(plugin, 'parallel', False) and parallel.available()
+
+    def _is_isolated(self, plugin):
+        return getattr(plugin, 'isolated', False) and parallel.available()
+
+    @property
+    def pool(self):
         """
-        Recursively process the entries with the first plugin in the list, and pass the results
-        to the rest of the plugins.
+        Pool of processes for plugins that run in parallel (i.e. with `parallel = True`).
+        It is created on demand, so that the processes inherit the activated plugins.
         """
-        done = done or []
-        if not pending:
-            return req
+        if self._pool is None:
+            self._pool = parallel.Pool(self._plugins, self.processes)
+        return self._pool
 
-        analysis = pending[0]
-        results = analysis.run(req)
-        results.activities.append(analysis)
-        done += analysis
-        return self._process(results, pending[1:], done)
+    def close_pool(self):
+        if self._pool is not None:
+            self._pool.close()
+            self._pool = None
+
+    def refresh_pool(self):
+        """
+        Use a new pool of processes for the next requests (e.g., after a plugin has been
+        activated), and stop the current one once the requests that use it finish.
+        """
+        pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.retire()
 
     def install_deps(self):
         logger.info('Installing dependencies')
@@ -188,6 +412,33 @@ class Senpy(object):
         It takes a processed request, provided by the user, as returned
         by api.parse_call().
         """
+        entries = self.stream(request, analyses)
+        request.entries = list(entries)
+        logger.debug("Returning post-processed result: {}".format(request))
+        return request
+
+    def analyse_bulk(self, entries, parameters, analyses=None, chunk_size=None):
+        """
+        Analyse an iterable of entries in chunks of at most `chunk_size` entries.
+        Every chunk is analysed as a separate request (Results), which is yielded
+        once it has been analysed. The analyses are only parsed once.
+        """
+        chunk_size = chunk_size or self.window_size
+        if analyses is None:
+            plugins = self.get_plugins(parameters['algorithm'])
+            analyses = api.parse_analyses(parameters, plugins)
+        for window in utils.windows(entries, chunk_size):
+            request = Results(entries=window)
+            request.parameters = parameters
+            yield self.analyse(request, analyses)
+
+    def stream(self, request, analyses=None):
+        """
+        Analyse a request lazily.
+        The activities of the analysis are added to the request, and a generator of
+        analysed (and post-processed) entries is returned.
+        Entries are only processed as the generator is consumed.
+        """
         if not self.plugins():
             raise Error(
                 status=404,
@@ -197,11 +448,22 @@ class Senpy(object):
             plugins = self.get_plugins(request.parameters['algorithm'])
             analyses = api.parse_analyses(request.parameters, plugins)
         logger.debug("analysing request: {}".format(request))
-        results = self._process(request, analyses)
-        logger.debug("Got analysis result: {}".format(results))
-        results = self.postprocess(results, analyses)
-        logger.debug("Returning post-processed result: {}".format(results))
-        return results
+        if self.residency is None:
+            entries = self._process(request, analyses)
+            return self._postprocess(request, entries)
+        plugs = [analysis.plugin for analysis in analyses]
+        self.residency.acquire(plugs)
+        try:
+            entries = self._process(request, analyses)
+            return self.residency.released(self._postprocess(request, entries), plugs)
+        except Exception:
+            self.residency.release(plugs)
+            raise
+
+    def _using(self, plugs):
+        if self.residency is None:
+            return nullcontext(plugs)
+        return self.residency.using(plugs)
 
     def convert_emotions(self, resp, analyses):
         """
@@ -211,57 +473,85 @@ class Senpy(object):
         Needless to say, this is far from an elegant solution, but it works.
         @todo refactor and clean up
         """
+        resp.entries = list(self._convert_emotions(resp, resp.entries))
+        return resp
 
+    def _convert_emotions(self, resp, entries):
         logger.debug("Converting emotions")
         if 'parameters' not in resp:
             logger.debug("NO PARAMETERS")
-            return resp
+            return entries
 
         params = resp['parameters']
         toModel = params.get('emotion-model', None)
         if not toModel:
             logger.debug("NO tomodel PARAMETER")
-            return resp
+            return entries
 
         logger.debug('Asked for model: {}'.format(toModel))
-        output = params.get('conversion', None)
+        return self._convert_windows(resp, entries, toModel, params)
 
-        newentries = []
-        done = []
-        for i in resp.entries:
+    def _convert_windows(self, resp, entries, toModel, params):
+        """
+        Convert the emotions in windows of entries. All the emotion sets in a window that
+        were generated by the same activity are converted with a single call to
+        `convert_many`.
 
-            if output == "full":
-                newemotions = copy.deepcopy(i.emotions)
-            else:
-                newemotions = []
-            for j in i.emotions:
-                activity = j['prov:wasGeneratedBy']
-                act = resp.activity(activity)
-                if not act:
-                    raise Error('Could not find the emotion model for {}'.format(activity))
-                fromModel = act.plugin['onyx:usesEmotionModel']
-                if toModel == fromModel:
-                    continue
-                candidate = self._conversion_candidate(fromModel, toModel)
-                if not candidate:
-                    e = Error(('No conversion plugin found for: '
-                              '{} -> {}'.format(fromModel, toModel)),
-                              status=404)
-                    e.original_response = resp
-                    e.parameters = params
-                    raise e
-
-                analysis = candidate.activity(params)
-                done.append(analysis)
-                for k in candidate.convert(j, fromModel, toModel, params):
-                    k.prov__wasGeneratedBy = analysis.id
-                    if output == 'nested':
-                        k.prov__wasDerivedFrom = j
-                    newemotions.append(k)
-            i.emotions = newemotions
-            newentries.append(i)
-        resp.entries = newentries
-        return resp
+        The parameters are read before the entries are, since the parameters of a
+        streamed response may be removed (e.g. with `with-parameters=false`) before
+        its entries are processed.
+        """
+        output = params.get('conversion', None)
+        plan = {}
+        for window in utils.windows(entries, self.window_size):
+            pending = {}
+            for ix, entry in enumerate(window):
+                for jx, emotionSet in enumerate(entry.emotions):
+                    activity = emotionSet['prov:wasGeneratedBy']
+                    if activity not in plan:
+                        plan[activity] = self._conversion_step(resp, activity, toModel,
+                                                               params)
+                    if plan[activity]:
+                        pending.setdefault(activity, []).append((ix, jx, emotionSet))
+            converted = {}
+            for activity, items in pending.items():
+                fromModel, candidate, analysis = plan[activity]
+                sets = [emotionSet for (_, _, emotionSet) in items]
+                results = candidate.convert_many(sets, fromModel, toModel, params)
+                for (ix, jx, emotionSet), result in zip(items, results):
+                    for k in result:
+                        k.prov__wasGeneratedBy = analysis.id
+                        if output == 'nested':
+                            k.prov__wasDerivedFrom = emotionSet
+                    converted[(ix, jx)] = result
+            for ix, entry in enumerate(window):
+                # The original emotion sets are not modified, so they can be shared
+                newemotions = list(entry.emotions) if output == 'full' else []
+                for jx in range(len(entry.emotions)):
+                    newemotions.extend(converted.get((ix, jx), []))
+                entry.emotions = newemotions
+                yield entry
+
+    def _conversion_step(self, resp, activity, toModel, params):
+        """
+        Find out how to convert the emotions generated by an activity.
+        It returns None if no conversion is needed, or a tuple (fromModel, plugin, analysis).
+        """
+        act = resp.activity(activity)
+        if not act:
+            raise Error('Could not find the emotion model for {}'.format(activity))
+        fromModel = act.plugin['onyx:usesEmotionModel']
+        if toModel == fromModel:
+            return None
+        candidate = self._conversion_candidate(fromModel, toModel)
+        if not candidate:
+            e = Error(('No conversion plugin found for: '
+                      '{} -> {}'.format(fromModel, toModel)),
+                      status=404)
+            e.original_response = resp
+            e.parameters = params
+            raise e
+        return fromModel, candidate, candidate.activity(params)
 
     def _conversion_candidate(self, fromModel, toModel):
         if not self._conversion_candidates:
@@ -286,14 +576,70 @@ class Senpy(object):
         It has some pre-defined post-processing like emotion conversion,
         and it also allows plugins to auto-select themselves.
         '''
+        response.entries = list(self._postprocess(response, response.entries))
+        return response
 
-        response = self.convert_emotions(response, analyses)
+    def _postprocess(self, response, entries):
+        '''
+        Lazy version of postprocess, which links the conversion and the
+        post-processing plugins to the given iterator of entries.
+        Consecutive plugins that work on one entry at a time are fused into a single pass.
+        '''
+        entries = self._convert_emotions(response, entries)
+
+        steps = []
+        for plug in self._select_postprocessing(response):
+            activity = plug.activity(response.parameters)
+            if _per_entry(plug):
+                steps.append((plug, activity))
+                continue
+            entries = _fused(entries, steps)
+            steps = []
+            if plug.streams():
+                entries = plug.process_entries(entries, activity)
+            else:
+                entries = self._process_batch(response, entries,
+                                              partial(plug.process, activity=activity))
+        return _fused(entries, steps)
 
-        for plug in self.plugins(plugin_type=plugins.PostProcessing):
-            if plug.check(response, response.activities):
-                activity = plug.activity(response.parameters)
-                response = plug.process(response, activity)
-        return response
+    def _postprocessing_index(self):
+        '''
+        Index of the activated post-processing plugins by their triggers.
+        It is only rebuilt when a post-processing plugin changes.
+        '''
+        if self._postprocessing is None:
+            index = {'params': {}, 'models': {}, 'types': [], 'always': set(), 'plugins': []}
+            for plug in self.plugins(plugin_type=plugins.PostProcessing):
+                name = plug.name
+                index['plugins'].append(plug)
+                if not plug.has_triggers():
+                    index['always'].add(name)
+                for param in plug.trigger_params:
+                    index['params'].setdefault(param, set()).add(name)
+                for model in plug.trigger_models:
+                    index['models'].setdefault(model, set()).add(name)
+                for ptype in plug.trigger_types:
+                    index['types'].append((plugins.plugin_class(ptype), name))
+            self._postprocessing = index
+        return self._postprocessing
+
+    def _select_postprocessing(self, response):
+        '''The post-processing plugins that should be run for a request, in order'''
+        index = self._postprocessing_index()
+        selected = set(index['always'])
+        for param in response.parameters:
+            selected.update(index['params'].get(param, ()))
+        for analysis in response.activities:
+            plugin = getattr(analysis, 'plugin', None)
+            if plugin is None:
+                continue
+            model = plugin.get('onyx:usesEmotionModel', None)
+            selected.update(index['models'].get(model, ()))
+            for pclass, name in index['types']:
+                if isinstance(plugin, pclass):
+                    selected.add(name)
+        return [plug for plug in index['plugins']
+                if plug.name in selected and plug.check(response, response.activities)]
 
     def _get_datasets(self, request):
         datasets_name = request.parameters.get('dataset', None).split(',')
@@ -319,8 +665,9 @@ class Senpy(object):
             if not isinstance(plug, plugins.Evaluable):
                 raise Exception('Plugin {} can not be evaluated', plug.id)
 
-        for eval in plugins.evaluate(plugs, datasets):
-            results.evaluations.append(eval)
+        with self._using(plugs):
+            for eval in plugins.evaluate(plugs, datasets):
+                results.evaluations.append(eval)
         if 'with-parameters' not in results.parameters:
             del results.parameters
         logger.debug("Returning evaluation result: {}".format(results))
@@ -330,6 +677,8 @@ class Senpy(object):
     def default_plugin(self):
         if not self._default or not self._default.is_activated:
             candidates = self.analysis_plugins()
+            if not candidates and self.lazy:
+                candidates = self.analysis_plugins(is_activated=None)
             if len(candidates) > 0:
                 self._default = candidates[0]
             else:
@@ -347,18 +696,78 @@ class Senpy(object):
         else:
             self._default = self._plugins[value.lower()]
 
-    def activate_all(self, sync=True):
+    def activate_all(self, sync=True, workers=None):
+        """
+        Activate every plugin. With sync=True, plugins are activated by a pool of
+        `workers` threads (by default, `activation_workers`), and the call returns once
+        all of them have finished. Plugins that declare other plugins in
+        ``activate_after`` are only activated after those plugins.
+        In lazy mode, analysis plugins are not activated until they are used.
+        """
+        plugs = [plug for plug in self._plugins.values()
+                 if not (self.lazy and isinstance(plug, AnalysisPlugin))]
+        workers = workers if workers is not None else self.activation_workers
+        if sync and workers and workers > 1:
+            return self._activate_concurrently(plugs, workers)
         ps = []
-        for plug in self._plugins.keys():
+        for plug in plugs:
             try:
-                self.activate_plugin(plug, sync=sync)
+                self.activate_plugin(plug.name, sync=sync)
             except Exception as ex:
                 if self.strict:
                     raise
-                logger.error('Could not activate {}: {}'.format(plug, ex))
+                logger.error('Could not activate {}: {}'.format(plug.name, ex))
         return ps
 
+    def _activate_concurrently(self, plugs, workers):
+        pending = {plug.name.lower(): plug for plug in plugs}
+        after = {}
+        for name, plug in pending.items():
+            names = set(n.lower() for n in getattr(plug, 'activate_after', None) or [])
+            after[name] = names & set(pending)
+        done = set()
+        running = {}
+        error = None
+        with ThreadPoolExecutor(max_workers=workers,
+                                thread_name_prefix='senpy-activation') as executor:
+            while pending or running:
+                ready = [name for name in pending if after[name] <= done]
+                if not ready and not running:
+                    raise Error('Circular activation order between plugins: {}'.format(
+                        sorted(pending)))
+                for name in ready:
+                    running[executor.submit(self._activate, pending.pop(name))] = name
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    name = running.pop(future)
+                    done.add(name)
+                    ex = future.exception()
+                    if ex is None:
+                        continue
+                    if self.strict:
+                        error = error or ex
+                    logger.error('Could not activate {}: {}'.format(name, ex))
+        if error is not None:
+            raise error
+        return []
+
+    def activation_report(self):
+        """
+        Time (in seconds) and memory (in bytes) that each plugin took to activate.
+        The memory of plugins that were activated concurrently is unknown (None).
+        """
+        report = []
+        for plug in self._plugins.values():
+            if 'activation_time' in plug:
+                report.append({'plugin': plug.name,
+                               'time': plug.activation_time,
+                               'memory': plug.activation_memory})
+        return sorted(report, key=lambda x: -x['time'])
+
     def deactivate_all(self, sync=True):
+        self.close_pool()
+        if self.residency is not None:
+            self.residency.close()
         ps = []
         for plug in self._plugins.keys():
             ps.append(self.deactivate_plugin(plug, sync=sync))
@@ -368,18 +777,58 @@ class Senpy(object):
         with plugin._lock:
             if plugin.is_activated:
                 return
+            start = time.time()
+            memory = utils.memory_usage()
+            self._activation_started(plugin)
             try:
                 logger.info("Activating plugin: {}".format(plugin.name))
 
-                assert plugin._activate()
+                if self._is_isolated(plugin):
+                    self._start_workers(plugin)
+                else:
+                    assert plugin._activate()
                 logger.info(f"Plugin activated: {plugin.name}")
             except Exception as ex:
                 if getattr(plugin, "optional", False) and not self.strict:
                     logger.info(f"Plugin could NOT be activated: {plugin.name}")
                     return False
                 raise
+            finally:
+                plugin.activation_time = time.time() - start
+                memory = utils.memory_usage() - memory
+                # The memory of the process also grows with the other activations
+                plugin.activation_memory = None if self._activation_finished(plugin) else memory
+                self._plugins.update(plugin)
+                self._plugins_changed(plugin)
         return plugin.is_activated
 
+    def _activation_started(self, plugin):
+        with self._activation_lock:
+            if self._activating:
+                self._overlapped.update(self._activating)
+                self._overlapped.add(plugin.id)
+            self._activating.add(plugin.id)
+
+    def _activation_finished(self, plugin):
+        '''Whether the activation of the plugin overlapped with others'''
+        with self._activation_lock:
+            self._activating.discard(plugin.id)
+            overlapped = plugin.id in self._overlapped
+            self._overlapped.discard(plugin.id)
+        return overlapped
+
+    def _start_workers(self, plugin):
+        """ Activate a plugin in its own processes (see senpy.isolation) """
+        plugin._proxy = isolation.PluginProxy(plugin,
+                                              processes=getattr(plugin, 'isolated_processes', 1),
+                                              max_memory=getattr(plugin, 'isolated_memory', None))
+        try:
+            plugin._proxy.start()
+        except Exception:
+            plugin._proxy = None
+            raise
+        plugin.is_activated = True
+
     def activate_plugin(self, plugin_name, sync=True):
         plugin_name = plugin_name.lower()
         if plugin_name not in self._plugins:
@@ -401,7 +850,14 @@ class Senpy(object):
         with plugin._lock:
             if not plugin.is_activated:
                 return
-            plugin._deactivate()
+            if getattr(plugin, '_proxy', None) is not None:
+                plugin._proxy.close()
+                plugin._proxy = None
+                plugin.is_activated = False
+            else:
+                plugin._deactivate()
+            self._plugins.update(plugin)
+            self._plugins_changed(plugin)
             logger.info("Plugin deactivated: {}".format(plugin.name))
 
     def deactivate_plugin(self, plugin_name, sync=True):
@@ -413,9 +869,9 @@ class Senpy(object):
 
         if sync or not getattr(plugin, 'async', True) or not getattr(
                 plugin, 'sync', False):
-            plugin._deactivate()
+            self._deactivate(plugin)
         else:
-            th = Thread(target=plugin.deactivate)
+            th = Thread(target=partial(self._deactivate, plugin))
             th.start()
             return th
 
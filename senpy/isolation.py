@@ -0,0 +1,304 @@
+#
+#    Copyright 2014 Grupo de Sistemas Inteligentes (GSI) DIT, UPM
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#    limitations under the License.
+#
+'''
+Plugins that run in their own worker processes.
+
+Plugins with ``isolated = True`` are not activated in the server. Instead, they are
+activated once in ``isolated_processes`` dedicated processes, forked from the
+server, and the server sends them the entries to analyse through pipes. CPU-bound
+plugins do not compete with the rest for the GIL, and the memory of each worker can
+be limited with ``isolated_memory`` (in bytes).
+
+Every message between the server and a worker is a batch of entries:
+
+    - A header: the type of message (one byte) and the length of the metadata
+      (four bytes, big endian).
+    - The metadata (e.g. the activity), encoded as JSON.
+    - The entries, in the format of ``senpy.parallel.pack``.
+'''
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import json
+import multiprocessing
+import os
+import queue
+import struct
+import threading
+import logging
+
+from . import models, parallel, utils
+
+logger = logging.getLogger(__name__)
+
+READY = 1
+PROCESS = 2
+RESULT = 3
+ERROR = 4
+STOP = 5
+
+_HEADER = struct.Struct('!BI')
+
+
+def encode(op, metadata=None, payload=b''):
+    '''Encode a message, with optional metadata and payload (e.g., packed entries)'''
+    meta = b''
+    if metadata is not None:
+        meta = json.dumps(metadata, separators=(',', ':'), default=str).encode('utf-8')
+    return b''.join((_HEADER.pack(op, len(meta)), meta, payload))
+
+
+def decode(data):
+    '''Decode a message. It returns the type of message, its metadata and its payload'''
+    op, size = _HEADER.unpack_from(data)
+    start = _HEADER.size
+    metadata = json.loads(data[start:start + size].decode('utf-8')) if size else None
+    return op, metadata, memoryview(data)[start + size:]
+
+
+def _error(ex):
+    return {'message': '{}'.format(ex), 'status': getattr(ex, 'status', 500)}
+
+
+def _serve(plugin, conn, max_memory=None):
+    '''Main loop of a worker: activate the plugin once, and process batches until stopped'''
+    if max_memory:
+        import resource
+        resource.setrlimit(resource.RLIMIT_AS, (max_memory, max_memory))
+    # The lock may have been held by another thread when the process was forked
+    plugin._lock = threading.Lock()
+    # The server marks the plugin as activated, but it is not activated in this process
+    plugin.is_activated = False
+    plugin._proxy = None
+    try:
+        plugin._activate()
+    except Exception as ex:
+        conn.send_bytes(encode(ERROR, _error(ex)))
+        return
+    conn.send_bytes(encode(READY))
+    try:
+        while True:
+            try:
+                op, metadata, payload = decode(conn.recv_bytes())
+            except EOFError:
+                return
+            if op == STOP:
+                return
+            try:
+                activity = models.from_dict(metadata['activity'], cls=models.Analysis)
+                activity.plugin = plugin
+                entries = parallel.unpack(payload)
+                if metadata.get('whole', False):
+                    request = models.Results()
+                    request.entries = entries
+                    request.parameters = metadata.get('parameters', {})
+                    entries = plugin.process(request, activity).entries
+                else:
+                    entries = list(plugin.process_entries(entries, activity))
+                message = encode(RESULT, activity.serializable(), parallel.pack(entries))
+            except Exception as ex:
+                logger.exception('Error in the worker of %s', plugin.name)
+                message = encode(ERROR, _error(ex))
+            conn.send_bytes(message)
+    finally:
+        plugin._deactivate()
+
+
+class _Worker(object):
+    def __init__(self, process, conn):
+        self.process = process
+        self.conn = conn
+
+
+class PluginProxy(object):
+    '''
+    Run a plugin in a pool of worker processes.
+    It provides the same ``process`` and ``process_entries`` methods as the plugin.
+    '''
+
+    def __init__(self, plugin, processes=1, chunk_size=100, max_memory=None):
+        self.plugin = plugin
+        self.processes = processes
+        self.chunk_size = chunk_size
+        self.max_memory = max_memory
+        self._ctx = multiprocessing.get_context('fork')
+        self._idle = queue.Queue()
+        self._workers = []
+        self._executor = None
+        # Guards the list of workers. It is reentrant because the workers are started
+        # again (see _check_fork) while it is held.
+        self._lock = threading.RLock()
+        self._pid = None
+
+    def start(self):
+        '''Start the workers, and wait until the plugin is activated in all of them'''
+        self._pid = os.getpid()
+        try:
+            for _ in range(self.processes):
+                self._idle.put(self._spawn())
+        except Exception:
+            self.close()
+            raise
+        self._executor = ThreadPoolExecutor(max_workers=self.processes,
+                                            thread_name_prefix='senpy-{}'.format(
+                                                self.plugin.name))
+        return self
+
+    def process(self, request, activity, **kwargs):
+        '''Process a whole request (for plugins that do not stream)'''
+        metadata = {'activity': self._activity(activity),
+                    'parameters': request.parameters,
+                    'whole': True}
+        entries, info = self._call(metadata, request.entries)
+        self._update(activity, info)
+        request.entries = entries
+        return request
+
+    def process_entries(self, entries, activity):
+        '''
+        Process the entries in chunks, preserving their order.
+        Every worker processes one chunk at a time.
+        '''
+        metadata = {'activity': self._activity(activity)}
+        self._check_fork()
+        pending = deque()
+        for window in utils.windows(entries, self.chunk_size):
+            pending.append(self._executor.submit(self._call, metadata, window))
+            if len(pending) >= 2 * self.processes:
+                for entry in self._collect(pending.popleft(), activity):
+                    yield entry
+        while pending:
+            for entry in self._collect(pending.popleft(), activity):
+                yield entry
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+        with self._lock:
+            workers, self._workers = self._workers, []
+        for worker in workers:
+            try:
+                worker.conn.send_bytes(encode(STOP))
+            except (OSError, ValueError):
+                pass
+            worker.process.join(5)
+            if worker.process.is_alive():
+                worker.process.terminate()
+                worker.process.join()
+            worker.conn.close()
+        self._idle = queue.Queue()
+
+    def _activity(self, activity):
+        # Make sure the ID is generated before sending the activity to the workers,
+        # so that every annotation links to the same activity.
+        activity.id
+        return activity.serializable()
+
+    def _collect(self, job, activity):
+        entries, info = job.result()
+        self._update(activity, info)
+        return entries
+
+    def _update(self, activity, info):
+        # Plugins may add information to their activity (e.g. polarity ranges)
+        for k, v in info.items():
+            if k not in activity:
+                activity[k] = v
+
+    def _check_fork(self):
+        '''
+        Processes forked from the server (e.g. the workers of a pre-fork server, see
+        senpy.server) cannot share the pipes of the server, so they need their own workers.
+        '''
+        with self._lock:
+            if self._pid is not None and self._pid != os.getpid():
+                for worker in self._workers:
+                    worker.conn.close()
+                self._workers = []
+                self._idle = queue.Queue()
+                self._executor = None
+                self.start()
+
+    def _call(self, metadata, entries):
+        self._check_fork()
+        with self._lock:
+            if not self._workers:
+                raise self._no_workers()
+        worker = self._idle.get()
+        if worker is None:
+            # Every worker stopped, and none could be started again (see _replace)
+            self._idle.put(None)
+            raise self._no_workers()
+        try:
+            worker.conn.send_bytes(encode(PROCESS, metadata, parallel.pack(entries)))
+            op, info, payload = decode(worker.conn.recv_bytes())
+        except (EOFError, OSError):
+            self._replace(worker)
+            worker = None
+            raise models.Error(message='The worker of {} stopped unexpectedly'.format(
+                self.plugin.name))
+        finally:
+            if worker is not None:
+                self._idle.put(worker)
+        if op == ERROR:
+            raise models.Error(**info)
+        return parallel.unpack(payload), info
+
+    def _spawn(self):
+        parent, child = self._ctx.Pipe()
+        process = self._ctx.Process(target=_serve,
+                                    args=(self.plugin, child, self.max_memory),
+                                    name='senpy-{}'.format(self.plugin.name),
+                                    daemon=True)
+        process.start()
+        child.close()
+        try:
+            op, info, _ = decode(parent.recv_bytes())
+        except EOFError:
+            op, info = ERROR, {'message': 'the worker stopped'}
+        if op != READY:
+            process.join(5)
+            if process.is_alive():
+                process.terminate()
+                process.join()
+            parent.close()
+            raise models.Error(message='Could not activate {} in its worker: {}'.format(
+                self.plugin.name, info['message']))
+        # Only workers that are ready are used (and stopped by close)
+        worker = _Worker(process, parent)
+        with self._lock:
+            self._workers.append(worker)
+        return worker
+
+    def _replace(self, worker):
+        '''Start a new worker in place of one that stopped (e.g., it ran out of memory)'''
+        logger.error('The worker of %s stopped. Starting a new one', self.plugin.name)
+        worker.process.join()
+        worker.conn.close()
+        with self._lock:
+            self._workers.remove(worker)
+        try:
+            self._idle.put(self._spawn())
+        except Exception:
+            logger.exception('Could not start a new worker for %s', self.plugin.name)
+            with self._lock:
+                if not self._workers:
+                    # Wake up the calls that are waiting for a worker
+                    self._idle.put(None)
+
+    def _no_workers(self):
+        return models.Error(message='There are no workers for {}'.format(self.plugin.name))
@@ -0,0 +1,271 @@
+#
+#    Copyright 2014 Grupo de Sistemas Inteligentes (GSI) DIT, UPM
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#    limitations under the License.
+#
+'''
+Asynchronous jobs, for analyses and evaluations that take too long for a single request.
+
+Jobs wait in a bounded queue until one of the worker threads runs them. Every job has
+its own folder, where its state and its results are stored. The entries of an analysis
+are written (as NDJSON) as soon as they are analysed, so the results can be read page
+by page, even while the job is still running.
+'''
+from itertools import islice
+
+import copy
+import json
+import os
+import queue
+import re
+import shutil
+import threading
+import time
+import uuid
+import logging
+
+from . import api
+from .models import Error, Job, Results, Entry, from_dict
+
+logger = logging.getLogger(__name__)
+
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+CANCELLED = 'cancelled'
+FINISHED = (DONE, FAILED, CANCELLED)
+
+_VALID_ID = re.compile('^[0-9a-f]{32}$')
+
+
+class Cancelled(Exception):
+    pass
+
+
+class JobManager(object):
+    '''
+    Run analyses and evaluations in the background, with a pool of worker threads.
+
+    At most `max_queued` jobs can wait in the queue. Jobs fail if they analyse more than
+    `max_entries` entries or run for more than `max_time` seconds.
+    '''
+
+    def __init__(self, senpy, folder, workers=2, max_queued=100, max_entries=None,
+                 max_time=None):
+        self.senpy = senpy
+        self.folder = folder
+        self.workers = workers
+        self.max_entries = max_entries
+        self.max_time = max_time
+        if not os.path.exists(folder):
+            os.makedirs(folder)
+        self._queue = queue.Queue(maxsize=max_queued)
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self._threads = []
+
+    def analyse(self, request, analyses, body=None, mimetype=None):
+        '''
+        Submit an analysis. The entries are those of the request or, if a body (a binary
+        stream) is given, they are read from the body as in a bulk request.
+        '''
+        job = self._new('analysis', request.parameters)
+        if body is not None:
+            with open(self._path(job.id, 'input'), 'wb') as f:
+                shutil.copyfileobj(body, f)
+        return self._submit(job, self._analyse, request, analyses, body is not None, mimetype)
+
+    def evaluate(self, params):
+        '''Submit an evaluation'''
+        job = self._new('evaluation', params)
+        return self._submit(job, self._evaluate, params)
+
+    def get(self, id):
+        '''Get a snapshot of the state of a job'''
+        return copy.copy(self._get(id))
+
+    def _get(self, id):
+        with self._lock:
+            job = self._jobs.get(id, None)
+        if job is not None:
+            return job
+        path = self._path(id, 'job.json') if _VALID_ID.match(id) else None
+        if not path or not os.path.exists(path):
+            raise Error(message='Job not found: {}'.format(id), status=404)
+        with open(path) as f:
+            job = from_dict(json.load(f), cls=Job)
+        if job.state not in FINISHED:
+            # It was interrupted (e.g. the server was restarted)
+            job.state = FAILED
+            job.message = 'The job was interrupted'
+        return job
+
+    def cancel(self, id):
+        job = self._get(id)
+        if job.state not in FINISHED:
+            job._cancelled.set()
+            if job.state == QUEUED:
+                self._finish(job, CANCELLED)
+        return copy.copy(job)
+
+    def results(self, id, page=None, page_size=100):
+        '''
+        Get the results of a job. For analyses, only a page of the entries is returned
+        if `page` is given (starting from 0).
+        '''
+        job = self._get(id)
+        if job.task == 'evaluation':
+            if job.state != DONE:
+                raise Error(message='The job has not finished yet', status=404)
+            with open(self._path(id, 'results.json')) as f:
+                return from_dict(json.load(f))
+        path = self._path(id, 'results.ndjson')
+        if not os.path.exists(path):
+            raise Error(message='The job has not started yet', status=404)
+        with open(path) as f:
+            # The last line may not be complete if the job is running
+            lines = (line for line in f if line.endswith('\n'))
+            header = next(lines, None)
+            if header is None:
+                raise Error(message='The job has not started yet', status=404)
+            results = from_dict(json.loads(header), cls=Results)
+            if page is not None:
+                start = page * page_size
+                lines = islice(lines, start, start + page_size)
+            results.entries = [from_dict(json.loads(line), cls=Entry) for line in lines]
+        return results
+
+    def close(self):
+        '''Stop the workers, once they finish their current jobs'''
+        for _ in self._threads:
+            self._queue.put(None)
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+
+    def _new(self, task, parameters):
+        job = Job(id=uuid.uuid4().hex, task=task, state=QUEUED, submitted=time.time())
+        # The input may be too long to be stored with the job
+        job.parameters = {k: v for k, v in parameters.items() if k != 'input'}
+        job._cancelled = threading.Event()
+        os.makedirs(self._path(job.id))
+        return job
+
+    def _submit(self, job, func, *args):
+        self._start()
+        job._run = (func, args)
+        self._save(job)
+        with self._lock:
+            self._jobs[job.id] = job
+        try:
+            self._queue.put_nowait(job)
+        except queue.Full:
+            with self._lock:
+                del self._jobs[job.id]
+            shutil.rmtree(self._path(job.id), ignore_errors=True)
+            raise Error(message='Too many jobs in the queue. Please, try again later',
+                        status=503)
+        return copy.copy(job)
+
+    def _start(self):
+        with self._lock:
+            while len(self._threads) < self.workers:
+                thread = threading.Thread(target=self._work,
+                                          name='senpy-jobs-{}'.format(len(self._threads)),
+                                          daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def _work(self):
+        while True:
+            job = self._queue.get()
+            if job is None:
+                return
+            if job.state != QUEUED:  # It was cancelled
+                continue
+            job.state = RUNNING
+            job.started = time.time()
+            self._save(job)
+            func, args = job._run
+            try:
+                func(job, *args)
+            except Cancelled:
+                self._finish(job, CANCELLED)
+            except Exception as ex:
+                logger.exception('Error running job %s', job.id)
+                job.message = '{}'.format(ex)
+                self._finish(job, FAILED)
+            else:
+                self._finish(job, DONE)
+
+    def _finish(self, job, state):
+        job.state = state
+        job.finished = time.time()
+        job._run = None
+        self._save(job)
+        # Finished jobs are read from their folder
+        with self._lock:
+            self._jobs.pop(job.id, None)
+
+    def _check(self, job):
+        if job._cancelled.is_set():
+            raise Cancelled()
+        if self.max_time and time.time() - job.started > self.max_time:
+            raise Error(message='The job took longer than {} seconds'.format(self.max_time))
+
+    def _analyse(self, job, request, analyses, from_body, mimetype):
+        if from_body:
+            with open(self._path(job.id, 'input'), 'rb') as body:
+                entries = api.read_bulk(body, mimetype)
+                self._write_analysis(job, request, analyses, entries)
+        else:
+            self._write_analysis(job, request, analyses, request.entries)
+
+    def _write_analysis(self, job, request, analyses, entries):
+        chunks = self.senpy.analyse_bulk(self._limited(job, entries), request.parameters,
+                                         analyses)
+        request.activities = list(analyses)
+        with open(self._path(job.id, 'results.ndjson'), 'w') as f:
+            f.write(next(request.ndjson(entries=[], with_context=True)))
+            f.flush()
+            for chunk in chunks:
+                for entry in chunk.entries:
+                    f.write(entry.dumps(indent=None) + '\n')
+                f.flush()
+                job.progress += len(chunk.entries)
+
+    def _limited(self, job, entries):
+        for ix, entry in enumerate(entries):
+            self._check(job)
+            if self.max_entries and ix >= self.max_entries:
+                raise Error(message='Jobs cannot have more than {} entries'.format(
+                    self.max_entries))
+            yield entry
+
+    def _evaluate(self, job, params):
+        self._check(job)
+        results = self.senpy.evaluate(params)
+        job.progress = len(results.evaluations)
+        with open(self._path(job.id, 'results.json'), 'w') as f:
+            f.write(results.dumps(indent=None))
+
+    def _save(self, job):
+        path = self._path(job.id, 'job.json')
+        with self._lock:
+            with open(path + '.tmp', 'w') as f:
+                json.dump(job.serializable(), f)
+            os.replace(path + '.tmp', path)
+
+    def _path(self, id, *parts):
+        return os.path.join(self.folder, id, *parts)
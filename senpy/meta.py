@@ -74,12 +74,49 @@ class BaseMeta(ABCMeta):
         rest['_defaults'] = defaults
         rest['_aliases'] = aliases
 
+        slots = mcs.compact_slots(bases, rest, defaults)
+        if slots:
+            rest['__slots__'] = tuple(slots.values())
+
         cls = super(BaseMeta, mcs).__new__(mcs, name, tuple(bases), rest)
+        _prepare(cls, slots)
 
         if register_afterwards:
             mcs.register(cls, defaults['@type'])
         return cls
 
+    @staticmethod
+    def compact_slots(bases, attrs, defaults):
+        '''
+        Slots for the fields of compact models (i.e., models with `_compact`).
+
+        Instances of compact models store some of their fields in slots, instead of
+        in their `__dict__`: their defaults and, if `_compact` is a list, the keys in
+        it. Skipping a field that is not set is more expensive than in a dictionary,
+        so only fields that almost every instance has should be listed.
+        Some keys are not valid slot names (e.g. `nif:isString`), so every slot gets
+        an internal name.
+        '''
+        compact = attrs.get('_compact', None)
+        if compact is None:
+            compact = any(getattr(base, '_compact', False) for base in bases)
+        if not compact:
+            return {}
+        inherited = {}
+        for base in bases:
+            inherited.update(getattr(base, '_slot_names', {}))
+        keys = list(defaults)
+        if isinstance(compact, (list, tuple)):
+            keys += compact
+        slots = {}
+        for key in keys:
+            key = _storage_key(attrs['_aliases'], key)
+            if key in inherited or key in slots or key[0] == '_' or key in attrs or \
+               any(hasattr(base, key) for base in bases):
+                continue
+            slots[key] = '_slot{}'.format(len(inherited) + len(slots))
+        return slots
+
     @classmethod
     def register(mcs, rsubclass, rtype=None):
         mcs._subtypes[rtype or rsubclass.__name__] = rsubclass
@@ -188,6 +225,9 @@ class CustomDict(MutableMapping, object):
     > d.key == d['key']
     True
     > d.ns__name == d['ns:name']
+
+    The translation between attributes and keys is precomputed for every class
+    (see `_prepare`), and it is cached for any other attribute or key.
     '''
 
     _defaults = {}
@@ -195,13 +235,13 @@ class CustomDict(MutableMapping, object):
 
     def __init__(self, *args, **kwargs):
         super(CustomDict, self).__init__()
-        for k, v in self._defaults.items():
-            self[k] = copy.copy(v)
+        setattr_ = object.__setattr__
+        for key, value, copier in self._init_defaults:
+            setattr_(self, key, value if copier is None else copier(value))
         for arg in args:
             self.update(arg)
         for k, v in kwargs.items():
             self[k] = v
-        return self
 
     def serializable(self, **kwargs):
         def ser_or_down(item):
@@ -221,23 +261,66 @@ class CustomDict(MutableMapping, object):
         return ser_or_down(self.as_dict(**kwargs))
 
     def __getitem__(self, key):
+        slot = self._slots.get(key, None)
+        if slot is not None:
+            try:
+                return slot.__get__(self)
+            except AttributeError:
+                raise KeyError(key)
         return self.__dict__[key]
 
     def __setitem__(self, key, value):
         '''Do not insert data directly, there might be a property in that key. '''
-        key = self._key_to_attr(key)
-        return setattr(self, key, value)
+        try:
+            key = self._item_keys[key]
+        except KeyError:
+            key = _cached(self._item_keys, key,
+                          self._attr_to_key(self._key_to_attr(key)))
+        object.__setattr__(self, key, value)
 
     def __delitem__(self, key):
-        key = self._key_to_attr(key)
+        key = self._attr_to_key(self._key_to_attr(key))
+        slot = self._slots.get(key, None)
+        if slot is not None:
+            try:
+                return slot.__delete__(self)
+            except AttributeError:
+                raise KeyError(key)
         del self.__dict__[key]
 
+    def _all_keys(self):
+        '''All the keys of this object, including the internal ones'''
+        for key, slot in self._slots.items():
+            try:
+                slot.__get__(self)
+            except AttributeError:
+                continue
+            yield key
+        for key in self.__dict__:
+            yield key
+
     def as_dict(self, verbose=True, aliases=False):
-        attrs = self.__dict__.keys()
         if not verbose and hasattr(self, '_terse_keys'):
             attrs = self._terse_keys + ['@type', '@id']
-        res = {k: getattr(self, k) for k in attrs
-               if not self._internal_key(k) and hasattr(self, k)}
+            res = {k: getattr(self, k) for k in attrs
+                   if not self._internal_key(k) and hasattr(self, k)}
+        else:
+            res = {}
+            descriptors = self._descriptors
+            values = self.__dict__
+            for k, slot in self._slots.items():
+                try:
+                    res[k] = slot.__get__(self)
+                except AttributeError:
+                    pass
+            for k in values:
+                if k[0] == '_':
+                    continue
+                if k in descriptors:
+                    if hasattr(self, k):
+                        res[k] = getattr(self, k)
+                else:
+                    res[k] = values[k]
         if not aliases:
             return res
         for k, ok in self._aliases.items():
@@ -247,10 +330,10 @@ class CustomDict(MutableMapping, object):
         return res
 
     def __iter__(self):
-        return (k for k in self.__dict__ if not self._internal_key(k))
+        return (k for k in self._all_keys() if not self._internal_key(k))
 
     def __len__(self):
-        return len(self.__dict__)
+        return sum(1 for _ in self._all_keys())
 
     def update(self, other):
         for k, v in other.items():
@@ -272,15 +355,22 @@ class CustomDict(MutableMapping, object):
         return key
 
     def __getattr__(self, key):
-        nkey = self._attr_to_key(key)
+        try:
+            nkey = self._attr_keys[key]
+        except KeyError:
+            nkey = _cached(self._attr_keys, key, self._attr_to_key(key))
         if nkey in self.__dict__:
             return self.__dict__[nkey]
-        elif nkey == key:
+        elif nkey == key or nkey in self._slots:
             raise AttributeError("Key not found: {}".format(key))
         return getattr(self, nkey)
 
     def __setattr__(self, key, value):
-        super(CustomDict, self).__setattr__(self._attr_to_key(key), value)
+        try:
+            key = self._attr_keys[key]
+        except KeyError:
+            key = _cached(self._attr_keys, key, self._attr_to_key(key))
+        object.__setattr__(self, key, value)
 
     def __delattr__(self, key):
         super(CustomDict, self).__delattr__(self._attr_to_key(key))
@@ -296,6 +386,92 @@ class CustomDict(MutableMapping, object):
         return json.dumps(self.serializable(), sort_keys=True, indent=4)
 
 
+# Maximum number of attributes and keys (other than the known ones) whose translation
+# is cached for every class.
+_CACHE_SIZE = 1024
+
+_IMMUTABLE = (str, bytes, int, float, bool, type(None), tuple, frozenset)
+
+
+def _cached(table, key, value):
+    if len(table) < _CACHE_SIZE:
+        table[key] = value
+    return value
+
+
+def _storage_key(aliases, key):
+    '''The key that an item is stored in (e.g. `nif:isString` for `text`)'''
+    if key[0] != '_':
+        key = aliases.get(key, key.replace(':', '__', 1))
+    key = key.replace('__', ':', 1)
+    return aliases.get(key, key)
+
+
+def _copier(value):
+    if isinstance(value, _IMMUTABLE):
+        return None
+    if type(value) in (list, dict, set):
+        return type(value).copy
+    return copy.copy
+
+
+def _prepare(cls, slots=None):
+    '''
+    Precompute the tables that CustomDict uses to translate attributes and keys, and
+    to initialize new instances:
+
+        - `_attr_keys`: the key for each known attribute (e.g., `nif:isString` for
+          `text` and `nif__isString`).
+        - `_item_keys`: the key that each known item is stored in.
+        - `_init_defaults`: the default values, and how to copy them.
+        - `_slots`: the descriptor of the slot for each key of compact models.
+        - `_descriptors`: attributes of the class that would hide a key
+          (e.g. properties).
+    '''
+    aliases = cls._aliases
+    inherited = {}
+    for base in reversed(cls.__mro__[1:]):
+        inherited.update(getattr(base, '_slot_names', {}))
+    slot_names = dict(inherited)
+    slot_names.update(slots or {})
+    cls._slot_names = slot_names
+    cls._slots = {key: getattr(cls, name) for key, name in slot_names.items()}
+
+    keys = set(aliases.values()) | set(slot_names)
+    keys |= set(_storage_key(aliases, k) for k in cls._defaults)
+    attr_keys = {}
+    for key in keys:
+        attr_keys[key] = key
+        attr_keys[key.replace(':', '__', 1)] = key
+    for alias, key in aliases.items():
+        attr_keys[alias] = key
+    cls._attr_keys = {k: v for k, v in attr_keys.items()
+                      if cls._attr_to_key(cls, k) == v}
+    item_keys = {}
+    for key in list(keys) + list(aliases):
+        item_keys[key] = _storage_key(aliases, key)
+    cls._item_keys = item_keys
+    cls._init_defaults = tuple((_storage_key(aliases, k), v, _copier(v))
+                               for k, v in cls._defaults.items())
+
+    descriptors = set()
+    for base in cls.__mro__:
+        for name, value in vars(base).items():
+            if hasattr(type(value), '__set__') or hasattr(type(value), '__delete__'):
+                descriptors.add(name)
+    cls._descriptors = descriptors - set(slot_names.values()) - set(slot_names)
+
+    # Access the slots of compact models by key, attribute or alias
+    for key, name in (slots or {}).items():
+        slot = cls.__dict__[name]
+        for attr in [key, key.replace(':', '__', 1)] + [a for a, k in aliases.items()
+                                                       if k == key]:
+            if not any(attr in vars(base) for base in cls.__mro__):
+                setattr(cls, attr, slot)
+
+
+_prepare(CustomDict)
+
 _Alias = namedtuple('Alias', ['indict', 'default'])
 
 
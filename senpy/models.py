@@ -27,8 +27,6 @@ standard_library.install_aliases()
 from future.utils import with_metaclass
 from past.builtins import basestring
 
-from jinja2 import Environment, BaseLoader
-
 import time
 import copy
 import json
@@ -38,15 +36,12 @@ from flask import Response as FlaskResponse
 from pyld import jsonld
 
 import logging
-import jmespath
 
 logging.getLogger('rdflib').setLevel(logging.WARN)
 logger = logging.getLogger(__name__)
 
-from rdflib import Graph
-
-
 from .meta import BaseMeta, CustomDict, alias
+from . import serialization, rdf, projection
 
 DEFINITIONS_FILE = 'definitions.json'
 CONTEXT_PATH = os.path.join(os.path.dirname(os.path.realpath(__file__)),
@@ -173,11 +168,29 @@ class BaseModel(with_metaclass(BaseMeta, CustomDict)):
         """
         headers = headers or {}
         kwargs["with_context"] = not in_headers
-        content, mimetype = self.serialize(format=outformat,
-                                           with_mime=True,
-                                           **kwargs)
+        if kwargs.get('template') is not None:
+            # Render the template piece by piece
+            content = projection.generate(kwargs['template'], self)
+            mimetype = 'text'
+        elif outformat == 'ndjson' and not kwargs.get('fields'):
+            # Stream the response, one line at a time
+            kwargs.pop('template', None)
+            kwargs.pop('fields', None)
+            content = self.ndjson(**kwargs)
+            mimetype = 'application/x-ndjson'
+        elif outformat in rdf.FORMATS and not kwargs.get('fields'):
+            # Stream the triples, one entry at a time
+            kwargs.pop('template', None)
+            kwargs.pop('fields', None)
+            content = self.rdf(format=outformat, **kwargs)
+            mimetype = 'text/{}'.format(outformat)
+        else:
+            kwargs.pop('entries', None)
+            content, mimetype = self.serialize(format=outformat,
+                                               with_mime=True,
+                                               **kwargs)
 
-        if outformat == 'json-ld' and in_headers:
+        if outformat in ['json-ld', 'ndjson'] and in_headers:
             headers.update({
                 "Link":
                 ('<%s>;'
@@ -191,32 +204,32 @@ class BaseModel(with_metaclass(BaseMeta, CustomDict)):
             mimetype=mimetype)
 
     def serialize(self, format='json-ld', with_mime=False,
-                  template=None, prefix=None, fields=None, **kwargs):
-        js = self.jsonld(prefix=prefix, **kwargs)
+                  template=None, prefix=None, fields=None, compact=False, **kwargs):
         if template is not None:
-            rtemplate = Environment(loader=BaseLoader).from_string(template)
-            content = rtemplate.render(**self)
+            content = projection.render(template, self)
             mimetype = 'text'
         elif fields is not None:
-            # Emulate field selection by constructing a template
-            content = json.dumps(jmespath.search(fields, js))
+            if kwargs.get('expanded'):
+                js = self.jsonld(prefix=prefix, **kwargs)
+                content = json.dumps(projection.search(fields, js))
+            else:
+                # Only the parts of the results that the expression uses are serialized
+                with_context = kwargs.pop('with_context', False)
+                context_uri = kwargs.pop('context_uri', None)
+                kwargs.pop('base', None)
+                kwargs.pop('expanded', None)
+                js = projection.project(self, projection.required(fields), **kwargs)
+                js = self._set_context(js, with_context, context_uri)
+                content = json.dumps(projection.compile_fields(fields).search(js))
             mimetype = 'text'
         elif format == 'json-ld':
-            content = json.dumps(js, indent=2, sort_keys=True)
+            content = self.dumps(prefix=prefix, compact=compact, **kwargs)
             mimetype = "application/json"
-        elif format in ['turtle', 'ntriples']:
-            content = json.dumps(js, indent=2, sort_keys=True)
-            logger.debug(js)
-            context = [self._context, {'prefix': prefix, '@base': prefix}]
-            g = Graph().parse(
-                data=content,
-                format='json-ld',
-                prefix=prefix,
-                context=context)
-            logger.debug(
-                'Parsing with prefix: {}'.format(kwargs.get('prefix')))
-            content = g.serialize(format=format,
-                                  prefix=prefix)
+        elif format == 'ndjson':
+            content = ''.join(self.ndjson(prefix=prefix, compact=compact, **kwargs))
+            mimetype = 'application/x-ndjson'
+        elif format in rdf.FORMATS:
+            content = ''.join(self.rdf(format=format, prefix=prefix, **kwargs))
             mimetype = 'text/{}'.format(format)
         else:
             raise Error('Unknown outformat: {}'.format(format))
@@ -225,6 +238,69 @@ class BaseModel(with_metaclass(BaseMeta, CustomDict)):
         else:
             return content
 
+    def dumps(self, compact=False, indent=2, with_context=False, context_uri=None,
+              prefix=None, base=None, expanded=False, backend=None, **kwargs):
+        '''
+        Serialize as JSON-LD, like `json.dumps(self.jsonld(...), indent=2, sort_keys=True)`
+        but without copying the whole tree first (see `senpy.serialization`).
+        '''
+        if expanded:
+            root = self.jsonld(with_context=with_context, context_uri=context_uri,
+                               prefix=prefix, base=base, expanded=expanded, **kwargs)
+        else:
+            root = self._set_context(serialization.fields(self, **kwargs),
+                                     with_context, context_uri)
+        return serialization.dumps(root, compact=compact, indent=indent, backend=backend,
+                                   **kwargs)
+
+    def ndjson(self, entries=None, compact=False, **kwargs):
+        """
+        Serialize as newline-delimited JSON.
+        The first line contains the object without its entries (i.e., its context,
+        activities, parameters...), and it is followed by one line per entry.
+
+        Entries are serialized as soon as they are available, so `entries` can be a
+        generator (e.g. the result of `Senpy.stream`). By default, the entries of
+        the object are used.
+        """
+        if entries is None:
+            entries = self.get('entries', [])
+        header = copy.copy(self)
+        if 'entries' in header:
+            header.entries = []
+        header = header.jsonld(**kwargs)
+        header.pop('entries', None)
+        yield serialization.dumps(header, compact=compact, indent=None) + '\n'
+        kwargs['with_context'] = False
+        try:
+            for entry in entries:
+                yield entry.dumps(compact=compact, indent=None, **kwargs) + '\n'
+        except Exception as ex:
+            # The status has already been sent, so errors are reported in the last line
+            logger.exception(ex)
+            if not isinstance(ex, Error):
+                ex = Error(message='{}'.format(ex), status=500)
+            yield ex.dumps(compact=compact, indent=None, **kwargs) + '\n'
+
+    def rdf(self, format='turtle', entries=None, prefix=None, **kwargs):
+        """
+        Serialize as RDF (turtle or ntriples), without building an RDF graph first
+        (see `senpy.rdf`). The prefix is also the base of relative IRIs.
+
+        Just like in `ndjson`, the triples of every entry are generated as soon as the
+        entry is available, so `entries` can be a generator.
+        """
+        for key in ('with_context', 'context_uri', 'base', 'expanded', 'compact'):
+            kwargs.pop(key, None)
+        try:
+            for chunk in rdf.serialize(self, format=format, context=self._context,
+                                       base=prefix, entries=entries, **kwargs):
+                yield chunk
+        except Exception as ex:
+            # The status has already been sent, so errors are reported in a comment
+            logger.exception(ex)
+            yield '# Error: {}\n'.format('{}'.format(ex).replace('\n', ' '))
+
     def jsonld(self,
                with_context=False,
                context_uri=None,
@@ -248,6 +324,9 @@ class BaseModel(with_metaclass(BaseMeta, CustomDict)):
                     ]
                 }
             )[0]
+        return self._set_context(result, with_context, context_uri)
+
+    def _set_context(self, result, with_context=False, context_uri=None):
         if not with_context:
             try:
                 del result['@context']
@@ -313,6 +392,7 @@ def from_json(injson, **kwargs):
 
 class Entry(BaseModel):
     schema = 'entry'
+    _compact = ['nif:isString']
 
     text = alias('nif:isString')
     sentiments = alias('marl:hasOpinion', [])
@@ -321,6 +401,7 @@ class Entry(BaseModel):
 
 class Sentiment(BaseModel):
     schema = 'sentiment'
+    _compact = ['marl:hasPolarity', 'prov:wasGeneratedBy']
 
     polarity = alias('marl:hasPolarity')
     polarityValue = alias('marl:polarityValue')
@@ -361,6 +442,7 @@ class Datasets(BaseModel):
 
 class Emotion(BaseModel):
     schema = 'emotion'
+    _compact = ['onyx:hasEmotionCategory', 'prov:wasGeneratedBy']
 
 
 class EmotionConversion(BaseModel):
@@ -386,6 +468,7 @@ class EmotionPlugin(BaseModel):
 
 class EmotionSet(BaseModel):
     schema = 'emotionSet'
+    _compact = ['prov:wasGeneratedBy']
 
     onyx__hasEmotion = []
 
@@ -431,10 +514,22 @@ class Results(BaseModel):
     entries = []
 
     def activity(self, id):
-        for i in self.activities:
-            if i.id == id:
-                return i
-        return None
+        index = self.get('_activity_index', None)
+        activities = self.activities
+        if index is None or index[0] is not activities or index[1] != len(activities):
+            # (Re)build the index if the list of activities has changed
+            index = (activities, len(activities), {i.id: i for i in reversed(activities)})
+            self._activity_index = index
+        return index[2].get(id, None)
+
+
+class Job(BaseModel):
+    '''
+    An analysis or evaluation that runs in the background (see senpy.jobs).
+    '''
+    schema = 'job'
+
+    progress = 0
 
 
 class SentimentPlugin(BaseModel):
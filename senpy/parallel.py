@@ -0,0 +1,155 @@
+#
+#    Copyright 2014 Grupo de Sistemas Inteligentes (GSI) DIT, UPM
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#    limitations under the License.
+#
+'''
+Data parallelism for CPU-bound plugins.
+
+The entries of a request are split in chunks, which are processed by a pool of
+forked processes. The processes inherit the (activated) plugins from the
+parent, so no activation is needed in the workers.
+
+Entries travel between processes as plain (serializable) dictionaries, instead
+of pickling the whole model trees.
+'''
+from collections import deque
+
+import multiprocessing
+import pickle
+import threading
+import logging
+
+from . import models, utils
+
+logger = logging.getLogger(__name__)
+
+# Plugins available in the worker processes. They are inherited when forking.
+_plugins = {}
+
+
+def pack(entries):
+    '''Encode a list of entries in the format used between processes'''
+    return pickle.dumps([entry.serializable() for entry in entries],
+                        protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def unpack(data):
+    '''Decode a list of entries encoded with `pack`'''
+    return [models.from_dict(entry, cls=models.Entry) for entry in pickle.loads(data)]
+
+
+def _process_chunk(name, activity, data):
+    plugin = _plugins[name]
+    if not plugin.is_activated:
+        with plugin._lock:
+            plugin._activate()
+    activity = models.from_dict(activity, cls=models.Analysis)
+    activity.plugin = plugin
+    entries = list(plugin.process_entries(unpack(data), activity))
+    return pack(entries), activity.serializable()
+
+
+class Pool(object):
+    '''
+    A pool of processes that run the analyses of parallel plugins.
+
+    The processes are forked with the plugins as they are when the pool is created.
+    When the plugins change (e.g., a plugin is activated or deactivated), the pool is
+    retired (see `retire`) and a new one is used for new requests, while the requests
+    that are using the old pool finish with it.
+    '''
+
+    def __init__(self, plugins, processes, chunk_size=100, max_pending=None):
+        self.processes = processes
+        self.chunk_size = chunk_size
+        self.max_pending = max_pending or 2 * processes
+        _plugins.clear()
+        _plugins.update(plugins)
+        self._ctx = multiprocessing.get_context('fork')
+        self._lock = threading.Lock()
+        # Number of requests that are using the pool
+        self._users = 0
+        self._retired = False
+        self._pool = self._ctx.Pool(processes)
+
+    def process_entries(self, entries, analysis):
+        '''
+        Process the entries with the plugin of an analysis, preserving their order.
+        At most `max_pending` chunks are sent to the pool at any given time.
+        '''
+        # Make sure the ID is generated before sending the activity to the workers,
+        # so that every annotation links to the same activity.
+        analysis.id
+        activity = analysis.serializable()
+        name = analysis.plugin.name.lower()
+
+        pool = self._acquire()
+        try:
+            pending = deque()
+            for window in utils.windows(entries, self.chunk_size):
+                pending.append(pool.apply_async(_process_chunk,
+                                                (name, activity, pack(window))))
+                if len(pending) >= self.max_pending:
+                    for entry in self._collect(pending.popleft(), analysis):
+                        yield entry
+            while pending:
+                for entry in self._collect(pending.popleft(), analysis):
+                    yield entry
+        finally:
+            self._release()
+
+    def _collect(self, job, analysis):
+        data, activity = job.get()
+        # Plugins may add information to their activity (e.g. polarity ranges)
+        for k, v in activity.items():
+            if k not in analysis:
+                analysis[k] = v
+        return unpack(data)
+
+    def _acquire(self):
+        with self._lock:
+            if self._pool is None:
+                # A request that started after the pool was retired
+                self._pool = self._ctx.Pool(self.processes)
+            self._users += 1
+            return self._pool
+
+    def _release(self):
+        with self._lock:
+            self._users -= 1
+            if self._retired and not self._users:
+                self._terminate()
+
+    def retire(self):
+        '''Stop the processes as soon as no request is using them'''
+        with self._lock:
+            self._retired = True
+            if not self._users:
+                self._terminate()
+
+    def close(self):
+        '''Stop the processes now, even if they are being used'''
+        with self._lock:
+            self._terminate()
+
+    def _terminate(self):
+        if self._pool is not None:
+            self._pool.terminate()
+            self._pool.join()
+            self._pool = None
+
+
+def available():
+    '''Whether processes can be forked in this platform'''
+    return 'fork' in multiprocessing.get_all_start_methods()
@@ -25,7 +25,12 @@ from functools import partial
 import os.path
 import os
 import re
+import json
+import hashlib
+import mmap
 import pickle
+import struct
+import tempfile
 import logging
 import pprint
 
@@ -41,8 +46,11 @@ from nltk import download
 from textwrap import dedent
 from sklearn.base import TransformerMixin, BaseEstimator
 from itertools import product
+from array import array
+import numpy as np
+from collections.abc import Mapping
 
-from .. import models, utils
+from .. import models, utils, batching
 from .. import api
 from .. import gsitk_compat
 from .. import testing
@@ -101,8 +109,31 @@ class Plugin(with_metaclass(PluginMeta, models.Plugin)):
 
     Additionally, they may provide a URL (url) of a repository or website.
 
+    Plugins that only append annotations to the entries (i.e., they do not modify the
+    entries, and they do not read the annotations from other plugins) should set
+    ``only_annotates = True``, so they can run concurrently with other analyses.
+    Their annotations may also be cached, unless they set ``cacheable = False``
+    (e.g., if their output is random).
+
+    Plugins are activated concurrently. Plugins that need other plugins to be
+    activated first (e.g., because they share some resources) should list their
+    names in ``activate_after``.
+
+    CPU-bound or memory-hungry plugins can run in their own processes, by setting
+    ``isolated = True`` (see ``senpy.isolation``).
+
+    Plugins with an expensive activation can list the attributes that ``activate``
+    derives from their data files in ``snapshot_attributes``, and the data files in
+    ``snapshot_sources``. After the first activation, those attributes are stored in a
+    snapshot in the data folder, and later activations load them from the snapshot
+    instead of calling ``activate``, as long as the data files and the version of the
+    plugin do not change. In that case, ``restore`` is called instead, to set up
+    the rest of the plugin.
+
     '''
 
+    _SNAPSHOT_MAGIC = b'SENPYSN1'
+
     _terse_keys = ['name', '@id', '@type', 'author', 'description',
                    'extra_params', 'is_activated', 'url', 'version']
 
@@ -164,7 +195,11 @@ class Plugin(with_metaclass(PluginMeta, models.Plugin)):
     def _activate(self):
         if self.is_activated:
             return
-        self.activate()
+        if self._load_snapshot():
+            self.restore()
+        else:
+            self.activate()
+            self._save_snapshot()
         self.is_activated = True
         return self.is_activated
 
@@ -178,6 +213,69 @@ class Plugin(with_metaclass(PluginMeta, models.Plugin)):
     def deactivate(self):
         pass
 
+    def restore(self):
+        '''Finish the activation of a plugin whose state was loaded from a snapshot'''
+        pass
+
+    @property
+    def snapshot_file(self):
+        return self.path('{}.snapshot'.format(self.name))
+
+    def snapshot_key(self):
+        '''
+        A hash of everything the snapshot depends on: the plugin (and its version),
+        the attributes in the snapshot and the contents of its source files.
+        '''
+        key = hashlib.sha1()
+        for part in (type(self).__name__, self.name, self.version,
+                     getattr(self, 'snapshot_attributes', [])):
+            key.update(repr(part).encode('utf-8'))
+        for source in getattr(self, 'snapshot_sources', []):
+            with open(self.find_file(source), 'rb') as f:
+                for chunk in iter(partial(f.read, 1 << 20), b''):
+                    key.update(chunk)
+        return key.hexdigest().encode('ascii')
+
+    def _load_snapshot(self):
+        if not getattr(self, 'snapshot_attributes', None):
+            return False
+        fpath = self.snapshot_file
+        if not os.path.isfile(fpath):
+            return False
+        try:
+            key = self.snapshot_key()
+            with open(fpath, 'rb') as f:
+                if f.read(len(self._SNAPSHOT_MAGIC)) != self._SNAPSHOT_MAGIC:
+                    raise ValueError('unknown format')
+                if f.readline().rstrip(b'\n') != key:
+                    self.log.info('The snapshot of %s is outdated', self.name)
+                    return False
+                state = pickle.load(f)
+        except Exception as ex:
+            self.log.warning('Could not load the snapshot {}: {}'.format(fpath, ex))
+            return False
+        for attr, value in state.items():
+            setattr(self, attr, value)
+        self.log.debug('Loaded the snapshot of %s', self.name)
+        return True
+
+    def _save_snapshot(self):
+        if not getattr(self, 'snapshot_attributes', None):
+            return
+        fpath = self.snapshot_file
+        tmp = '{}.{}.tmp'.format(fpath, os.getpid())
+        try:
+            state = {attr: getattr(self, attr) for attr in self.snapshot_attributes}
+            with open(tmp, 'wb') as f:
+                f.write(self._SNAPSHOT_MAGIC)
+                f.write(self.snapshot_key() + b'\n')
+                pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp, fpath)
+        except Exception as ex:
+            self.log.warning('Could not save the snapshot {}: {}'.format(fpath, ex))
+            if os.path.exists(tmp):
+                os.remove(tmp)
+
     def process(self, request, activity, **kwargs):
         """
         An implemented plugin should override this method.
@@ -188,6 +286,16 @@ class Plugin(with_metaclass(PluginMeta, models.Plugin)):
         request.entries = newentries
         return request
 
+    def streams(self):
+        """
+        Whether entries can be piped through this plugin one at a time.
+        That is the case unless the plugin overrides `process` (or the deprecated `analyse`),
+        which need the whole request.
+        """
+        cls = type(self)
+        return (cls.process in _STREAMING_PROCESS and
+                getattr(cls, 'analyse', Analyser.analyse) is Analyser.analyse)
+
     def process_entries(self, entries, activity):
         for entry in entries:
             self.log.debug('Processing entry with plugin %s: %s', self, entry)
@@ -294,6 +402,45 @@ class Plugin(with_metaclass(PluginMeta, models.Plugin)):
 
         return open(fpath, mode=mode)
 
+    def load_lexicon(self, fname, columns, build, sources=()):
+        '''
+        Open a compiled lexicon (see Lexicon), compiling it first if it does not exist
+        or if any of its source files is newer.
+        `build` is called to compile the lexicon. It should return (key, values) pairs,
+        with the values in the same order as `columns`.
+        '''
+        sources = [self.find_file(source) for source in sources]
+        fallback = os.path.join(tempfile.gettempdir(), '{}-{}'.format(self.name, fname))
+        try:
+            path = self.find_file(fname)
+        except IOError:
+            path = None
+        for candidate in (path, fallback):
+            lexicon = self._open_lexicon(candidate, columns, sources)
+            if lexicon is not None:
+                return lexicon
+        path = self.path(fname)
+        self.log.info('Compiling lexicon: %s', path)
+        # Errors in the sources should not be mistaken for errors writing the lexicon
+        items = list(build())
+        try:
+            return Lexicon.compile(path, items, columns)
+        except (IOError, OSError) as ex:
+            self.log.warning('Could not write the lexicon in the data folder ({}). '
+                             'Using {} instead'.format(ex, fallback))
+            return Lexicon.compile(fallback, items, columns)
+
+    def _open_lexicon(self, path, columns, sources):
+        '''Open a compiled lexicon, unless it is missing, outdated or has other columns'''
+        if path is None or not os.path.exists(path):
+            return None
+        if any(os.path.getmtime(source) > os.path.getmtime(path) for source in sources):
+            return None
+        lexicon = Lexicon(path)
+        if lexicon.columns != list(columns):
+            return None
+        return lexicon
+
     def serve(self, debug=True, **kwargs):
         utils.easy(plugin_list=[self, ], plugin_folder=None, debug=debug, **kwargs)
 
@@ -355,6 +502,8 @@ class Analyser(Plugin):
 
 AnalysisPlugin = Analyser
 
+_STREAMING_PROCESS = (Plugin.process, Analyser.process)
+
 
 class Transformation(AnalysisPlugin):
     '''Empty'''
@@ -480,6 +629,15 @@ class EmotionConversion(Conversion):
                 return True
         return False
 
+    def convert_many(self, emotionSets, fromModel, toModel, params):
+        '''
+        Convert several emotion sets at once.
+        It returns a list with the converted sets for each of the original sets.
+        Plugins can override this method to convert the sets more efficiently.
+        '''
+        return [list(self.convert(emotionSet, fromModel, toModel, params))
+                for emotionSet in emotionSets]
+
 
 EmotionConversionPlugin = EmotionConversion
 
@@ -487,10 +645,41 @@ EmotionConversionPlugin = EmotionConversion
 class PostProcessing(Plugin):
     '''
     A plugin that converts the output of other plugins (post-processing).
+
+    Post-processing plugins declare what triggers them, so that only the relevant
+    plugins are considered for each request:
+
+    * ``trigger_params``: parameters of the request (e.g. ``maxemotion``)
+    * ``trigger_models``: emotion models used by the plugins in the analysis
+    * ``trigger_types``: types of the plugins in the analysis (e.g. ``emotionPlugin``)
+
+    Plugins without triggers are considered for every request.
+    In any case, `check` has the final word.
     '''
+    trigger_params = []
+    trigger_models = []
+    trigger_types = []
+
+    def has_triggers(self):
+        return bool(self.trigger_params or self.trigger_models or self.trigger_types)
+
+    def triggered(self, request, plugins):
+        '''Whether any of the triggers of this plugin is present in a request'''
+        if any(param in request.parameters for param in self.trigger_params):
+            return True
+        for analysis in plugins:
+            plugin = getattr(analysis, 'plugin', None)
+            if plugin is None:
+                continue
+            if plugin.get('onyx:usesEmotionModel', None) in self.trigger_models:
+                return True
+            if any(isinstance(plugin, plugin_class(t)) for t in self.trigger_types):
+                return True
+        return False
+
     def check(self, request, plugins):
         '''Should this plugin be run for this request?'''
-        return False
+        return self.triggered(request, plugins)
 
 
 class Box(Analyser):
@@ -507,8 +696,20 @@ class Box(Analyser):
     into the input to the `predict_one` method, which only uses an array of features.
     The ``to_entry`` method converts the results given by the box into an entry that senpy can
     handle.
+
+    Entries are passed to ``predict_many`` in windows of at most ``window_size`` entries, so
+    that a box can be part of a streaming pipeline. Set it to ``None`` to get all the entries
+    at once.
+
+    Boxes with vectorised models can set ``batching = True`` to gather the features of
+    concurrent requests into shared calls to ``predict_many`` (see `senpy.batching`).
+    ``batching`` can also be a dictionary with the options of the scheduler
+    (``max_batch_size``, ``max_wait`` and ``target_latency``).
     '''
 
+    window_size = 1000
+    batching = False
+
     def to_features(self, entry, activity=None):
         '''Transforms a query (entry+param) into an input for the black box'''
         return entry
@@ -527,18 +728,40 @@ class Box(Analyser):
             results.append(self.predict_one(features=feat, activity=activity))
         return results
 
+    @property
+    def scheduler(self):
+        '''The scheduler that batches the predictions of concurrent requests'''
+        scheduler = getattr(self, '_scheduler', None)
+        if scheduler is None:
+            with self._lock:
+                scheduler = getattr(self, '_scheduler', None)
+                if scheduler is None:
+                    options = self.batching if isinstance(self.batching, dict) else {}
+                    scheduler = self._scheduler = batching.BatchScheduler(self, **options)
+        return scheduler
+
+    def _deactivate(self):
+        scheduler = getattr(self, '_scheduler', None)
+        if scheduler is not None:
+            scheduler.close()
+        super(Box, self)._deactivate()
+
     def process_entry(self, entry, activity):
         for i in self.process_entries([entry], activity):
             yield i
 
     def process_entries(self, entries, activity):
-        features = []
-        for entry in entries:
-            features.append(self.to_features(entry=entry, activity=activity))
-        results = self.predict_many(features=features, activity=activity)
+        predict = self.predict_many
+        if self.batching:
+            predict = self.scheduler.predict
+        for window in utils.windows(entries, self.window_size):
+            features = []
+            for entry in window:
+                features.append(self.to_features(entry=entry, activity=activity))
+            results = predict(features=features, activity=activity)
 
-        for (result, entry) in zip(results, entries):
-            yield self.to_entry(features=result, entry=entry, activity=activity)
+            for (result, entry) in zip(results, window):
+                yield self.to_entry(features=result, entry=entry, activity=activity)
 
 
 class TextBox(Box):
@@ -555,6 +778,7 @@ class SentimentBox(TextBox, SentimentPlugin):
 
     classes = ['marl:Positive', 'marl:Neutral', 'marl:Negative']
     binary = True
+    only_annotates = True
 
     def to_entry(self, features, entry, activity, **kwargs):
 
@@ -592,6 +816,7 @@ class EmotionBox(TextBox, EmotionPlugin):
 
     EMOTIONS = []
     with_intensity = True
+    only_annotates = True
 
     def to_entry(self, features, entry, activity, **kwargs):
         s = models.EmotionSet()
@@ -610,6 +835,82 @@ class EmotionBox(TextBox, EmotionPlugin):
         return entry
 
 
+class SklearnBox(TextBox):
+    '''
+    A box that wraps a fitted scikit-learn estimator (e.g. a pipeline).
+
+    The estimator is called once per window of entries, with the texts of the entries.
+    Its predictions (or its probabilities, if ``probabilities`` is set) are turned into a
+    row per entry with a column per class of the plugin (``classes``, or ``EMOTIONS`` in
+    emotion plugins), which is what ``SentimentBox`` and ``EmotionBox`` expect:
+
+    .. code-block:: python
+
+        class MyPlugin(SklearnBox, SentimentBox):
+            model_file = 'model.joblib'
+            labels = {1: 'marl:Positive', -1: 'marl:Negative'}
+
+    ``labels`` maps the classes of the estimator to the classes of the plugin (by default,
+    they are the same). The estimator can be set in ``activate``, or loaded from
+    ``model_file``, a joblib dump in the data folder. The arrays of the model are
+    memory-mapped, so processes that load the same file share them.
+    '''
+
+    model_file = None
+    labels = None
+    probabilities = False
+
+    @property
+    def estimator(self):
+        estimator = getattr(self, '_estimator', None)
+        if estimator is None and self.model_file:
+            estimator = self._estimator = self.load_model(self.model_file)
+        return estimator
+
+    @estimator.setter
+    def estimator(self, value):
+        self._estimator = value
+
+    def load_model(self, fname):
+        import joblib
+        return joblib.load(self.find_file(fname), mmap_mode='r')
+
+    def to_features(self, entry, activity=None):
+        return entry['nif:isString']
+
+    def _class_matrix(self, estimator):
+        '''
+        A matrix that converts the classes of the estimator (rows) into the
+        classes of the plugin (columns).
+        '''
+        cached = getattr(self, '_matrix', None)
+        if cached is not None and cached[0] is estimator:
+            return cached[1]
+        outputs = list(self['classes'] if 'classes' in self else self.EMOTIONS)
+        labels = self.labels or {}
+        matrix = np.zeros((len(estimator.classes_), len(outputs)))
+        for ix, label in enumerate(estimator.classes_):
+            label = labels.get(label, label)
+            if label not in outputs:
+                raise models.Error('Unknown class for plugin {}: {}'.format(self.name, label))
+            matrix[ix, outputs.index(label)] = 1
+        self._matrix = (estimator, matrix)
+        return matrix
+
+    def predict_many(self, features, activity=None):
+        estimator = self.estimator
+        if estimator is None:
+            raise models.Error('Plugin {} does not have an estimator'.format(self.name))
+        features = list(features)
+        if not features:
+            return []
+        matrix = self._class_matrix(estimator)
+        if self.probabilities:
+            return estimator.predict_proba(features).dot(matrix)
+        predictions = estimator.predict(features)
+        return matrix[np.searchsorted(estimator.classes_, predictions)]
+
+
 class MappingMixin(object):
     @property
     def mappings(self):
@@ -680,24 +981,168 @@ class ShelfMixin(object):
                 raise
 
 
+class Lexicon(Mapping):
+    '''
+    A read-only table of keys (e.g. words) and numeric values (e.g. valence and arousal).
+
+    Lexicons are compiled (see `Lexicon.compile`) into a file with a table of sorted
+    keys and a column of floats for each value. The file is memory-mapped, so every
+    process that opens the same lexicon shares a single copy in memory, and keys are
+    found with a binary search.
+
+    The value of a key is a dictionary of column names and values.
+    '''
+
+    MAGIC = b'SENPYLX1'
+    # Magic number, number of keys, number of columns and size of the metadata
+    _HEADER = struct.Struct('<8sIII')
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self._size, ncolumns, meta = self._HEADER.unpack_from(self._mmap)
+        if magic != self.MAGIC:
+            raise models.Error('Not a compiled lexicon: {}'.format(path))
+        start = self._HEADER.size
+        self.columns = json.loads(self._mmap[start:start + meta].decode('utf-8'))
+        start = _aligned(start + meta)
+        end = start + 8 * (self._size + 1)
+        self._offsets = memoryview(self._mmap)[start:end].cast('Q')
+        self._keys = end
+        start = _aligned(end + self._offsets[self._size])
+        self._values = np.frombuffer(self._mmap, dtype='<f8', count=self._size * ncolumns,
+                                     offset=start).reshape((ncolumns, self._size))
+        self._columns = {column: ix for ix, column in enumerate(self.columns)}
+
+    @classmethod
+    def compile(cls, path, items, columns):
+        '''
+        Compile a lexicon from (key, values) pairs, and open it.
+        If a key is repeated, only its last values are kept.
+        '''
+        columns = list(columns)
+        table = {}
+        for key, values in items:
+            table[key] = values
+        keys = sorted(table)
+        encoded = [key.encode('utf-8') for key in keys]
+        offsets = array('Q', [0])
+        for key in encoded:
+            offsets.append(offsets[-1] + len(key))
+        values = np.zeros((len(columns), len(keys)), dtype='<f8')
+        for ix, key in enumerate(keys):
+            values[:, ix] = table[key]
+        meta = json.dumps(columns).encode('utf-8')
+        tmp = '{}.{}.tmp'.format(path, os.getpid())
+        with open(tmp, 'wb') as f:
+            f.write(cls._HEADER.pack(cls.MAGIC, len(keys), len(columns), len(meta)))
+            f.write(meta)
+            f.write(b'\0' * (_aligned(f.tell()) - f.tell()))
+            f.write(offsets.tobytes())
+            f.write(b''.join(encoded))
+            f.write(b'\0' * (_aligned(f.tell()) - f.tell()))
+            f.write(values.tobytes())
+        os.replace(tmp, path)
+        return cls(path)
+
+    def index(self, key):
+        '''Position of a key in the table, or -1 if it is not in the lexicon'''
+        target = key.encode('utf-8')
+        lo, hi = 0, self._size
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._key(mid) < target:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < self._size and self._key(lo) == target:
+            return lo
+        return -1
+
+    def value(self, key, column, default=None):
+        '''Value of a single column for a key'''
+        ix = self.index(key)
+        if ix < 0:
+            return default
+        return float(self._values[self._columns[column], ix])
+
+    def column(self, column):
+        '''All the values of a column, in the order of the keys'''
+        return self._values[self._columns[column]]
+
+    def view(self, column):
+        '''A mapping of the keys to the values of a single column'''
+        return _LexiconColumn(self, self._columns[column])
+
+    def _key(self, ix):
+        return self._mmap[self._keys + self._offsets[ix]:self._keys + self._offsets[ix + 1]]
+
+    def __getitem__(self, key):
+        ix = self.index(key)
+        if ix < 0:
+            raise KeyError(key)
+        return dict(zip(self.columns, self._values[:, ix].tolist()))
+
+    def __contains__(self, key):
+        return isinstance(key, str) and self.index(key) >= 0
+
+    def __iter__(self):
+        for ix in range(self._size):
+            yield self._key(ix).decode('utf-8')
+
+    def __len__(self):
+        return self._size
+
+
+class _LexiconColumn(Mapping):
+    def __init__(self, lexicon, column):
+        self._lexicon = lexicon
+        self._column = column
+
+    def __getitem__(self, key):
+        ix = self._lexicon.index(key)
+        if ix < 0:
+            raise KeyError(key)
+        return float(self._lexicon._values[self._column, ix])
+
+    def __contains__(self, key):
+        return key in self._lexicon
+
+    def __iter__(self):
+        return iter(self._lexicon)
+
+    def __len__(self):
+        return len(self._lexicon)
+
+
+def _aligned(position, alignment=8):
+    return position + (-position % alignment)
+
+
+def plugin_class(plugin_type):
+    """ Get the class for a type of plugin, given by name (e.g. analysisPlugin) or class """
+    if isinstance(plugin_type, PluginMeta):
+        plugin_type = plugin_type.__name__
+    try:
+        plugin_type = plugin_type[0].upper() + plugin_type[1:]
+        return globals()[plugin_type]
+    except KeyError:
+        raise models.Error('{} is not a valid type'.format(plugin_type))
+
+
 def pfilter(plugins, plugin_type=Analyser, **kwargs):
     """ Filter plugins by different criteria """
     if isinstance(plugins, models.Plugins):
         plugins = plugins.plugins
-    elif isinstance(plugins, dict):
+    elif isinstance(plugins, (dict, PluginRegistry)):
         plugins = plugins.values()
     logger.debug('#' * 100)
     logger.debug('plugin_type {}'.format(plugin_type))
     if plugin_type:
-        if isinstance(plugin_type, PluginMeta):
-            plugin_type = plugin_type.__name__
-        try:
-            plugin_type = plugin_type[0].upper() + plugin_type[1:]
-            pclass = globals()[plugin_type]
-            logger.debug('Class: {}'.format(pclass))
-            candidates = filter(lambda x: isinstance(x, pclass), plugins)
-        except KeyError:
-            raise models.Error('{} is not a valid type'.format(plugin_type))
+        pclass = plugin_class(plugin_type)
+        logger.debug('Class: {}'.format(pclass))
+        candidates = filter(lambda x: isinstance(x, pclass), plugins)
     else:
         candidates = plugins
 
@@ -716,6 +1161,102 @@ def pfilter(plugins, plugin_type=Analyser, **kwargs):
     return candidates
 
 
+class PluginRegistry(Mapping):
+    """
+    A collection of plugins, indexed by (lowercase) name.
+
+    It also keeps indexes by id, type of plugin and activation status, so that plugins
+    can be found without going through all of them.
+    The registry needs to be updated (see `update`) when a plugin is (de)activated.
+    """
+
+    def __init__(self, plugins=None):
+        self._by_name = {}
+        self._by_id = {}
+        self._by_type = {}
+        self._activated = set()
+        self._queries = {}
+        for plugin in plugins or []:
+            self.add(plugin)
+
+    def add(self, plugin):
+        name = plugin.name.lower()
+        if name in self._by_name:
+            self.remove(self._by_name[name])
+        self._by_name[name] = plugin
+        self._by_id[plugin.id] = plugin
+        for cls in type(plugin).__mro__:
+            if isinstance(cls, PluginMeta):
+                self._by_type.setdefault(cls, {})[name] = plugin
+        self.update(plugin)
+
+    def remove(self, plugin):
+        name = plugin.name.lower()
+        plugin = self._by_name.pop(name)
+        self._by_id.pop(plugin.id, None)
+        for plugins in self._by_type.values():
+            plugins.pop(name, None)
+        self._activated.discard(name)
+        self._queries.clear()
+
+    def update(self, plugin):
+        """ Update the indexes after a plugin has been (de)activated """
+        name = plugin.name.lower()
+        if plugin.is_activated:
+            self._activated.add(name)
+        else:
+            self._activated.discard(name)
+        self._queries.clear()
+
+    def by_id(self, id):
+        return self._by_id.get(id, None)
+
+    def filter(self, plugin_type=None, is_activated=None, **kwargs):
+        """
+        Plugins that match the given criteria, sorted by id.
+        Same as pfilter, but results are cached until the registry changes.
+        """
+        if 'name' in kwargs:
+            plugin = self._by_name.get(kwargs.pop('name').lower(), None)
+            candidates = [plugin] if plugin else []
+        elif 'id' in kwargs:
+            plugin = self._by_id.get(kwargs.pop('id'), None)
+            candidates = [plugin] if plugin else []
+        else:
+            candidates = self._query(plugin_type, is_activated)
+            plugin_type = is_activated = None
+        if candidates and (plugin_type or is_activated is not None):
+            pclass = plugin_class(plugin_type) if plugin_type else Plugin
+            candidates = [x for x in candidates if isinstance(x, pclass) and
+                          (is_activated is None or
+                           (x.name.lower() in self._activated) == is_activated)]
+        if kwargs:
+            candidates = list(pfilter(candidates, plugin_type=None, **kwargs))
+        return candidates
+
+    def _query(self, plugin_type, is_activated):
+        key = (plugin_type, is_activated)
+        if key not in self._queries:
+            pclass = plugin_class(plugin_type) if plugin_type else Plugin
+            candidates = self._by_type.get(pclass, {})
+            if is_activated is not None:
+                candidates = [x for (name, x) in candidates.items()
+                              if (name in self._activated) == is_activated]
+            else:
+                candidates = candidates.values()
+            self._queries[key] = sorted(candidates, key=lambda x: x.id)
+        return list(self._queries[key])
+
+    def __getitem__(self, name):
+        return self._by_name[name]
+
+    def __iter__(self):
+        return iter(self._by_name)
+
+    def __len__(self):
+        return len(self._by_name)
+
+
 def load_module(name, root=None):
     if root:
         sys.path.append(root)
@@ -10,6 +10,8 @@ import string
 import xml.etree.ElementTree as ET
 import math
 
+from functools import partial
+
 from sklearn.svm import LinearSVC
 from sklearn.feature_extraction import DictVectorizer
 
@@ -88,27 +90,30 @@ class ANEW(EmotionPlugin):
     anew_path_en = "Dictionary/ANEW2010All.txt"
     onyx__usesEmotionModel = MODEL
     nltk_resources = ['stopwords']
+    parallel = True
+    only_annotates = True
 
     def activate(self, *args, **kwargs):
         self._stopwords = stopwords.words('english')
+        # The dictionaries are compiled lexicons, shared by all the processes
         dictionary={}
-        dictionary['es'] = {}
-        with self.open(self.anew_path_es,'r') as tabfile:
-            reader = csv.reader(tabfile, delimiter='\t')
-            for row in reader:
-                dictionary['es'][row[2]]={}
-                dictionary['es'][row[2]]['V']=row[3]
-                dictionary['es'][row[2]]['A']=row[5]
-                dictionary['es'][row[2]]['D']=row[7]
-        dictionary['en'] = {}
-        with self.open(self.anew_path_en,'r') as tabfile:
+        read_es = partial(self._read_anew, self.anew_path_es, 2, [3, 5, 7])
+        read_en = partial(self._read_anew, self.anew_path_en, 0, [2, 4, 6])
+        dictionary['es'] = self.load_lexicon('emotion-anew_es.lex', ['V', 'A', 'D'], read_es,
+                                             sources=[self.anew_path_es])
+        dictionary['en'] = self.load_lexicon('emotion-anew_en.lex', ['V', 'A', 'D'], read_en,
+                                             sources=[self.anew_path_en])
+        self._dictionary = dictionary
+
+    def _read_anew(self, path, word, columns):
+        with self.open(path,'r') as tabfile:
             reader = csv.reader(tabfile, delimiter='\t')
             for row in reader:
-                dictionary['en'][row[0]]={}
-                dictionary['en'][row[0]]['V']=row[2]
-                dictionary['en'][row[0]]['A']=row[4]
-                dictionary['en'][row[0]]['D']=row[6]
-        self._dictionary = dictionary
+                try:
+                    yield row[word], [float(row[ix]) for ix in columns]
+                except ValueError:
+                    # Headers
+                    continue
 
     def _my_preprocessor(self, text):
 
@@ -200,7 +205,7 @@ class ANEW(EmotionPlugin):
         emotions.prov(activity)
 
         emotions.onyx__hasEmotion.append(emotion1)
-        entry.emotions = [emotions, ]
+        entry.emotions.append(emotions)
 
         yield entry
 
@@ -54,14 +54,19 @@ class DepecheMood(EmotionBox):
         self.LEXICON_URL = "https://github.com/marcoguerini/DepecheMood/raw/master/DepecheMood%2B%2B/DepecheMood_english_token_full.tsv"
         self._denoise = ignore(set(string.punctuation)|set('«»'))
         self._stop_words = []
-        self._lex_vocab = None
         self._lex = None
 
     def activate(self):
-        self._lex = self.download_lex()
-        self._lex_vocab = set(list(self._lex.keys()))
+        # A compiled lexicon, shared by all the processes
+        self._lex = self.load_lexicon('DepecheMood_english_token_full.lex',
+                                      self.DM_EMOTIONS,
+                                      self._lex_items)
         self._stop_words = stopwords.words('english') + ['']
 
+    def _lex_items(self):
+        for word, values in self.download_lex().items():
+            yield word, [values[emotion] for emotion in self.DM_EMOTIONS]
+
     def clean_str(self, string):
         string = re.sub(r"[^A-Za-z0-9().,!?\'\`]", " ", string)
         string = re.sub(r"[0-9]+", " num ", string)
@@ -90,7 +95,7 @@ class DepecheMood(EmotionBox):
     def estimate_emotion(self, tokens, emotion):
         s = []
         for tok in tokens:
-            s.append(self._lex[tok][emotion])
+            s.append(self._lex.value(tok, emotion))
         dividend = np.sum(s) if np.sum(s) > 0 else 0
         divisor = len(s) if len(s) > 0 else 1
         S = np.sum(s) / divisor
@@ -98,7 +103,7 @@ class DepecheMood(EmotionBox):
 
     def estimate_all_emotions(self, tokens):
         S = []
-        intersection = set(tokens) & self._lex_vocab
+        intersection = set(tok for tok in tokens if tok in self._lex)
         for emotion in self.DM_EMOTIONS:
             s = self.estimate_emotion(intersection, emotion)
             S.append(s)
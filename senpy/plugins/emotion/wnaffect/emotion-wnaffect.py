@@ -9,11 +9,11 @@ from nltk.corpus import stopwords
 from nltk.corpus import WordNetCorpusReader
 from nltk.stem import wordnet
 from emotion import Emotion as Emo
-from senpy.plugins import EmotionPlugin, AnalysisPlugin, ShelfMixin
+from senpy.plugins import EmotionPlugin, AnalysisPlugin
 from senpy.models import Results, EmotionSet, Entry, Emotion
 
 
-class WNAffect(EmotionPlugin, ShelfMixin):
+class WNAffect(EmotionPlugin):
     '''
     Emotion classifier using WordNet-Affect to calculate the percentage
     of each emotion. This plugin classifies among 6 emotions: anger,fear,disgust,joy,sadness
@@ -36,6 +36,10 @@ class WNAffect(EmotionPlugin, ShelfMixin):
     wn16_path = "wordnet1.6/dict"
     onyx__usesEmotionModel = "emoml:big6"
     nltk_resources = ['stopwords', 'averaged_perceptron_tagger', 'wordnet']
+    parallel = True
+    only_annotates = True
+    snapshot_attributes = ['_total_synsets']
+    snapshot_sources = [synsets_path, hierarchy_path]
 
     def _load_synsets(self, synsets_path):
         """Returns a dictionary POS tag -> synset offset -> emotion (str -> int -> str)."""
@@ -73,6 +77,10 @@ class WNAffect(EmotionPlugin, ShelfMixin):
                 Emo.emotions[name] = Emo(name, elem.get("isa"))
 
     def activate(self, *args, **kwargs):
+        self.restore()
+        self._total_synsets = self._load_synsets(self.find_file(self.synsets_path))
+
+    def restore(self):
 
         self._stopwords = stopwords.words('english')
         self._wnlemma = wordnet.WordNetLemmatizer()
@@ -106,19 +114,10 @@ class WNAffect(EmotionPlugin, ShelfMixin):
 
         self._load_emotions(self.find_file(self.hierarchy_path))
 
-        if 'total_synsets' not in self.sh:
-            total_synsets = self._load_synsets(self.find_file(self.synsets_path))
-            self.sh['total_synsets'] = total_synsets
-
-        self._total_synsets = self.sh['total_synsets']
-
         self._wn16_path = self.wn16_path
         self._wn16 = WordNetCorpusReader(self.find_file(self._wn16_path), nltk.data.find(self.find_file(self._wn16_path)))
 
 
-    def deactivate(self, *args, **kwargs):
-        self.save(ignore_errors=True)
-
     def _my_preprocessor(self, text):
 
         regHttp = re.compile(
@@ -242,7 +241,7 @@ class WNAffect(EmotionPlugin, ShelfMixin):
                     onyx__hasEmotionCategory=self._wnaffect_mappings[i],
                     onyx__hasEmotionIntensity=feature_text[i]))
 
-        entry.emotions = [emotionSet]
+        entry.emotions.append(emotionSet)
 
         yield entry
 
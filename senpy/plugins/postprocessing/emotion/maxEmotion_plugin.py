@@ -21,6 +21,7 @@ class MaxEmotion(PostProcessing):
     '''Plugin to extract the emotion with highest value from an EmotionSet'''
     author = '@dsuarezsouto'
     version = '0.1'
+    trigger_params = ['maxemotion']
 
     def process_entry(self, entry, activity):
         if len(entry.emotions) < 1:
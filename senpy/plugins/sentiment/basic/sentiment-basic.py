@@ -45,7 +45,10 @@ class SentimentBasic(SentimentBox):
 
     def _load_swn(self):
         self.swn_path = self.find_file(self.sentiword_path)
-        swn = SentiWordNet(self.swn_path)
+        lexicon = self.load_lexicon('SentiWordNet_3.0.lex', ['pos', 'neg'],
+                                    lambda: SentiWordNet(self.swn_path).items(),
+                                    sources=[self.swn_path])
+        swn = SentiWordNet(self.swn_path, lexicon=lexicon)
         return swn
 
     def _load_pos_tagger(self):
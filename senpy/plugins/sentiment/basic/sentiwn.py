@@ -21,15 +21,44 @@ import re
 
 from nltk.corpus import wordnet
 
+def synset_key(pos, offset):
+    """
+    Key of a synset in a compiled lexicon (see senpy.plugins.Lexicon)
+    """
+    return "{}:{}".format(pos, offset)
+
+
 class SentiWordNet(object):
     """
-    Interface to SentiWordNet
+    Interface to SentiWordNet.
+    The scores can be read from the SentiWordNet file, or from a compiled lexicon,
+    with the "pos" and "neg" scores of every synset (see synset_key).
     """
-    def __init__(self,swn_file):
+    def __init__(self,swn_file,lexicon=None):
         """
         """
         self.swn_file = swn_file
-        self.pos_synset = self.__parse_swn_file()
+        self.lexicon = lexicon
+        self.pos_synset = self.__parse_swn_file() if lexicon is None else None
+
+    def items(self):
+        """
+        Scores of every synset, in the format of a compiled lexicon
+        """
+        pos_synset = self.pos_synset or self.__parse_swn_file()
+        for (pos, offset), scores in pos_synset.items():
+            yield synset_key(pos, offset), scores
+
+    def scores(self, pos, offset):
+        """
+        Positive and negative scores of a synset, or None if it is not in SentiWordNet
+        """
+        if self.lexicon is None:
+            return self.pos_synset.get((pos, offset), None)
+        row = self.lexicon.get(synset_key(pos, offset), None)
+        if row is None:
+            return None
+        return row["pos"], row["neg"]
 
     def __parse_swn_file(self):
         """
@@ -62,8 +91,9 @@ class SentiWordNet(object):
         senti_scores = []
         synsets = wordnet.synsets(word,pos)
         for synset in synsets:
-            if (synset.pos(), synset.offset()) in self.pos_synset:
-                pos_val, neg_val = self.pos_synset[(synset.pos(), synset.offset())]
+            scores = self.scores(synset.pos(), synset.offset())
+            if scores is not None:
+                pos_val, neg_val = scores
                 senti_scores.append({"pos":pos_val,"neg":neg_val,\
                 "obj": 1.0 - (pos_val - neg_val),'synset':synset})
 
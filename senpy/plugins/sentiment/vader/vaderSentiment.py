@@ -19,20 +19,28 @@ For example:
 import os, math, re, sys, fnmatch, string 
 import codecs
 
-def make_lex_dict(f):
-    maps = {}
+def read_lexicon(f):
     with codecs.open(f, encoding='iso-8859-1') as f:
         for wmsr in f:
             w, m = wmsr.strip().split('\t')[:2]
-            maps[w] = m
-    return maps
+            yield w, m
+
+def make_lex_dict(f):
+    return dict(read_lexicon(f))
     
 f = 'vader_sentiment_lexicon.txt' # empirically derived valence ratings for words, emoticons, slang, swear words, acronyms/initialisms
-try:
-    word_valence_dict = make_lex_dict(f)
-except:
+if not os.path.exists(f):
     f = os.path.join(os.path.dirname(__file__),'vader_sentiment_lexicon.txt')
-    word_valence_dict = make_lex_dict(f)
+LEXICON_FILE = f
+
+# Loaded on first use, unless it is replaced (e.g. by a shared senpy Lexicon)
+word_valence_dict = None
+
+def load_lexicon():
+    global word_valence_dict
+    if word_valence_dict is None:
+        word_valence_dict = make_lex_dict(LEXICON_FILE)
+    return word_valence_dict
 
 # for removing punctuation
 regex_remove_punctuation = re.compile('[%s]' % re.escape(string.punctuation))
@@ -42,6 +50,7 @@ def sentiment(text):
     Returns a float for sentiment strength based on the input text.
     Positive values are positive valence, negative value are negative valence.
     """
+    load_lexicon()
     wordsAndEmoticons = str(text).split() #doesn't separate words from adjacent punctuation (keeps emoticons & contractions)
     text_mod = regex_remove_punctuation.sub('', text) # removes punctuation (but loses emoticons & contractions)
     wordsOnly = str(text_mod).split()
@@ -1,5 +1,6 @@
 # -*- coding: utf-8 -*-
 
+import vaderSentiment
 from vaderSentiment import sentiment
 from senpy.plugins import SentimentBox, SenpyPlugin
 from senpy.models import Results, Sentiment, Entry
@@ -35,7 +36,18 @@ class VaderSentimentPlugin(SentimentBox):
 
     _VADER_KEYS = ['pos', 'neu', 'neg']
     binary = False
+    parallel = True
 
+    def activate(self):
+        # Processes that use the plugin share a single copy of the lexicon
+        lexicon = self.load_lexicon('vader_sentiment_lexicon.lex', ['valence'],
+                                    self._read_lexicon,
+                                    sources=[vaderSentiment.LEXICON_FILE])
+        vaderSentiment.word_valence_dict = lexicon.view('valence')
+
+    def _read_lexicon(self):
+        for word, valence in vaderSentiment.read_lexicon(vaderSentiment.LEXICON_FILE):
+            yield word, [float(valence)]
 
     def predict_one(self, features, activity):
         text_input = ' '.join(features)
@@ -0,0 +1,183 @@
+#
+#    Copyright 2014 Grupo de Sistemas Inteligentes (GSI) DIT, UPM
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#    limitations under the License.
+#
+'''
+Output options that select or reshape part of the results: Jinja2 templates
+(``template``) and jmespath expressions (``fields``).
+
+Clients tend to send the same few templates and expressions over and over, so they
+are compiled once, and kept in an LRU indexed by their source text (``CACHE_SIZE``
+of each). Templates are compiled by a single sandboxed Jinja2 environment, since
+they come from the requests.
+
+Both options usually need a small part of the results (e.g., the polarity of every
+entry), so the rest is never serialized:
+
+    - The expressions are analysed when they are compiled (``required``), to get the
+      tree of keys that they can reach. Only those keys are copied from the models
+      (``project``), so activities, provenance or annotations that the expression
+      does not use are skipped. Expressions that need whole values (e.g.
+      functions and comparisons) get a copy of those values.
+    - Templates only get the variables that they use (``variables``).
+
+The fields of each model are taken from ``serialization.fields``, so ``verbose=False``
+(i.e., only the ``_terse_keys`` of a model) is applied before the projection.
+'''
+from functools import lru_cache
+
+import logging
+
+import jmespath
+from jinja2 import BaseLoader, meta
+from jinja2.sandbox import SandboxedEnvironment
+
+from . import config, serialization
+
+logger = logging.getLogger(__name__)
+
+CACHE_SIZE = config.template_cache_size
+
+# A tree of required keys that contains everything
+ALL = None
+
+environment = SandboxedEnvironment(loader=BaseLoader())
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def compile_template(source):
+    '''The compiled version of a template'''
+    return environment.from_string(source)
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def compile_fields(expression):
+    '''The compiled version of a jmespath expression'''
+    return jmespath.compile(expression)
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def variables(template):
+    '''The (top-level) variables that a template uses'''
+    return frozenset(meta.find_undeclared_variables(environment.parse(template)))
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def required(fields):
+    '''
+    The tree of keys that a jmespath expression needs from the data.
+    Each key maps to the tree of its value, or to ``ALL`` if the whole value is needed.
+    Lists are transparent: the tree of a list applies to each of its elements.
+    '''
+    return _required(compile_fields(fields).parsed, ALL)
+
+
+def _merge(a, b):
+    if a is ALL or b is ALL:
+        return ALL
+    merged = dict(a)
+    for key, tree in b.items():
+        merged[key] = _merge(merged[key], tree) if key in merged else tree
+    return merged
+
+
+def _required(node, rest):
+    '''The tree that a node of the AST needs from its input, to produce `rest`'''
+    kind = node['type']
+    children = node['children']
+    if kind == 'field':
+        return {node['value']: rest}
+    if kind in ('subexpression', 'projection', 'pipe'):
+        return _required(children[0], _required(children[1], rest))
+    if kind in ('index_expression', 'flatten'):
+        return _required(children[0], rest)
+    if kind in ('index', 'slice', 'current', 'identity'):
+        return rest
+    if kind == 'literal':
+        return {}
+    if kind == 'filter_projection':
+        left, right, condition = children
+        return _required(left, _merge(_required(right, rest), _required(condition, ALL)))
+    if kind == 'multi_select_list':
+        tree = {}
+        for child in children:
+            tree = _merge(tree, _required(child, rest))
+        return tree
+    if kind == 'multi_select_dict':
+        tree = {}
+        for pair in children:
+            if rest is ALL:
+                value = ALL
+            elif pair['value'] in rest:
+                value = rest[pair['value']]
+            else:
+                continue
+            tree = _merge(tree, _required(pair['children'][0], value))
+        return tree
+    if kind in ('or_expression', 'and_expression'):
+        # The left side is checked for truthiness, so it is needed as it is
+        return _merge(_required(children[0], ALL), _required(children[1], rest))
+    # Functions, comparisons, wildcards on objects... need the whole values
+    tree = {}
+    for child in children:
+        if isinstance(child, dict):
+            tree = _merge(tree, _required(child, ALL))
+    return tree if children else ALL
+
+
+def project(data, tree=ALL, **kwargs):
+    '''
+    Copy the parts of some data (e.g., a model) in a tree of required keys, as plain
+    dictionaries and lists. The rest of the arguments (e.g. `verbose`) are used to get
+    the fields of every model.
+    '''
+    if isinstance(data, (list, tuple, set)):
+        return [project(item, tree, **kwargs) for item in data]
+    if isinstance(data, dict) or hasattr(data, 'serializable'):
+        fields = serialization.fields(data, **kwargs) if not isinstance(data, dict) else data
+        if tree is ALL:
+            return {key: project(value, ALL, **kwargs) for key, value in fields.items()}
+        return {key: project(fields[key], subtree, **kwargs)
+                for key, subtree in tree.items() if key in fields}
+    return data
+
+
+def render(template, data):
+    '''Render a template with the given data (e.g., a model)'''
+    return compile_template(template).render(_context(template, data))
+
+
+def generate(template, data):
+    '''Render a template piece by piece, so big outputs can be streamed'''
+    return compile_template(template).generate(_context(template, data))
+
+
+def _context(template, data):
+    return {key: data[key] for key in variables(template) if key in data}
+
+
+def search(fields, data, **kwargs):
+    '''
+    Apply a jmespath expression to some data (e.g., a model).
+    Only the parts of the data that the expression needs are copied (see `project`).
+    '''
+    return compile_fields(fields).search(project(data, required(fields), **kwargs))
+
+
+def clear():
+    '''Empty the caches of compiled templates and expressions'''
+    compile_template.cache_clear()
+    compile_fields.cache_clear()
+    variables.cache_clear()
+    required.cache_clear()
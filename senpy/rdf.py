@@ -0,0 +1,428 @@
+#
+#    Copyright 2014 Grupo de Sistemas Inteligentes (GSI) DIT, UPM
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#    limitations under the License.
+#
+'''
+RDF serialization of models (N-Triples and Turtle).
+
+The triples are generated straight from the tree of models, using the terms and
+prefixes of the senpy context (``schemas/context.jsonld``), instead of parsing the
+JSON-LD of the models into an rdflib graph. The graph is the same that rdflib
+would get from the JSON-LD, except for identifiers that are not valid IRIs (e.g.,
+with spaces), which are percent-encoded instead of dropped.
+
+The output is generated piece by piece: the properties of the root object first, and
+then every element of its lists (e.g., every entry) as a separate statement. Hence,
+the entries can be a generator (see ``BaseModel.rdf``).
+
+Turtle output is grouped by subject: nodes without an ``@id`` are written inline, as
+blank nodes, and nodes with an ``@id`` get their own statement.
+'''
+import re
+import logging
+
+from urllib.parse import urljoin, urlsplit, quote
+
+from . import serialization
+
+logger = logging.getLogger(__name__)
+
+RDF_TYPE = 'http://www.w3.org/1999/02/22-rdf-syntax-ns#type'
+XSD = 'http://www.w3.org/2001/XMLSchema#'
+XSD_BOOLEAN = XSD + 'boolean'
+XSD_INTEGER = XSD + 'integer'
+XSD_DOUBLE = XSD + 'double'
+
+FORMATS = ['ntriples', 'turtle']
+
+# Kinds of terms
+IRI = 0
+BLANK = 1
+LITERAL = 2
+
+_IRI_UNSAFE = re.compile(r'[\x00-\x20<>"{}|^`\\]')
+_ESCAPES = {'\\': '\\\\', '"': '\\"', '\n': '\\n', '\r': '\\r', '\t': '\\t'}
+_LITERAL_UNSAFE = re.compile(r'[\x00-\x1f"\\]')
+_LOCAL_NAME = re.compile(r'^([A-Za-z0-9_]([A-Za-z0-9_.\-]*[A-Za-z0-9_\-])?)?$')
+_INTEGER = re.compile(r'^[+-]?[0-9]+$')
+_GEN_DELIMS = (':', '/', '?', '#', '[', ']', '@')
+
+
+def _escape_iri(iri):
+    return _IRI_UNSAFE.sub(lambda m: quote(m.group(0), safe=''), iri)
+
+
+def _escape_literal(value):
+    return _LITERAL_UNSAFE.sub(
+        lambda m: _ESCAPES.get(m.group(0), '\\u{:04X}'.format(ord(m.group(0)))), value)
+
+
+class Context(object):
+    '''
+    The terms and prefixes of a JSON-LD context, to expand the keys and values of
+    the models into IRIs. Only the features of JSON-LD that the senpy context uses are
+    supported (i.e., no language maps, lists or nested contexts).
+    '''
+
+    def __init__(self, context, base=None):
+        context = dict(context)
+        context['prefix'] = base
+        self.base = base
+        self.vocab = context.get('@vocab', None)
+        self.prefixes = {}
+        for name, definition in context.items():
+            if isinstance(definition, str) and not name.startswith('@') and \
+               definition.endswith(_GEN_DELIMS):
+                self.prefixes[name] = definition
+        self.terms = {}
+        for name, definition in context.items():
+            if name.startswith('@') or definition is None:
+                continue
+            if isinstance(definition, str):
+                definition = {'@id': definition}
+            iri = self._expand(definition.get('@id', name), True)
+            coercion = definition.get('@type', None)
+            if coercion not in (None, '@id'):
+                coercion = self._expand(coercion, True)
+            self.terms[name] = (iri, coercion)
+        # Longest namespaces first, to write the shortest names
+        self.namespaces = sorted(((ns, name) for name, ns in self.prefixes.items()),
+                                 key=lambda x: -len(x[0]))
+
+    def _expand(self, value, vocab):
+        if ':' in value:
+            pfx, local = value.split(':', 1)
+            if pfx == '_':
+                return value
+            if not local.startswith('//') and pfx in self.prefixes:
+                return self.prefixes[pfx] + local
+        elif vocab:
+            return self.vocab + value if self.vocab else None
+        return self.resolve(value)
+
+    def expand(self, value, vocab=True):
+        '''
+        Expand a term, a compact IRI (e.g. `marl:hasOpinion`) or a relative IRI.
+        Keys and types are expanded with `vocab=True`, and identifiers with `vocab=False`.
+        '''
+        if vocab and value in self.terms:
+            return self.terms[value][0]
+        return self._expand(value, vocab)
+
+    def resolve(self, iri):
+        '''Resolve an IRI relative to the base'''
+        if '://' in iri or urlsplit(iri).scheme or not self.base:
+            return iri
+        result = urljoin(self.base, iri)
+        if iri.endswith('#') and not result.endswith('#'):
+            result += '#'
+        return result
+
+    def shrink(self, iri):
+        '''The shortest name of an IRI in turtle'''
+        for ns, name in self.namespaces:
+            if iri.startswith(ns) and _LOCAL_NAME.match(iri[len(ns):]):
+                return '{}:{}'.format(name, iri[len(ns):])
+        return '<{}>'.format(_escape_iri(iri))
+
+
+class _Document(object):
+    '''The state of a serialization: the context and the labels of the blank nodes'''
+
+    def __init__(self, context, kwargs):
+        self.context = context
+        self.kwargs = kwargs
+        self.blanks = {}
+        self.counter = 0
+
+    def blank(self, label=None):
+        '''A new blank node, or the one for a label from the models (e.g. `_:b1`)'''
+        if label is not None and label in self.blanks:
+            return self.blanks[label]
+        self.counter += 1
+        node = (BLANK, 'b{}'.format(self.counter))
+        if label is not None:
+            self.blanks[label] = node
+        return node
+
+    def identifier(self, value):
+        iri = self.context.expand(value, vocab=False)
+        if iri is None:
+            return None
+        if iri.startswith('_:'):
+            return self.blank(iri)
+        if ':' not in iri:
+            # Relative IRIs that could not be resolved (i.e., there is no base)
+            return None
+        return (IRI, iri)
+
+    def fields(self, node):
+        '''The fields of a node, if it is a node (i.e., a model or a dict without @value)'''
+        if isinstance(node, dict):
+            if '@value' in node:
+                return None
+            return node
+        if hasattr(node, 'serializable'):
+            return serialization.fields(node, **self.kwargs)
+        return None
+
+    def subject(self, fields):
+        if '@id' in fields and isinstance(fields['@id'], str):
+            return self.identifier(fields['@id'])
+        return self.blank()
+
+    def properties(self, fields):
+        '''
+        The properties of a node, as (predicate, values) tuples. Each value is either
+        a term, or the fields of another node.
+        '''
+        context = self.context
+        types = fields.get('@type', None)
+        if types is not None:
+            values = []
+            for value in _flatten(types):
+                if isinstance(value, str):
+                    iri = context.expand(value)
+                    if iri:
+                        values.append((IRI, iri))
+            yield RDF_TYPE, values
+        for key in sorted(fields):
+            if key.startswith('@'):
+                continue
+            values = fields[key]
+            if values is None:
+                continue
+            iri, coercion = context.terms.get(key, (None, None))
+            if iri is None:
+                iri = context.expand(key)
+            if not iri or iri.startswith('_:'):
+                continue
+            objects = []
+            for value in _flatten(values):
+                obj = self.object(value, coercion)
+                if obj is not None:
+                    objects.append(obj)
+            if objects:
+                yield iri, objects
+
+    def object(self, value, coercion=None):
+        if value is None:
+            return None
+        if coercion == '@id' and isinstance(value, str):
+            return self.identifier(value)
+        if isinstance(value, (str, bool, int, float)):
+            if coercion is not None:
+                return (LITERAL, _lexical(value), coercion)
+            return _literal(value)
+        fields = self.fields(value)
+        if fields is None:
+            if isinstance(value, dict):
+                datatype = value.get('@type', None)
+                if datatype is not None:
+                    datatype = self.context.expand(datatype)
+                if value['@value'] is None:
+                    return None
+                return (LITERAL, _lexical(value['@value']), datatype, value.get('@language'))
+            return None
+        return fields
+
+
+def _flatten(values):
+    if isinstance(values, (list, tuple, set)):
+        for value in values:
+            for v in _flatten(value):
+                yield v
+    else:
+        yield values
+
+
+def _lexical(value):
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    return '{}'.format(value) if not isinstance(value, float) else repr(value)
+
+
+def _literal(value):
+    if isinstance(value, bool):
+        return (LITERAL, _lexical(value), XSD_BOOLEAN)
+    if isinstance(value, int):
+        return (LITERAL, _lexical(value), XSD_INTEGER)
+    if isinstance(value, float):
+        return (LITERAL, _lexical(value), XSD_DOUBLE)
+    return (LITERAL, value, None)
+
+
+def _nt_term(term):
+    kind = term[0]
+    if kind == IRI:
+        return '<{}>'.format(_escape_iri(term[1]))
+    if kind == BLANK:
+        return '_:{}'.format(term[1])
+    text = '"{}"'.format(_escape_literal(term[1]))
+    if len(term) > 3 and term[3]:
+        return '{}@{}'.format(text, term[3])
+    if term[2]:
+        return '{}^^<{}>'.format(text, _escape_iri(term[2]))
+    return text
+
+
+def _nt_node(doc, fields, out, subject=None, skip=()):
+    '''Write the triples of a node (and its children) to `out`, and return its subject'''
+    if subject is None:
+        subject = doc.subject(fields)
+        if subject is None:
+            return None
+    s = _nt_term(subject)
+    for predicate, objects in doc.properties(fields):
+        if predicate in skip:
+            continue
+        p = '<{}>'.format(_escape_iri(predicate))
+        for obj in objects:
+            if isinstance(obj, tuple):
+                o = _nt_term(obj)
+            else:
+                child = _nt_node(doc, obj, out)
+                if child is None:
+                    continue
+                o = _nt_term(child)
+            out.append('{} {} {} .\n'.format(s, p, o))
+    return subject
+
+
+def _ttl_term(doc, term):
+    kind = term[0]
+    if kind == IRI:
+        return doc.context.shrink(term[1])
+    if kind == BLANK:
+        return '_:{}'.format(term[1])
+    value, datatype = term[1], term[2]
+    if datatype in (XSD_INTEGER, XSD_BOOLEAN) and \
+       (datatype == XSD_BOOLEAN or _INTEGER.match(value)):
+        return value
+    text = '"{}"'.format(_escape_literal(value))
+    if len(term) > 3 and term[3]:
+        return '{}@{}'.format(text, term[3])
+    if datatype:
+        return '{}^^{}'.format(text, doc.context.shrink(datatype))
+    return text
+
+
+def _ttl_object(doc, obj, indent, pending):
+    if isinstance(obj, tuple):
+        return _ttl_term(doc, obj)
+    if '@id' in obj:
+        subject = doc.subject(obj)
+        if subject is None:
+            return None
+        # Named nodes get their own statement
+        pending.append((subject, obj))
+        return _ttl_term(doc, subject)
+    body = _ttl_properties(doc, obj, indent + 4, pending)
+    if not body:
+        return '[]'
+    return '[ {} ]'.format(body)
+
+
+def _ttl_properties(doc, fields, indent, pending, skip=()):
+    lines = []
+    for predicate, objects in doc.properties(fields):
+        if predicate in skip:
+            continue
+        values = [_ttl_object(doc, obj, indent, pending) for obj in objects]
+        values = [v for v in values if v is not None]
+        if not values:
+            continue
+        p = 'a' if predicate == RDF_TYPE else doc.context.shrink(predicate)
+        lines.append('{} {}'.format(p, ', '.join(values)))
+    return ' ;\n{}'.format(' ' * indent).join(lines)
+
+
+def _ttl_statement(doc, subject, fields, skip=()):
+    '''A statement with the properties of a node, followed by those of its named children'''
+    out = []
+    pending = [(subject, fields)]
+    while pending:
+        subject, fields = pending.pop(0)
+        body = _ttl_properties(doc, fields, 4, pending, skip)
+        skip = ()
+        if body:
+            out.append('{} {} .\n\n'.format(_ttl_term(doc, subject), body))
+    return ''.join(out)
+
+
+def _ttl_link(doc, subject, predicate, obj):
+    out = []
+    pending = []
+    value = _ttl_object(doc, obj, 4, pending)
+    if value is not None:
+        out.append('{} {} {} .\n\n'.format(_ttl_term(doc, subject),
+                                           doc.context.shrink(predicate), value))
+    for child, fields in pending:
+        out.append(_ttl_statement(doc, child, fields))
+    return ''.join(out)
+
+
+def serialize(obj, format='turtle', context=None, base=None, entries=None, **kwargs):
+    '''
+    Serialize a model as RDF, piece by piece.
+
+    The elements of the lists of the model (e.g., the entries of some results) are
+    serialized one at a time. If `entries` is given, it is used instead of the entries
+    of the model. The rest of the arguments (e.g. `verbose`) are used to get the fields
+    of every model.
+    '''
+    if format not in FORMATS:
+        raise ValueError('Unknown RDF format: {}'.format(format))
+    doc = _Document(Context(context or {}, base=base), kwargs)
+    fields = doc.fields(obj)
+    subject = doc.subject(fields)
+    if subject is None:
+        return
+    fields = dict(fields)
+    fields.pop('@context', None)
+    if entries is not None:
+        fields['entries'] = entries
+    lists = [k for k, v in fields.items()
+             if (not k.startswith('@') and isinstance(v, list)) or
+             (k == 'entries' and entries is not None)]
+    rest = {k: v for k, v in fields.items() if k not in lists}
+    if format == 'turtle':
+        yield ''.join('@prefix {}: <{}> .\n'.format(name, _escape_iri(ns))
+                      for name, ns in sorted(doc.context.prefixes.items())) + '\n'
+        yield _ttl_statement(doc, subject, rest)
+    else:
+        out = []
+        _nt_node(doc, rest, out, subject=subject)
+        yield ''.join(out)
+    for key in sorted(lists):
+        iri, coercion = doc.context.terms.get(key, (None, None))
+        iri = iri or doc.context.expand(key)
+        if not iri or iri.startswith('_:'):
+            continue
+        for value in fields[key]:
+            for item in _flatten(value):
+                obj = doc.object(item, coercion)
+                if obj is None:
+                    continue
+                if format == 'turtle':
+                    yield _ttl_link(doc, subject, iri, obj)
+                else:
+                    out = []
+                    if not isinstance(obj, tuple):
+                        obj = _nt_node(doc, obj, out)
+                        if obj is None:
+                            continue
+                    out.append('{} <{}> {} .\n'.format(_nt_term(subject), _escape_iri(iri),
+                                                       _nt_term(obj)))
+                    yield ''.join(out)
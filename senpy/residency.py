@@ -0,0 +1,227 @@
+#
+#    Copyright 2014 Grupo de Sistemas Inteligentes (GSI) DIT, UPM
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#    limitations under the License.
+#
+'''
+Residency of analysis plugins: which plugins are activated, and for how long.
+
+Servers that ship many plugins rarely use all of them, but activated plugins keep
+their resources (e.g. lexicons) in memory. Plugins can be activated on the first
+request that uses them, and deactivated when they have been idle for a while, or
+when the plugins in memory go over a budget. In that case, the least recently used
+plugins are deactivated first.
+
+The memory of a plugin is the one measured when it was activated
+(``activation_memory``). It is unknown for plugins that were activated concurrently
+(e.g. by ``activate_all``), and those do not count towards the budget.
+'''
+from collections import OrderedDict
+from contextlib import contextmanager
+
+import os
+import threading
+import time
+import logging
+
+from . import plugins
+
+logger = logging.getLogger(__name__)
+
+
+class _Released(object):
+    '''
+    An iterator over the entries of a request, that releases the plugins of the request
+    once: when all the entries have been processed, or when it is closed or discarded
+    (even if it was never started).
+    '''
+
+    def __init__(self, manager, entries, plugs):
+        self._entries = None
+        self._manager = manager
+        self._plugs = plugs
+        self._entries = iter(entries)
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self._entries is None:
+            raise StopIteration
+        try:
+            return next(self._entries)
+        except BaseException:
+            self.close()
+            raise
+
+    def close(self):
+        entries, self._entries = self._entries, None
+        if entries is None:
+            return
+        try:
+            if hasattr(entries, 'close'):
+                entries.close()
+        finally:
+            self._manager.release(self._plugs)
+
+    def __del__(self):
+        self.close()
+
+
+class ResidencyManager(object):
+    '''
+    Activate plugins when they are used, and deactivate them when they are not needed.
+
+    Plugins are deactivated after `idle_timeout` seconds without being used, or when
+    the activated plugins take more than `memory_budget` bytes. Plugins are never
+    deactivated while a request is using them.
+    '''
+
+    def __init__(self, senpy, idle_timeout=None, memory_budget=None, interval=None):
+        self.senpy = senpy
+        self.idle_timeout = idle_timeout
+        self.memory_budget = memory_budget
+        self.interval = interval or (idle_timeout / 2.0 if idle_timeout else None)
+        self.evictions = 0
+        # Time of the last use of each plugin, from the least to the most recent
+        self._used = OrderedDict()
+        # Number of requests that are using each plugin
+        self._users = {}
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread = None
+        self._pid = None
+
+    def acquire(self, plugs):
+        '''
+        Mark some plugins as in use, and activate them if they are not activated yet.
+        Concurrent requests for a plugin wait until it is activated.
+        '''
+        with self._lock:
+            self._touch(plugs, 1)
+        try:
+            for plugin in plugs:
+                if not plugin.is_activated:
+                    self.senpy._activate(plugin)
+                    if self.senpy._is_parallel(plugin):
+                        # The processes of the pool need the activated plugin
+                        self.senpy.refresh_pool()
+        except Exception:
+            self.release(plugs)
+            raise
+        self._start()
+        if self.memory_budget:
+            self.enforce()
+
+    def release(self, plugs):
+        '''Mark some plugins as no longer in use by a request'''
+        with self._lock:
+            self._touch(plugs, -1)
+
+    def released(self, entries, plugs):
+        '''
+        Release some plugins (see `acquire`) once the entries of a request have been
+        processed, or when the iterator of the entries is closed or discarded.
+        '''
+        return _Released(self, entries, plugs)
+
+    @contextmanager
+    def using(self, plugs):
+        self.acquire(plugs)
+        try:
+            yield plugs
+        finally:
+            self.release(plugs)
+
+    def enforce(self, now=None):
+        '''
+        Deactivate the plugins that have been idle for too long, and the least recently
+        used plugins while the budget is exceeded. It returns the deactivated plugins.
+        '''
+        now = now if now is not None else time.monotonic()
+        evicted = []
+        with self._lock:
+            for plugin in self.senpy.plugins(plugin_type=plugins.AnalysisPlugin):
+                # Plugins that were activated before they were used
+                if plugin.name.lower() not in self._used:
+                    self._used[plugin.name.lower()] = now
+            resident = []
+            for name, last in list(self._used.items()):
+                plugin = self.senpy._plugins.get(name, None)
+                if plugin is None or not plugin.is_activated:
+                    del self._used[name]
+                    continue
+                resident.append((plugin, last))
+            memory = sum(max(getattr(plugin, 'activation_memory', 0) or 0, 0)
+                         for (plugin, _) in resident)
+            for plugin, last in resident:
+                name = plugin.name.lower()
+                if self._users.get(name, 0):
+                    continue
+                idle = self.idle_timeout and now - last > self.idle_timeout
+                over = self.memory_budget and memory > self.memory_budget
+                if not (idle or over):
+                    continue
+                logger.info('Deactivating plugin {} ({})'.format(
+                    plugin.name, 'idle' if idle else 'over the memory budget'))
+                self._evict(plugin)
+                memory -= max(getattr(plugin, 'activation_memory', 0) or 0, 0)
+                del self._used[name]
+                evicted.append(plugin)
+        return evicted
+
+    def close(self):
+        if self._thread is not None and self._pid == os.getpid():
+            self._stopped.set()
+            self._thread.join()
+        self._thread = None
+
+    def _touch(self, plugs, users):
+        now = time.monotonic()
+        for plugin in plugs:
+            name = plugin.name.lower()
+            self._users[name] = self._users.get(name, 0) + users
+            if self._users[name] <= 0:
+                del self._users[name]
+            self._used[name] = now
+            self._used.move_to_end(name)
+
+    def _evict(self, plugin):
+        if isinstance(plugin, plugins.ShelfMixin):
+            plugin.save(ignore_errors=True)
+        self.senpy._deactivate(plugin)
+        if self.senpy._is_parallel(plugin):
+            # The processes of the pool would keep the memory of the plugin
+            self.senpy.refresh_pool()
+        self.evictions += 1
+
+    def _start(self):
+        if not self.interval:
+            return
+        with self._lock:
+            # Threads do not survive a fork, so forked processes need their own
+            if self._thread is None or self._pid != os.getpid():
+                self._stopped = threading.Event()
+                self._pid = os.getpid()
+                self._thread = threading.Thread(target=self._run,
+                                                args=(self._stopped, ),
+                                                name='senpy-residency',
+                                                daemon=True)
+                self._thread.start()
+
+    def _run(self, stopped):
+        while not stopped.wait(self.interval):
+            try:
+                self.enforce()
+            except Exception:
+                logger.exception('Could not deactivate idle plugins')
@@ -0,0 +1,114 @@
+#
+#    Copyright 2014 Grupo de Sistemas Inteligentes (GSI) DIT, UPM
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#    limitations under the License.
+#
+'''
+Fast JSON serialization of trees of models.
+
+``CustomDict.serializable`` copies the whole tree of models (as plain dictionaries and
+lists) before it can be encoded. Instead, the encoders in this module ask each model
+for its fields when they reach it, so the tree is walked only once, and the JSON is
+written straight to a string (``dumps``) or to a stream (``dump`` and ``iterencode``).
+
+By default, the output is indented and its keys are sorted, just like
+``json.dumps(model.serializable(), indent=2, sort_keys=True)``. Compact output
+(``compact=True``) is neither indented nor sorted: the fields of every model are
+written in the order they are stored in (i.e., the fields in the slots of compact
+models first, in the order that ``BaseMeta`` precomputes for every class).
+
+``dumps`` uses orjson, if it is installed.
+'''
+import json
+import logging
+
+from .meta import CustomDict
+
+logger = logging.getLogger(__name__)
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+SEPARATORS = (',', ':')
+
+
+def _fields(kwargs):
+    '''Hook for the encoders, which returns the fields of each model (not a copy of its tree)'''
+    def default(obj):
+        if isinstance(obj, CustomDict) and type(obj).serializable is CustomDict.serializable:
+            return obj.as_dict(**kwargs)
+        if hasattr(obj, 'serializable'):
+            return obj.serializable(**kwargs)
+        if isinstance(obj, set):
+            return list(obj)
+        raise TypeError('Object of type {} is not JSON serializable'.format(
+            type(obj).__name__))
+
+    return default
+
+
+def fields(obj, **kwargs):
+    '''The fields of a model, as a dictionary. Their values are not copied.'''
+    return _fields(kwargs)(obj)
+
+
+def _encoder(compact, indent, kwargs):
+    if compact:
+        return json.JSONEncoder(separators=SEPARATORS, check_circular=False,
+                                default=_fields(kwargs))
+    return json.JSONEncoder(indent=indent, sort_keys=True, check_circular=False,
+                            default=_fields(kwargs))
+
+
+def _orjson_options(compact, indent):
+    options = orjson.OPT_NON_STR_KEYS
+    if not compact:
+        if indent not in (None, 2):
+            return None
+        options |= orjson.OPT_SORT_KEYS
+        if indent:
+            options |= orjson.OPT_INDENT_2
+    return options
+
+
+def dumps(obj, compact=False, indent=2, backend=None, **kwargs):
+    '''
+    Serialize a model (or any JSON object that contains models) as a JSON string.
+    The rest of the arguments (e.g. `verbose`) are used to get the fields of every model.
+
+    The backend is orjson if it is installed, unless a different one (`json`) is given.
+    '''
+    backend = backend or ('orjson' if orjson is not None else 'json')
+    if backend == 'orjson':
+        options = _orjson_options(compact, indent)
+        if options is not None:
+            try:
+                return orjson.dumps(obj, default=_fields(kwargs),
+                                    option=options).decode('utf-8')
+            except orjson.JSONEncodeError as ex:
+                # e.g., integers that do not fit in 64 bits
+                logger.debug('Could not use orjson: %s', ex)
+    return _encoder(compact, indent, kwargs).encode(obj)
+
+
+def iterencode(obj, compact=False, indent=2, **kwargs):
+    '''Serialize as JSON piece by piece, without building the whole string'''
+    return _encoder(compact, indent, kwargs).iterencode(obj)
+
+
+def dump(obj, fp, compact=False, indent=2, **kwargs):
+    '''Write the JSON of a model to a stream, as it is encoded'''
+    for chunk in iterencode(obj, compact=compact, indent=indent, **kwargs):
+        fp.write(chunk)
@@ -0,0 +1,115 @@
+#
+#    Copyright 2014 Grupo de Sistemas Inteligentes (GSI) DIT, UPM
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#    limitations under the License.
+#
+'''
+Pre-fork server, with several worker processes.
+
+Plugins are activated once, in the master process. Then, the objects of the master
+are moved out of the reach of the garbage collector (``gc.freeze``), and the workers
+are forked. The workers share the memory of the master (e.g., lexicons and models)
+until they modify it (copy-on-write). Freezing prevents the garbage collector of the
+workers from touching (and hence copying) every object of the master.
+
+All the workers accept connections from the same socket. Workers that die are
+replaced, and the workers are stopped when the master receives SIGINT or SIGTERM.
+
+Asynchronous jobs (see ``senpy.jobs``) are kept in the memory of the process that
+received them, so they are disabled when the server is launched with several workers.
+'''
+import gc
+import os
+import signal
+import socket
+import time
+import logging
+
+from werkzeug.serving import make_server
+
+logger = logging.getLogger(__name__)
+
+
+def listen(host, port, backlog=128):
+    '''Open the socket that the workers share'''
+    sock = socket.socket(socket.AF_INET6 if ':' in host else socket.AF_INET,
+                         socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    sock.set_inheritable(True)
+    return sock
+
+
+def serve(app, host, port, workers=2, threaded=True):
+    '''
+    Serve a WSGI app with `workers` processes. It returns once all the workers have
+    stopped.
+    '''
+    sock = listen(host, port)
+    gc.collect()
+    gc.freeze()
+    # Time when each worker was started
+    children = {}
+    stopping = []
+
+    def stop(signum, frame):
+        stopping.append(signum)
+        for pid in list(children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except OSError:
+                pass
+
+    previous = {sig: signal.signal(sig, stop) for sig in (signal.SIGINT, signal.SIGTERM)}
+    try:
+        for _ in range(workers):
+            children[_fork(app, host, port, sock, threaded)] = time.time()
+        while children:
+            try:
+                pid, status = os.wait()
+            except ChildProcessError:
+                break
+            started = children.pop(pid, None)
+            if started is None or stopping:
+                continue
+            logger.error('Worker %s stopped (status %s). Starting a new one', pid, status)
+            if time.time() - started < 1:
+                # Do not fork continuously if workers fail as soon as they start
+                time.sleep(1)
+            children[_fork(app, host, port, sock, threaded)] = time.time()
+    finally:
+        for sig, handler in previous.items():
+            signal.signal(sig, handler)
+        sock.close()
+        gc.unfreeze()
+
+
+def _fork(app, host, port, sock, threaded):
+    pid = os.fork()
+    if pid:
+        return pid
+    status = 0
+    try:
+        signal.signal(signal.SIGINT, signal.default_int_handler)
+        signal.signal(signal.SIGTERM, signal.default_int_handler)
+        server = make_server(host, port, app, threaded=threaded, fd=sock.fileno())
+        logger.info('Worker %s listening on %s:%s', os.getpid(), host, port)
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    except Exception:
+        logger.exception('Error in worker %s', os.getpid())
+        status = 1
+    finally:
+        os._exit(status)
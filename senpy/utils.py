@@ -15,6 +15,8 @@
 #
 from . import models, __version__
 from collections.abc import MutableMapping
+from itertools import islice
+import os
 import pprint
 import pdb
 
@@ -65,6 +67,35 @@ def convert_dictionary(original, mappings):
     return result
 
 
+def windows(iterable, size):
+    '''
+    Split an iterable into lists of at most `size` elements, consuming the
+    iterable lazily. If size is None or 0, a single window is returned.
+    '''
+    iterator = iter(iterable)
+    if not size:
+        yield list(iterator)
+        return
+    while True:
+        window = list(islice(iterator, size))
+        if not window:
+            return
+        yield window
+
+
+def memory_usage():
+    '''
+    Resident memory of the current process, in bytes.
+    Where /proc is not available, the peak resident memory is used instead.
+    '''
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (IOError, OSError, ValueError):
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
 def easy_load(app=None, plugin_list=None, plugin_folder=None, **kwargs):
     '''
     Run a server with a specific plugin.
@@ -20,8 +20,9 @@ logger = logging.getLogger(__name__)
 
 from unittest import TestCase
 from senpy.api import (boolean, parse_params, get_extra_params, parse_analyses,
-                       API_PARAMS, NIF_PARAMS, WEB_PARAMS)
+                       compile_params, request_plan, API_PARAMS, NIF_PARAMS, WEB_PARAMS)
 from senpy.models import Error, Plugin
+from senpy import plugins
 
 
 class APITest(TestCase):
@@ -183,6 +184,65 @@ class APITest(TestCase):
             for k, v in arg.items():
                 assert params[k] == v
 
+    def test_analysis_plan(self):
+        '''Consecutive analyses that only append annotations should be in the same stage'''
+        class PlanAnnotator(plugins.Analyser):
+            '''Annotates entries'''
+            version = 0
+            only_annotates = True
+
+        annotator = PlanAnnotator()
+        transformation = plugins.Transformation(name='transformation', description='', version=0)
+        plan = parse_analyses({}, [annotator, annotator, transformation, annotator])
+        assert len(plan) == 4
+        stages = plan.stages
+        assert [len(stage) for stage in stages] == [2, 1, 1]
+        assert stages[1][0].plugin is transformation
+
+    def test_compiled_params(self):
+        '''Specifications should be compiled once, and give the same results as before'''
+        spec = {
+            'hello': {
+                'aliases': ['hiya', 'hi'],
+                'options': ['world', 'there'],
+                'required': True
+            },
+            'loud': {
+                'options': boolean,
+                'default': False
+            }
+        }
+        compiled = compile_params(spec, NIF_PARAMS)
+        assert compile_params(spec, NIF_PARAMS) is compiled
+        assert compiled.aliases['hi'] == {0}
+        p = compiled.parse({'hi': 'there', 'loud': 'true', 'i': 'text'})
+        assert p['hello'] == 'there'
+        assert p['loud'] is True
+        assert p['input'] == 'text'
+        assert 'hi' not in p
+        with self.assertRaises(Error) as ex:
+            compiled.parse({'hi': 'nobody', 'i': 'text'})
+        assert ex.exception.errors['hello'] is spec['hello']
+
+    def test_request_plan(self):
+        '''Requests with the same plugins should reuse their plan'''
+        plugin = Plugin({
+            'name': 'plugin1',
+            'extra_params': {
+                'param1': {
+                    'aliases': ['p1'],
+                    'default': 'en',
+                }
+            }
+        })
+        plan = request_plan([plugin])
+        assert request_plan([plugin]) is plan
+        assert request_plan([plugin, plugin]) is not plan
+        analyses = parse_analyses({'p1': 'es'}, [plugin])
+        assert analyses[0].params['param1'] == 'es'
+        assert plan.extra_params is plan.extra_params
+        assert get_extra_params([plugin])['param1'] == plugin['extra_params']['param1']
+
     def test_get_extra_params(self):
         '''The API should return the list of valid parameters for a set of plugins'''
         plugins = [
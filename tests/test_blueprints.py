@@ -15,7 +15,11 @@
 #
 
 import os
+import json
+import time
+import shutil
 import logging
+import tempfile
 
 from senpy.extensions import Senpy
 from senpy import models
@@ -38,13 +42,20 @@ class BlueprintsTest(TestCase):
         """Set up only once, and re-use in every individual test"""
         cls.app = Flask("test_extensions")
         cls.client = cls.app.test_client()
-        cls.senpy = Senpy(default_plugins=True, strict=False) # Ignore any optional plugins
+        # Jobs are stored in the data folder
+        cls.folder = tempfile.mkdtemp()
+        cls.senpy = Senpy(default_plugins=True, strict=False,  # Ignore any optional plugins
+                          data_folder=cls.folder)
         cls.senpy.init_app(cls.app)
         cls.dir = os.path.join(os.path.dirname(__file__), "..")
         cls.senpy.add_folder(cls.dir)
         cls.senpy.activate_all()
         cls.senpy.default_plugin = 'Dummy'
 
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.folder)
+
     def setUp(self):
         self.app.config['TESTING'] = True  # Tell Flask not to catch Exceptions
 
@@ -84,6 +95,34 @@ class BlueprintsTest(TestCase):
         assert "entries" in js
         assert len(js['activities']) == 1
 
+    def test_analysis_compact(self):
+        """Compact responses should have the same content, without indentation"""
+        resp = self.client.get("/api/?i=My aloha mohame&verbose&compact")
+        self.assertCode(resp, 200)
+        body = resp.data.decode('utf-8')
+        assert '\n' not in body
+        js = json.loads(body)
+        assert "@context" in js
+        assert js['entries'][0]['nif:isString'] == 'My aloha mohame'[::-1]
+        assert len(js['activities']) == 1
+
+    def test_analysis_template(self):
+        """Templates should be rendered with the results"""
+        template = '{% for entry in entries %}{{ entry["nif:isString"] | upper }}{% endfor %}'
+        for _ in range(2):
+            resp = self.client.get("/api/", query_string={'i': 'My aloha mohame',
+                                                          'template': template})
+            self.assertCode(resp, 200)
+            assert resp.data.decode('utf-8') == 'My aloha mohame'[::-1].upper()
+
+    def test_analysis_fields(self):
+        """Fields should select part of the results"""
+        resp = self.client.get("/api/", query_string={'i': 'My aloha mohame',
+                                                      'verbose': True,
+                                                      'fields': 'entries[]."nif:isString"'})
+        self.assertCode(resp, 200)
+        assert json.loads(resp.data.decode('utf-8')) == ['My aloha mohame'[::-1]]
+
     def test_analysis_post(self):
         """
         The results for a POST request should be the same as for a GET request.
@@ -98,6 +137,101 @@ class BlueprintsTest(TestCase):
         assert "entries" in js
         assert len(js['activities']) == 1
 
+    def test_bulk(self):
+        """
+        Bulk requests should analyse every text or entry in the body.
+        """
+        bodies = [
+            ('application/x-ndjson', '"first"\n{"nif:isString": "second"}\nthird\n'),
+            ('application/json', '["first", {"nif:isString": "second"}, "third"]'),
+            ('text/plain', 'first\nsecond\nthird'),
+            (None, ' ["first", "second", "third"]'),
+        ]
+        for mimetype, body in bodies:
+            resp = self.client.post("/api/bulk?algorithm=sentiment-random&verbose",
+                                    data=body, content_type=mimetype)
+            self.assertCode(resp, 200)
+            js = parse_resp(resp)
+            assert len(js['activities']) == 1
+            assert [e['nif:isString'] for e in js['entries']] == ['first', 'second', 'third']
+            assert all(len(e['marl:hasOpinion']) == 1 for e in js['entries'])
+            assert len(set(e['@id'] for e in js['entries'])) == 3
+
+    def test_ndjson(self):
+        """
+        NDJSON responses should have a line for the results, and then a line per entry.
+        """
+        for resp in [self.client.get("/api/?i=My aloha mohame&verbose&outformat=ndjson"),
+                     self.client.get("/api/?i=My aloha mohame&verbose",
+                                     headers={'Accept': 'application/x-ndjson'})]:
+            self.assertCode(resp, 200)
+            assert resp.mimetype == 'application/x-ndjson'
+            lines = resp.get_data(as_text=True).splitlines()
+            assert len(lines) == 2
+            header, entry = [json.loads(line) for line in lines]
+            assert '@context' in header
+            assert len(header['activities']) == 1
+            assert 'entries' not in header
+            assert entry['nif:isString'] == 'emahom ahola yM'
+
+    def test_ndjson_conversion(self):
+        """
+        Emotions should be converted in streamed responses, even if their parameters are
+        not included in the response.
+        """
+        resp = self.client.get("/api/?algo=emotion-random&i=hi&outformat=ndjson"
+                               "&emotion-model=emoml:pad-dimensions")
+        self.assertCode(resp, 200)
+        header, entry = [json.loads(line) for line in resp.get_data(as_text=True).splitlines()]
+        assert 'parameters' not in header
+        assert entry['@type'] == 'Entry'
+        emotions = [e for s in entry['onyx:hasEmotionSet'] for e in s['onyx:hasEmotion']]
+        assert any('emoml:pad-dimensions_pleasure' in e for e in emotions)
+        resp = self.client.get("/api/?algo=emotion-random&i=hi&outformat=turtle"
+                               "&emotion-model=emoml:pad-dimensions")
+        self.assertCode(resp, 200)
+        assert 'pad-dimensions_pleasure' in resp.get_data(as_text=True)
+
+    def test_bulk_ndjson(self):
+        resp = self.client.post("/api/bulk?algorithm=sentiment-random&outformat=ndjson",
+                                data='first\nsecond\nthird', content_type='text/plain')
+        self.assertCode(resp, 200)
+        lines = [json.loads(line) for line in resp.get_data(as_text=True).splitlines()]
+        assert [e['nif:isString'] for e in lines[1:]] == ['first', 'second', 'third']
+
+    def test_jobs(self):
+        """
+        Jobs should run in the background, and their results should be available afterwards.
+        """
+        resp = self.client.post("/api/jobs?algorithm=sentiment-random",
+                                data='first\nsecond\nthird', content_type='text/plain')
+        self.assertCode(resp, 200)
+        job = parse_resp(resp)
+        assert job['task'] == 'analysis'
+        for _ in range(1000):
+            job = parse_resp(self.client.get("/api/jobs/{}".format(job['@id'])))
+            if job['state'] == 'done':
+                break
+            time.sleep(0.01)
+        assert job['state'] == 'done'
+        assert job['progress'] == 3
+        resp = self.client.get("/api/jobs/{}?page=0&page-size=2".format(job['@id']))
+        self.assertCode(resp, 200)
+        js = parse_resp(resp)
+        assert [e['nif:isString'] for e in js['entries']] == ['first', 'second']
+        self.app.config['TESTING'] = False  # Errors are expected in this case
+        for page in ['page=-1&page-size=2', 'page=0&page-size=0', 'page=0&page-size=-1']:
+            resp = self.client.get("/api/jobs/{}?{}".format(job['@id'], page))
+            self.assertCode(resp, 400)
+        resp = self.client.delete("/api/jobs/{}".format(job['@id']))
+        assert parse_resp(resp)['state'] == 'done'
+
+    def test_bulk_invalid(self):
+        self.app.config['TESTING'] = False  # Errors are expected in this case
+        resp = self.client.post("/api/bulk?algorithm=sentiment-random",
+                                data='["first", "second"', content_type='application/json')
+        self.assertCode(resp, 400)
+
     def test_analysis_extra(self):
         """
         Extra params that have a default should use it
@@ -0,0 +1,121 @@
+#
+#    Copyright 2014 Grupo de Sistemas Inteligentes (GSI) DIT, UPM
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#    limitations under the License.
+#
+
+import os
+import tempfile
+import time
+
+from unittest import TestCase
+
+from senpy import cache
+from senpy.models import Analysis, Entry, Sentiment
+
+
+class CacheTest(TestCase):
+
+    def test_lru(self):
+        '''The least recently used elements should be evicted first'''
+        c = cache.MemoryCache(max_entries=2)
+        c.put('a', b'1')
+        c.put('b', b'2')
+        assert c.get('a') == b'1'
+        c.put('c', b'3')
+        assert c.get('b') is None
+        assert c.get('a') == b'1'
+        assert c.get('c') == b'3'
+        assert c.stats() == {'hits': 3, 'misses': 1, 'entries': 2, 'bytes': 2}
+
+    def test_max_bytes(self):
+        '''The cache should not grow over its maximum size'''
+        c = cache.MemoryCache(max_entries=None, max_bytes=10)
+        for i in range(5):
+            c.put(str(i), b'1234')
+        assert len(c) == 2
+        assert c.size == 8
+
+    def test_annotations(self):
+        '''Only new annotations should be stored, and they should be linked to the new activity'''
+        old = Analysis()
+        entry = Entry(nif__isString='hello')
+        entry.sentiments.append(Sentiment(marl__hasPolarity='marl:Negative'))
+        before = cache.snapshot(entry)
+        s = Sentiment(marl__hasPolarity='marl:Positive')
+        s.prov(old)
+        entry.sentiments.append(s)
+        data = cache.dumps(entry, before, old)
+
+        new = Analysis()
+        new.id = 'new_analysis'
+        other = cache.loads(data, Entry(nif__isString='hello'), new)
+        assert len(other.sentiments) == 1
+        assert other.sentiments[0].polarity == 'marl:Positive'
+        assert other.sentiments[0]['prov:wasGeneratedBy'] == 'new_analysis'
+
+    def test_activity(self):
+        '''The fields that plugins add to their activity should be restored'''
+        old = Analysis()
+        old['marl:minPolarityValue'] = -1
+        old['marl:maxPolarityValue'] = 1
+        entry = Entry(nif__isString='hello')
+        before = cache.snapshot(entry)
+        entry.sentiments.append(Sentiment(marl__hasPolarity='marl:Positive'))
+        data = cache.dumps(entry, before, old)
+
+        new = Analysis()
+        new['marl:maxPolarityValue'] = 2
+        cache.loads(data, Entry(nif__isString='hello'), new)
+        assert new['marl:minPolarityValue'] == -1
+        assert new['marl:maxPolarityValue'] == 2
+        assert new.id != old.id
+
+    def test_sqlite(self):
+        '''The persistent cache should be shared by different instances'''
+        with tempfile.TemporaryDirectory() as folder:
+            path = os.path.join(folder, 'cache.sqlite')
+            c1 = cache.SQLiteCache(path)
+            c1.put('a', b'1')
+            c2 = cache.SQLiteCache(path)
+            assert c2.get('a') == b'1'
+            assert c2.get('b') is None
+            assert c2.stats() == {'hits': 1, 'misses': 1, 'entries': 1, 'bytes': 1}
+
+    def test_sqlite_eviction(self):
+        '''Old and least recently used elements should be removed from the persistent cache'''
+        with tempfile.TemporaryDirectory() as folder:
+            path = os.path.join(folder, 'cache.sqlite')
+            c = cache.SQLiteCache(path, max_entries=2, max_bytes=10)
+            for i in range(4):
+                c.put(str(i), b'1234')
+            c.evict()
+            assert len(c) == 2
+            assert c.get('3') == b'1234'
+            c.ttl = 0.01
+            time.sleep(0.02)
+            assert c.get('3') is None
+            c.evict()
+            assert len(c) == 0
+
+    def test_layers(self):
+        '''Elements in slower layers should be copied to faster layers'''
+        with tempfile.TemporaryDirectory() as folder:
+            disk = cache.SQLiteCache(os.path.join(folder, 'cache.sqlite'))
+            memory = cache.MemoryCache()
+            disk.put('a', b'1')
+            c = cache.LayeredCache(memory, disk)
+            assert c.get('a') == b'1'
+            assert memory.get('a') == b'1'
+            c.put('b', b'2')
+            assert disk.get('b') == b'2'
@@ -21,11 +21,12 @@ import logging
 
 
 from functools import partial
+from threading import Barrier, Thread
 from senpy.extensions import Senpy
-from senpy import plugins, config, api
-from senpy.models import Error, Results, Entry, EmotionSet, Emotion, Plugin
+from senpy import plugins, config, api, cache
+from senpy.models import Error, Results, Entry, EmotionSet, Emotion, Plugin, Sentiment
 from flask import Flask
-from unittest import TestCase
+from unittest import TestCase, mock
 
 
 def analyse(instance, **kwargs):
@@ -129,6 +130,15 @@ class ExtensionsTest(TestCase):
         self.senpy.deactivate_all(sync=True)
         self.assertRaises(Error, partial(analyse, self.senpy, input="tupni"))
 
+    def test_unknown_plugin(self):
+        """ The error should list the names of the plugins """
+        with self.assertRaises(Error) as ctx:
+            self.senpy.get_plugin('missing')
+        assert ctx.exception.status == 404
+        assert 'Valid algorithms: ' in ctx.exception.message
+        assert 'dummy' in ctx.exception.message
+        assert 'KeysView' not in ctx.exception.message
+
     def test_analyse(self):
         """ Using a plugin """
         # I was using mock until plugin started inheriting
@@ -201,6 +211,267 @@ class ExtensionsTest(TestCase):
         except Exception as ex:
             assert 'generic exception on analysis' in str(ex)
 
+    def test_stream(self):
+        """ Each entry should go through every analysis before the next one is read """
+        log = []
+
+        class LoggingPlugin(plugins.Analyser):
+            author = 'nobody'
+            version = 0
+
+            def analyse_entry(self, entry, activity):
+                log.append((self.name, entry.text))
+                yield entry
+
+        first = LoggingPlugin(name='first')
+        second = LoggingPlugin(name='second')
+        self.senpy.add_plugin(first)
+        self.senpy.add_plugin(second)
+        request = Results()
+        request.entries = [Entry(nif__isString='a'), Entry(nif__isString='b')]
+        request.parameters = {}
+        analyses = [first.activity({}), second.activity({})]
+        entries = self.senpy.stream(request, analyses)
+        assert not log
+        assert len(request.activities) == 2
+        assert next(entries).text == 'a'
+        assert log == [('first', 'a'), ('second', 'a')]
+        assert [e.text for e in entries] == ['b']
+        assert log[2:] == [('first', 'b'), ('second', 'b')]
+
+    def test_postprocessing(self):
+        """ Only the post-processing plugins triggered by a request should run, in one pass """
+        log = []
+
+        class TriggeredPostProcessing(plugins.PostProcessing):
+            author = 'nobody'
+            version = 0
+            trigger_params = ['shout']
+
+            def process_entry(self, entry, activity):
+                log.append((self.name, entry.text))
+                yield entry
+
+        class IgnoredPostProcessing(plugins.PostProcessing):
+            author = 'nobody'
+            version = 0
+
+            def process_entry(self, entry, activity):
+                log.append((self.name, entry.text))
+                yield entry
+
+        first = TriggeredPostProcessing(name='first')
+        second = TriggeredPostProcessing(name='second')
+        for plugin in [first, second, IgnoredPostProcessing(name='ignored')]:
+            self.senpy.add_plugin(plugin)
+            self.senpy.activate_plugin(plugin.name, sync=True)
+        request = Results()
+        request.entries = [Entry(nif__isString='a'), Entry(nif__isString='b')]
+        request.parameters = {}
+        assert self.senpy._select_postprocessing(request) == []
+        request.parameters = {'shout': True}
+        assert self.senpy._select_postprocessing(request) == [first, second]
+        entries = self.senpy._postprocess(request, request.entries)
+        assert next(entries).text == 'a'
+        assert log == [('first', 'a'), ('second', 'a')]
+        assert [e.text for e in entries] == ['b']
+        assert log[2:] == [('first', 'b'), ('second', 'b')]
+
+    def test_concurrent_analyses(self):
+        """ Independent analyses should run at the same time and their annotations merged """
+
+        class ConcurrentAnnotator(plugins.Analyser):
+            author = 'nobody'
+            version = 0
+            only_annotates = True
+
+            def analyse_entry(self, entry, activity):
+                assert not entry.sentiments
+                s = Sentiment(marl__hasPolarity=activity.param('polarity'))
+                s.prov(activity)
+                entry.sentiments.append(s)
+                yield entry
+
+        plugin = ConcurrentAnnotator()
+        self.senpy.add_plugin(plugin)
+        request = Results()
+        request.entries = [Entry(nif__isString=str(i)) for i in range(3)]
+        request.parameters = {}
+        analyses = [plugin.activity({'polarity': 'marl:Positive'}),
+                    plugin.activity({'polarity': 'marl:Negative'})]
+        res = self.senpy.analyse(request, analyses)
+        assert len(res.activities) == 2
+        for entry in res.entries:
+            assert [s.polarity for s in entry.sentiments] == ['marl:Positive',
+                                                             'marl:Negative']
+
+    def test_cache(self):
+        """ Annotations for known texts should come from the cache """
+        calls = []
+
+        class CachedPlugin(plugins.Analyser):
+            author = 'nobody'
+            version = 0
+            only_annotates = True
+
+            def analyse_entry(self, entry, activity):
+                calls.append(entry.text)
+                activity['marl:minPolarityValue'] = 0
+                s = Sentiment(marl__hasPolarity='marl:Positive')
+                s.prov(activity)
+                entry.sentiments.append(s)
+                yield entry
+
+        plugin = CachedPlugin()
+        self.senpy.add_plugin(plugin)
+        self.senpy.cache = cache.MemoryCache(max_entries=10)
+
+        def run():
+            request = Results()
+            request.entries = [Entry(nif__isString=t) for t in ['a', 'b', 'a']]
+            request.parameters = {}
+            analysis = plugin.activity({})
+            return analysis, self.senpy.analyse(request, [analysis])
+
+        run()
+        assert calls == ['a', 'b', 'a']
+        analysis, res = run()
+        assert len(calls) == 3
+        assert self.senpy.cache.hits == 3
+        assert analysis['marl:minPolarityValue'] == 0
+        for entry in res.entries:
+            assert len(entry.sentiments) == 1
+            assert isinstance(entry.sentiments[0], Sentiment)
+            assert entry.sentiments[0]['prov:wasGeneratedBy'] == analysis.id
+
+    def test_parallel(self):
+        """ Parallel plugins should process entries in several processes, keeping their order """
+
+        class PidPlugin(plugins.Analyser):
+            author = 'nobody'
+            version = 0
+            parallel = True
+
+            def analyse_entry(self, entry, activity):
+                s = Sentiment(marl__hasPolarity='marl:Neutral', pid=os.getpid())
+                s.prov(activity)
+                entry.sentiments.append(s)
+                yield entry
+
+        plugin = PidPlugin()
+        self.senpy.add_plugin(plugin)
+        self.senpy.activate_plugin(plugin.name)
+        self.senpy.processes = 2
+        self.senpy.pool.chunk_size = 2
+        try:
+            request = Results()
+            request.entries = [Entry(nif__isString=str(i)) for i in range(10)]
+            request.parameters = {}
+            analysis = plugin.activity({})
+            res = self.senpy.analyse(request, [analysis])
+        finally:
+            self.senpy.close_pool()
+        assert [e.text for e in res.entries] == [str(i) for i in range(10)]
+        pids = set()
+        for entry in res.entries:
+            assert isinstance(entry, Entry)
+            assert entry.sentiments[0]['prov:wasGeneratedBy'] == analysis.id
+            pids.add(entry.sentiments[0]['pid'])
+        assert os.getpid() not in pids
+
+    def test_parallel_refresh(self):
+        """ Requests should finish with their pool, even if a new one is used for the rest """
+
+        class ParallelPlugin(plugins.Analyser):
+            author = 'nobody'
+            version = 0
+            parallel = True
+
+            def analyse_entry(self, entry, activity):
+                entry['pid'] = os.getpid()
+                yield entry
+
+        plugin = ParallelPlugin()
+        self.senpy.add_plugin(plugin)
+        self.senpy.activate_plugin(plugin.name)
+        self.senpy.processes = 2
+        try:
+            pool = self.senpy.pool
+            pool.chunk_size = 2
+            analysis = plugin.activity({})
+            entries = pool.process_entries((Entry(nif__isString=str(i)) for i in range(10)),
+                                           analysis)
+            first = next(entries)
+            self.senpy.refresh_pool()
+            assert self.senpy.pool is not pool
+            rest = []
+            reader = Thread(target=lambda: rest.extend(entries))
+            reader.start()
+            reader.join(30)
+            assert not reader.is_alive()
+            assert [e.text for e in [first] + rest] == [str(i) for i in range(10)]
+            assert pool._pool is None
+        finally:
+            self.senpy.close_pool()
+
+    def test_activation_order(self):
+        """ Plugins should be activated concurrently, after the plugins they depend on """
+        order = []
+
+        class FirstActivated(plugins.Analyser):
+            '''Activated first'''
+            version = 0
+
+            def activate(self):
+                order.append(self.name)
+
+        class LastActivated(FirstActivated):
+            '''Activated after the first one'''
+            activate_after = ['FirstActivated']
+
+        senpy = Senpy(plugin_folder=None, default_plugins=False)
+        last, first = LastActivated(), FirstActivated()
+        senpy.add_plugin(last)
+        senpy.add_plugin(first)
+        senpy.activate_all(workers=4)
+        assert order == ['firstactivated', 'lastactivated']
+        report = senpy.activation_report()
+        assert set(order) <= set(stats['plugin'] for stats in report)
+        assert all(stats['time'] >= 0 for stats in report)
+        assert 'activation_time' in last.serializable()
+
+        first.activate_after = ['LastActivated']
+        senpy.deactivate_all(sync=True)
+        with self.assertRaises(Error):
+            senpy.activate_all(workers=4)
+
+    def test_activation_memory(self):
+        """ The memory of plugins that are activated concurrently should not be measured """
+        barrier = Barrier(2, timeout=10)
+
+        class Overlapping(plugins.Analyser):
+            '''Waits for another plugin to be activated at the same time'''
+            version = 0
+
+            def activate(self):
+                barrier.wait()
+
+        class OtherOverlapping(Overlapping):
+            '''Waits for another plugin to be activated at the same time'''
+
+        senpy = Senpy(plugin_folder=None, default_plugins=False)
+        one, other = Overlapping(), OtherOverlapping()
+        senpy.add_plugin(one)
+        senpy.add_plugin(other)
+        senpy.activate_all(workers=2)
+        assert one.activation_memory is None
+        assert other.activation_memory is None
+        senpy.deactivate_all(sync=True)
+        barrier = Barrier(1)
+        senpy.activate_all(workers=1)
+        assert isinstance(one.activation_memory, int)
+        assert isinstance(other.activation_memory, int)
+
     def test_filtering(self):
         """ Filtering plugins """
         assert len(self.senpy.plugins(name="Dummy")) > 0
@@ -255,6 +526,49 @@ class ExtensionsTest(TestCase):
         assert len(r3.entries[0].emotions) == 1
         r3.jsonld()
 
+    def test_convert_emotions_batched(self):
+        '''The emotion sets generated by the same activity should be converted in a batch'''
+        self.senpy.activate_all(sync=True)
+        plugin = Plugin({
+            'id': 'imaginary',
+            'onyx:usesEmotionModel': 'emoml:fsre-dimensions'
+        })
+        activity = plugin.activity()
+        originals = []
+        for i in range(5):
+            eSet = EmotionSet()
+            eSet.prov(activity)
+            eSet['onyx:hasEmotion'].append(Emotion({
+                'emoml:arousal': i,
+                'emoml:potency': 0,
+                'emoml:valence': 0
+            }))
+            originals.append(eSet)
+        response = Results({
+            'activities': [activity],
+            'entries': [Entry({'nif:isString': 'entry {}'.format(i),
+                               'onyx:hasEmotionSet': [eSet]})
+                        for i, eSet in enumerate(originals)]
+        })
+        response.parameters = {'emotion-model': 'emoml:big6',
+                               'algorithm': ['conversion'],
+                               'conversion': 'full'}
+        calls = []
+        convert_many = plugins.EmotionConversion.convert_many
+
+        def counted(self, sets, *args, **kwargs):
+            calls.append(len(sets))
+            return convert_many(self, sets, *args, **kwargs)
+
+        with mock.patch.object(plugins.EmotionConversion, 'convert_many', counted):
+            self.senpy.analyse(response)
+        assert calls == [5]
+        for i, entry in enumerate(response.entries):
+            assert len(entry.emotions) == 2
+            # The original sets are reused, not copied
+            assert entry.emotions[0] is originals[i]
+            assert entry.emotions[1]['prov:wasGeneratedBy'] != activity.id
+
     def testDefaultPlugins(self):
         '''The default set of plugins should all load'''
         self.app = Flask('test_extensions')
@@ -0,0 +1,165 @@
+#
+#    Copyright 2014 Grupo de Sistemas Inteligentes (GSI) DIT, UPM
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#    limitations under the License.
+#
+import multiprocessing
+import os
+
+from unittest import TestCase, skipIf
+
+from senpy import isolation, parallel, plugins
+from senpy.extensions import Senpy
+from senpy.models import Error, Results, Entry, Sentiment
+
+
+class IsolatedPlugin(plugins.Analyser):
+    '''Annotates entries with the process that analysed them'''
+    author = 'nobody'
+    version = 0
+    isolated = True
+    isolated_processes = 2
+
+    def activate(self):
+        self._activated_in = os.getpid()
+
+    def analyse_entry(self, entry, activity):
+        if entry.text == 'fail':
+            raise Error('Could not analyse the entry', status=400)
+        s = Sentiment(marl__hasPolarity='marl:Neutral',
+                      pid=os.getpid(),
+                      activated_in=self._activated_in)
+        s.prov(activity)
+        entry.sentiments.append(s)
+        yield entry
+
+
+class IsolatedRequestPlugin(IsolatedPlugin):
+    '''Needs the whole request'''
+
+    def process(self, request, activity, **kwargs):
+        for entry in request.entries:
+            entry['senpy:total'] = len(request.entries)
+        return request
+
+
+class FragilePlugin(IsolatedPlugin):
+    '''Its workers stop with some entries, and cannot be activated again once broken'''
+    isolated_processes = 1
+    broken = False
+
+    def activate(self):
+        if self.broken:
+            raise Exception('Broken plugin')
+        super().activate()
+
+    def analyse_entry(self, entry, activity):
+        if entry.text == 'stop':
+            os._exit(1)
+        return super().analyse_entry(entry, activity)
+
+
+@skipIf(not parallel.available(), 'Processes cannot be forked in this platform')
+class IsolationTest(TestCase):
+
+    def setUp(self):
+        self.senpy = Senpy(plugin_folder=None, default_plugins=False)
+
+    def tearDown(self):
+        self.senpy.deactivate_all()
+
+    def request(self, texts):
+        request = Results()
+        request.entries = [Entry(nif__isString=t) for t in texts]
+        request.parameters = {}
+        return request
+
+    def test_messages(self):
+        '''Messages should keep their metadata and entries'''
+        entries = [Entry(nif__isString='hello')]
+        op, meta, payload = isolation.decode(
+            isolation.encode(isolation.PROCESS, {'activity': {'a': 1}}, parallel.pack(entries)))
+        assert op == isolation.PROCESS
+        assert meta == {'activity': {'a': 1}}
+        assert parallel.unpack(payload)[0].text == 'hello'
+        assert isolation.decode(isolation.encode(isolation.STOP))[:2] == (isolation.STOP, None)
+
+    def test_isolated(self):
+        '''Isolated plugins should be activated and run in their own processes'''
+        plugin = IsolatedPlugin()
+        self.senpy.add_plugin(plugin)
+        self.senpy.activate_plugin(plugin.name)
+        assert plugin.is_activated
+        assert not hasattr(plugin, '_activated_in')
+
+        analysis = plugin.activity({})
+        res = self.senpy.analyse(self.request([str(i) for i in range(250)]), [analysis])
+        assert [e.text for e in res.entries] == [str(i) for i in range(250)]
+        pids = set()
+        for entry in res.entries:
+            sentiment = entry.sentiments[0]
+            assert sentiment['prov:wasGeneratedBy'] == analysis.id
+            assert sentiment['activated_in'] == sentiment['pid']
+            pids.add(sentiment['pid'])
+        assert os.getpid() not in pids
+
+        with self.assertRaises(Error) as ex:
+            self.senpy.analyse(self.request(['fail']), [plugin.activity({})])
+        assert ex.exception.status == 400
+
+        self.senpy.deactivate_plugin(plugin.name)
+        assert not plugin.is_activated
+        assert plugin._proxy is None
+
+    def test_isolated_request(self):
+        '''Plugins that need the whole request should get all the entries at once'''
+        plugin = IsolatedRequestPlugin()
+        self.senpy.add_plugin(plugin)
+        self.senpy.activate_plugin(plugin.name)
+        res = self.senpy.analyse(self.request(['a', 'b', 'c']), [plugin.activity({})])
+        assert [e['senpy:total'] for e in res.entries] == [3, 3, 3]
+
+    def test_isolated_fork(self):
+        '''Forked servers should start their own workers'''
+        plugin = IsolatedPlugin()
+        self.senpy.add_plugin(plugin)
+        self.senpy.activate_plugin(plugin.name)
+        ctx = multiprocessing.get_context('fork')
+        results = ctx.Queue()
+
+        def analyse():
+            res = self.senpy.analyse(self.request(['a']), [plugin.activity({})])
+            results.put((os.getpid(), [w.process.pid for w in plugin._proxy._workers],
+                         res.entries[0].sentiments[0]['pid']))
+
+        parent = [w.process.pid for w in plugin._proxy._workers]
+        child = ctx.Process(target=analyse)
+        child.start()
+        pid, workers, used = results.get(timeout=30)
+        child.join()
+        assert pid == child.pid
+        assert used in workers
+        assert not set(workers) & set(parent)
+
+    def test_isolated_no_workers(self):
+        '''Requests should fail, instead of waiting, if no worker can be started again'''
+        plugin = FragilePlugin()
+        self.senpy.add_plugin(plugin)
+        self.senpy.activate_plugin(plugin.name)
+        plugin.broken = True
+        with self.assertRaises(Error):
+            self.senpy.analyse(self.request(['stop']), [plugin.activity({})])
+        assert not plugin._proxy._workers
+        with self.assertRaises(Error) as ex:
+            self.senpy.analyse(self.request(['a']), [plugin.activity({})])
+        assert 'There are no workers' in ex.exception.message
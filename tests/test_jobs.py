@@ -0,0 +1,100 @@
+#
+#    Copyright 2014 Grupo de Sistemas Inteligentes (GSI) DIT, UPM
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#    limitations under the License.
+#
+import os
+import shutil
+import tempfile
+import time
+
+from unittest import TestCase
+
+from senpy import api, jobs
+from senpy.extensions import Senpy
+from senpy.models import Error, Results, Entry
+
+
+def wait(manager, id, timeout=10):
+    start = time.time()
+    while time.time() - start < timeout:
+        job = manager.get(id)
+        if job.state in jobs.FINISHED:
+            return job
+        time.sleep(0.01)
+    raise Exception('The job did not finish in time')
+
+
+class JobsTest(TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        examples = os.path.join(os.path.dirname(__file__), '..', 'example-plugins')
+        self.senpy = Senpy(plugin_folder=examples, data_folder=self.folder)
+        self.senpy.activate_plugin('Dummy', sync=True)
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def request(self, texts):
+        params = api.parse_params({'algorithm': 'dummy'}, api.API_PARAMS)
+        req = Results(entries=[Entry(nif__isString=t) for t in texts])
+        req.parameters = params
+        analyses = api.parse_analyses(params, self.senpy.get_plugins(params['algorithm']))
+        return req, analyses
+
+    def test_analysis(self):
+        '''The results of a job should be stored, and read page by page'''
+        manager = jobs.JobManager(self.senpy, os.path.join(self.folder, 'jobs'))
+        job = manager.analyse(*self.request(['a', 'b', 'c']))
+        assert job.state in [jobs.QUEUED, jobs.RUNNING, jobs.DONE]
+        job = wait(manager, job.id)
+        assert job.state == jobs.DONE
+        assert job.progress == 3
+        results = manager.results(job.id)
+        assert len(results.activities) == 1
+        assert [e.text for e in results.entries] == ['a', 'b', 'c']
+        page = manager.results(job.id, page=1, page_size=2)
+        assert [e.text for e in page.entries] == ['c']
+        manager.close()
+        # Finished jobs are read from the data folder
+        other = jobs.JobManager(self.senpy, os.path.join(self.folder, 'jobs'))
+        assert other.get(job.id).state == jobs.DONE
+
+    def test_queue(self):
+        '''The queue of jobs should be bounded, and queued jobs can be cancelled'''
+        manager = jobs.JobManager(self.senpy, os.path.join(self.folder, 'jobs'),
+                                  workers=0, max_queued=1)
+        job = manager.analyse(*self.request(['a']))
+        with self.assertRaises(Error) as ex:
+            manager.analyse(*self.request(['b']))
+        assert ex.exception.status == 503
+        assert manager.cancel(job.id).state == jobs.CANCELLED
+        with self.assertRaises(Error) as ex:
+            manager.get('unknown')
+        assert ex.exception.status == 404
+
+    def test_max_entries(self):
+        manager = jobs.JobManager(self.senpy, os.path.join(self.folder, 'jobs'),
+                                  max_entries=2)
+        job = wait(manager, manager.analyse(*self.request(['a', 'b', 'c'])).id)
+        assert job.state == jobs.FAILED
+        assert 'entries' in job.message
+
+    def test_disabled(self):
+        '''Jobs should be rejected if there are no workers to run them'''
+        senpy = Senpy(plugin_folder=None, default_plugins=False, data_folder=self.folder,
+                      job_workers=0)
+        with self.assertRaises(Error) as ex:
+            senpy.jobs
+        assert ex.exception.status == 501
@@ -18,8 +18,11 @@ import logging
 
 import jsonschema
 
+import copy
 import json
+import pickle
 import rdflib
+from rdflib.compare import isomorphic
 from unittest import TestCase
 from senpy.models import (Analysis,
                           Emotion,
@@ -34,7 +37,7 @@ from senpy.models import (Analysis,
                           from_string,
                           from_dict,
                           subtypes)
-from senpy import plugins
+from senpy import plugins, serialization
 from pprint import pprint
 
 
@@ -115,6 +118,19 @@ class ModelsTest(TestCase):
         r.id = ":test_results"
         r.validate()
 
+    def test_results_activity(self):
+        '''Activities should be found by their id, even if they are added later'''
+        r = Results()
+        a1 = Analysis(id='a1')
+        r.activities.append(a1)
+        assert r.activity('a1') is a1
+        assert r.activity('a2') is None
+        a2 = Analysis(id='a2')
+        r.activities.append(a2)
+        assert r.activity('a2') is a2
+        r.activities = [a2]
+        assert r.activity('a1') is None
+
     def test_plugins(self):
         self.assertRaises(Error, plugins.Plugin)
         p = plugins.SentimentPlugin({"name": "dummy",
@@ -186,6 +202,36 @@ class ModelsTest(TestCase):
         g = rdflib.Graph().parse(data=t, format='turtle')
         assert len(g) == len(triples)
 
+    def test_rdf(self):
+        """The triples should be the same as those of the JSON-LD, and entries can be streamed"""
+        prefix = 'http://example.com/'
+        res = Results(parameters={'a': 1, 'b': True, 'c': 0.5})
+        ana = Analysis(id='prefix:analysis1')
+        res.activities.append(ana)
+        for i in range(3):
+            entry = Entry(id='prefix:entry{}'.format(i), text='Just "testing"\n{}'.format(i))
+            sentiment = Sentiment(marl__hasPolarity='marl:Positive')
+            sentiment.prov(ana)
+            entry.sentiments.append(sentiment)
+            entry.topics = ['topic', {'@id': 'prefix:topic'}]
+            res.entries.append(entry)
+        context = [res._context, {'prefix': prefix, '@base': prefix}]
+        expected = rdflib.Graph().parse(data=res.dumps(prefix=prefix), format='json-ld',
+                                        context=context)
+        for fmt, parser in [('turtle', 'turtle'), ('ntriples', 'nt')]:
+            g = rdflib.Graph().parse(data=res.serialize(format=fmt, prefix=prefix),
+                                     format=parser)
+            assert isomorphic(g, expected)
+
+        entries = res.entries
+        res.entries = []
+        chunks = list(res.rdf(format='ntriples', prefix=prefix, entries=iter(entries)))
+        # One chunk per entry
+        assert len([chunk for chunk in chunks if 'entry' in chunk]) == 3
+        assert 'entry2' in chunks[-1]
+        g = rdflib.Graph().parse(data=''.join(chunks), format='nt')
+        assert isomorphic(g, expected)
+
     def test_plugin_list(self):
         """The plugin list should be of type \"plugins\""""
         plugs = Plugins()
@@ -260,3 +306,54 @@ class ModelsTest(TestCase):
                     '{% endfor %}')
         res = r.serialize(template=template)
         assert res == 'TESTING THE TEMPLATE,Positive'
+
+    def test_compact(self):
+        '''Fields in slots should be accessed as items and attributes, like the rest'''
+        e = Entry(text='compact', extra=1)
+        assert '_slot0' in Entry.__slots__
+        assert 'nif:isString' not in e.__dict__
+        assert e.text == e.nif__isString == e['nif:isString'] == 'compact'
+        assert e['extra'] == e.extra == 1
+        assert set(e) == {'@type', 'nif:isString', 'marl:hasOpinion', 'onyx:hasEmotionSet',
+                          'extra'}
+        assert '@id' not in e
+        assert 'prov:wasGeneratedBy' not in Sentiment()
+        with self.assertRaises(AttributeError):
+            Sentiment().polarity
+        e['text'] = 'changed'
+        assert e.serializable()['nif:isString'] == 'changed'
+        del e['nif:isString']
+        assert 'nif:isString' not in e
+        assert not hasattr(e, 'text')
+        e.text = 'again'
+        e.sentiments.append(Sentiment(polarity='marl:Positive'))
+        assert Entry().sentiments == []
+        c = copy.copy(e)
+        assert c == e
+        assert c.sentiments is e.sentiments
+        p = pickle.loads(pickle.dumps(e))
+        assert p.serializable() == e.serializable()
+        assert p.sentiments[0].polarity == 'marl:Positive'
+
+    def test_dumps(self):
+        '''The fast serializer should give the same JSON-LD as serializable'''
+        r = Results(id='test')
+        e = Entry(nif__isString='dumps', tags=set(['a']), counts={1: 2})
+        e.sentiments.append(Sentiment(polarity='marl:Positive'))
+        r.entries.append(e)
+        expected = r.jsonld(with_context=True)
+        expected['entries'][0]['counts'] = {'1': 2}
+        pretty = json.dumps(r.jsonld(with_context=True), indent=2, sort_keys=True,
+                            default=list)
+        assert r.dumps(with_context=True, backend='json') == pretty
+        for backend in ['json', 'orjson']:
+            if backend == 'orjson' and serialization.orjson is None:
+                continue
+            for compact in [True, False]:
+                res = r.dumps(with_context=True, compact=compact, backend=backend)
+                assert json.loads(res) == expected
+                assert ('\n' not in res) == compact
+        terse = json.loads(r.dumps(verbose=False, compact=True))
+        assert terse == json.loads(json.dumps(r.jsonld(verbose=False), default=list))
+        lines = list(r.ndjson(compact=True))
+        assert json.loads(lines[1]) == json.loads(json.dumps(e.jsonld(), default=list))
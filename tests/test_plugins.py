@@ -21,10 +21,11 @@ import os
 import pickle
 import shutil
 import tempfile
+import threading
 
 from unittest import TestCase, skipIf
 from senpy.models import Results, Entry, EmotionSet, Emotion, Plugins
-from senpy import plugins
+from senpy import plugins, batching
 from senpy.plugins.postprocessing.emotion.centroids import CentroidConversion
 from senpy.gsitk_compat import GSITK_AVAILABLE
 from senpy import config
@@ -104,6 +105,33 @@ class PluginsTest(TestCase):
             res = list(plugins.pfilter(ps.plugins, plugin_type=name))
             assert len(res) == num
 
+    def test_plugin_registry(self):
+        registry = plugins.PluginRegistry()
+        for i in (plugins.SentimentPlugin,
+                  plugins.EmotionPlugin,
+                  plugins.Analyser):
+            p = i(name='Plugin_{}'.format(i.__name__),
+                  description='TEST',
+                  version=0,
+                  author='NOBODY')
+            registry.add(p)
+        cases = [('AnalysisPlugin', 3),
+                 ('SentimentPlugin', 1),
+                 (plugins.EmotionPlugin, 1)]
+
+        for name, num in cases:
+            assert len(registry.filter(plugin_type=name)) == num
+            assert not registry.filter(plugin_type=name, is_activated=True)
+        sentiment = registry['plugin_sentimentplugin']
+        assert registry.by_id(sentiment.id) is sentiment
+        assert registry.filter(name='Plugin_SentimentPlugin') == [sentiment]
+        sentiment._activate()
+        registry.update(sentiment)
+        assert registry.filter(plugin_type='AnalysisPlugin', is_activated=True) == [sentiment]
+        registry.remove(sentiment)
+        assert 'plugin_sentimentplugin' not in registry
+        assert not registry.filter(plugin_type='SentimentPlugin')
+
     def test_shelf(self):
         ''' A shelf is created and the value is stored '''
         newfile = self.shelf_file + "new"
@@ -254,6 +282,197 @@ class PluginsTest(TestCase):
 
         MyBox().test()
 
+    def test_box_windows(self):
+        '''Boxes should get their entries in bounded windows'''
+
+        class WindowBox(plugins.Box):
+            ''' Vague description'''
+
+            author = 'me'
+            version = 0
+            window_size = 2
+            batches = []
+
+            def predict_many(self, features, **kwargs):
+                self.batches.append(len(features))
+                return features
+
+        box = WindowBox()
+        entries = (Entry(nif__isString=str(i)) for i in range(5))
+        res = list(box.process_entries(entries, box.activity()))
+        assert len(res) == 5
+        assert box.batches == [2, 2, 1]
+
+    def test_box_batching(self):
+        '''Boxes with batching should share predictions between concurrent requests'''
+
+        class BatchBox(plugins.Box):
+            ''' Vague description'''
+
+            author = 'me'
+            version = 0
+            batching = {'max_wait': 0.5, 'max_batch_size': 4}
+            batches = []
+
+            def predict_many(self, features, **kwargs):
+                self.batches.append(len(features))
+                return [f.text.upper() for f in features]
+
+            def to_entry(self, features, entry=None, **kwargs):
+                entry.text = features
+                return entry
+
+        box = BatchBox()
+        activity = box.activity()
+        results = {}
+
+        def run(text):
+            entries = [Entry(nif__isString=text)]
+            results[text] = list(box.process_entries(entries, activity))[0].text
+
+        threads = [threading.Thread(target=run, args=(t, )) for t in 'abcd']
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        box._deactivate()
+        assert results == {'a': 'A', 'b': 'B', 'c': 'C', 'd': 'D'}
+        assert sum(box.batches) == 4
+        assert len(box.batches) < 4
+
+        scheduler = batching.BatchScheduler(box, max_batch_size=100, target_latency=1)
+        scheduler._tune(10, 0.5)
+        assert scheduler.batch_size == 20
+
+    def test_snapshot(self):
+        '''The state of a plugin should be restored from a snapshot, until its sources change'''
+        source = os.path.join(self.shelf_dir, 'source.txt')
+        with open(source, 'w') as f:
+            f.write('hello')
+        calls = []
+
+        class SnapshotPlugin(plugins.Analyser):
+            '''Reads its state from a file'''
+            author = 'nobody'
+            version = 0
+            snapshot_attributes = ['_text']
+            snapshot_sources = [source]
+
+            def activate(self):
+                calls.append('activate')
+                with open(source) as f:
+                    self._text = f.read()
+
+            def restore(self):
+                calls.append('restore')
+
+        def activated(**kwargs):
+            plugin = SnapshotPlugin(data_folder=self.shelf_dir, **kwargs)
+            plugin._activate()
+            return plugin
+
+        assert activated()._text == 'hello'
+        assert os.path.isfile(os.path.join(self.shelf_dir, 'snapshotplugin.snapshot'))
+        assert activated()._text == 'hello'
+        assert calls == ['activate', 'restore']
+        with open(source, 'w') as f:
+            f.write('bye')
+        assert activated()._text == 'bye'
+        assert activated(version=1)._text == 'bye'
+        assert calls == ['activate', 'restore', 'activate', 'activate']
+        with open(os.path.join(self.shelf_dir, 'snapshotplugin.snapshot'), 'wb') as f:
+            f.write(b'corrupted')
+        assert activated(version=1)._text == 'bye'
+        assert calls[-1] == 'activate'
+
+    def test_lexicon(self):
+        '''Lexicons should be compiled once, and shared through a memory-mapped file'''
+        source = os.path.join(self.shelf_dir, 'lexicon.tsv')
+        with open(source, 'w') as f:
+            f.write('happy\t0.9\t0.2\nsad\t0.1\t0.3\ncafé\t0.5\t0.4\nhappy\t1.0\t0.5\n')
+        calls = []
+
+        def read():
+            calls.append(1)
+            with open(source) as f:
+                for line in f:
+                    word, valence, arousal = line.strip().split('\t')
+                    yield word, [float(valence), float(arousal)]
+
+        plugin = ShelfDummyPlugin(data_folder=self.shelf_dir)
+        lexicon = plugin.load_lexicon('test.lex', ['V', 'A'], read, sources=[source])
+        assert list(lexicon) == ['café', 'happy', 'sad']
+        assert lexicon['happy'] == {'V': 1.0, 'A': 0.5}
+        assert lexicon.value('café', 'A') == 0.4
+        assert lexicon.get('angry') is None
+        assert 'sad' in lexicon and 'angry' not in lexicon
+        assert lexicon.view('V')['sad'] == 0.1
+        assert list(lexicon.column('A')) == [0.4, 0.5, 0.3]
+
+        again = plugin.load_lexicon('test.lex', ['V', 'A'], read, sources=[source])
+        assert len(calls) == 1
+        assert again.path == lexicon.path == os.path.join(self.shelf_dir, 'test.lex')
+        with self.assertRaises(KeyError):
+            again['angry']
+
+    def test_lexicon_fallback(self):
+        '''Lexicons that cannot be written in the data folder should be compiled only once'''
+        folder = os.path.join(self.shelf_dir, 'not-a-folder')
+        with open(folder, 'w') as f:
+            f.write('')
+        calls = []
+
+        def read():
+            calls.append(1)
+            return [('happy', [1.0])]
+
+        fname = 'fallback-{}.lex'.format(os.getpid())
+        plugin = ShelfDummyPlugin(data_folder=folder)
+        lexicon = plugin.load_lexicon(fname, ['V'], read)
+        self.addCleanup(os.remove, lexicon.path)
+        assert lexicon.path.startswith(tempfile.gettempdir())
+        again = plugin.load_lexicon(fname, ['V'], read)
+        assert again.path == lexicon.path
+        assert len(calls) == 1
+
+        def broken():
+            raise IOError('Missing source')
+
+        with self.assertRaises(IOError):
+            plugin.load_lexicon('broken-' + fname, ['V'], broken)
+
+    def test_sklearnbox(self):
+        '''Sklearn boxes should map the predictions of their estimator to their classes'''
+        from sklearn.dummy import DummyClassifier
+        import joblib
+
+        estimator = DummyClassifier(strategy='prior')
+        estimator.fit(['a', 'b', 'c', 'd'], [1, 1, 1, -1])
+
+        class SklearnSentiment(plugins.SklearnBox, plugins.SentimentBox):
+            ''' Vague description'''
+
+            author = 'me'
+            version = 0
+            labels = {1: 'marl:Positive', -1: 'marl:Negative'}
+            model_file = 'model.joblib'
+
+        folder = tempfile.mkdtemp()
+        try:
+            joblib.dump(estimator, os.path.join(folder, 'model.joblib'))
+            box = SklearnSentiment(data_folder=folder)
+            assert box.estimator.classes_.tolist() == [-1, 1]
+            results = box.predict_many(['a', 'b'])
+            assert results.tolist() == [[1, 0, 0], [1, 0, 0]]
+            box.probabilities = True
+            results = box.predict_many(['a'])
+            assert results.tolist() == [[0.75, 0, 0.25]]
+            box.probabilities = False
+            entries = list(box.process_entries([Entry(nif__isString='a')], box.activity()))
+            assert entries[0].sentiments[0]['marl:hasPolarity'] == 'marl:Positive'
+        finally:
+            shutil.rmtree(folder)
+
     def test_sentimentbox(self):
 
         class SentimentBox(plugins.SentimentBox):
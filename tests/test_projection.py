@@ -0,0 +1,79 @@
+#
+#    Copyright 2014 Grupo de Sistemas Inteligentes (GSI) DIT, UPM
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#    limitations under the License.
+#
+import jmespath
+
+from unittest import TestCase
+
+from senpy import projection
+from senpy.models import Analysis, Results, Entry, Sentiment
+
+
+class ProjectionTest(TestCase):
+
+    def setUp(self):
+        projection.clear()
+        self.results = Results()
+        for text in ['a', 'b', 'c']:
+            self.results.entries.append(Entry(nif__isString=text))
+
+    def test_compiled_once(self):
+        '''Templates and expressions should only be compiled the first time they are used'''
+        template = '{% for e in entries %}{{ e["nif:isString"] }}{% endfor %}'
+        for _ in range(3):
+            assert projection.render(template, self.results) == 'abc'
+            assert projection.search('entries[]."nif:isString"',
+                                     self.results.jsonld()) == ['a', 'b', 'c']
+        assert projection.compile_template(template) is projection.compile_template(template)
+        assert projection.compile_template.cache_info().misses == 1
+        assert projection.compile_fields.cache_info().misses == 1
+
+    def test_generate(self):
+        '''Templates can be rendered piece by piece'''
+        template = '{% for e in entries %}{{ e["nif:isString"] }}\n{% endfor %}'
+        chunks = list(projection.generate(template, self.results))
+        assert len(chunks) > 1
+        assert ''.join(chunks) == 'a\nb\nc\n'
+
+    def test_sandbox(self):
+        '''Templates should not be able to reach private attributes'''
+        template = '{{ entries[0]._slot0 }}|{{ entries[0].__class__ }}'
+        assert projection.render(template, self.results) == '|'
+
+    def test_required(self):
+        '''Expressions should only need the keys that they can reach'''
+        assert projection.required('entries[]."marl:hasOpinion"[0]."marl:hasPolarity"') == {
+            'entries': {'marl:hasOpinion': {'marl:hasPolarity': projection.ALL}}}
+        assert projection.required('entries[?x == `1`].{a: y}') == {
+            'entries': {'x': projection.ALL, 'y': projection.ALL}}
+        assert projection.required('length(entries)') == {'entries': projection.ALL}
+        assert projection.required('@') is projection.ALL
+
+    def test_project(self):
+        '''Only the required keys should be copied, and the results should not change'''
+        self.results.activities.append(Analysis(id='prefix:analysis'))
+        for entry in self.results.entries:
+            sentiment = Sentiment(marl__hasPolarity='marl:Positive')
+            sentiment.prov(self.results.activities[0])
+            entry.sentiments.append(sentiment)
+        fields = 'entries[]."marl:hasOpinion"[0]."marl:hasPolarity"'
+        projected = projection.project(self.results, projection.required(fields))
+        assert projected == {'entries': [{'marl:hasOpinion': [
+            {'marl:hasPolarity': 'marl:Positive'}]}] * 3}
+        for fields in [fields, 'activities[0]."@id"', 'entries[?"nif:isString" == `"b"`]',
+                       'keys(entries[0])', 'entries[].{text: "nif:isString"}']:
+            for verbose in [True, False]:
+                expected = jmespath.search(fields, self.results.jsonld(verbose=verbose))
+                assert projection.search(fields, self.results, verbose=verbose) == expected
@@ -0,0 +1,131 @@
+#
+#    Copyright 2014 Grupo de Sistemas Inteligentes (GSI) DIT, UPM
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#    limitations under the License.
+#
+import shutil
+import tempfile
+import threading
+import time
+
+from unittest import TestCase
+
+from senpy import api, plugins
+from senpy.extensions import Senpy
+from senpy.models import Results, Entry
+
+
+class SlowPlugin(plugins.Analyser, plugins.ShelfMixin):
+    '''Takes a while to activate'''
+    author = 'nobody'
+    version = 0
+    only_annotates = True
+
+    def activate(self):
+        time.sleep(0.05)
+        self.sh['activations'] = self.sh.get('activations', 0) + 1
+
+    def save(self, ignore_errors=False):
+        self.saved = True
+
+    def analyse_entry(self, entry, activity):
+        yield entry
+
+
+class HeavyPlugin(SlowPlugin):
+    '''Uses a lot of memory'''
+
+
+class ResidencyTest(TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.senpy = Senpy(plugin_folder=None, data_folder=self.folder, lazy=True)
+        self.slow = SlowPlugin(data_folder=self.folder)
+        self.heavy = HeavyPlugin(data_folder=self.folder)
+        self.senpy.add_plugin(self.slow)
+        self.senpy.add_plugin(self.heavy)
+        self.senpy.activate_all()
+
+    def tearDown(self):
+        self.senpy.deactivate_all()
+        shutil.rmtree(self.folder)
+
+    def analyse(self, name):
+        params = api.parse_params({'algorithm': name}, api.API_PARAMS)
+        request = Results(entries=[Entry(nif__isString='hello')])
+        request.parameters = params
+        return self.senpy.analyse(request)
+
+    def test_lazy(self):
+        '''Plugins should be activated once, by the first request that uses them'''
+        assert not self.slow.is_activated
+        assert self.senpy.plugins(plugin_type='emotionConversion')
+        threads = [threading.Thread(target=self.analyse, args=('slowplugin', ))
+                   for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert self.slow.is_activated
+        assert self.slow.sh['activations'] == 1
+        assert not self.heavy.is_activated
+
+    def test_idle(self):
+        '''Idle plugins should be saved and deactivated, unless they are being used'''
+        manager = self.senpy.residency
+        manager.idle_timeout = 10
+        self.analyse('slowplugin')
+        assert not manager.enforce()
+        with manager.using([self.slow]):
+            assert not manager.enforce(now=time.monotonic() + 20)
+        assert manager.enforce(now=time.monotonic() + 20) == [self.slow]
+        assert not self.slow.is_activated
+        assert self.slow.saved
+        self.analyse('slowplugin')
+        assert self.slow.is_activated
+
+    def test_discarded_stream(self):
+        '''Streams that are never consumed should not keep their plugins in use'''
+        manager = self.senpy.residency
+        manager.idle_timeout = 10
+        params = api.parse_params({'algorithm': 'slowplugin'}, api.API_PARAMS)
+        request = Results(entries=[Entry(nif__isString='hello')])
+        request.parameters = params
+        stream = self.senpy.stream(request)
+        assert self.slow.is_activated
+        assert not manager.enforce(now=time.monotonic() + 20)
+        del stream
+        assert manager.enforce(now=time.monotonic() + 20) == [self.slow]
+
+        request.parameters = params
+        stream = self.senpy.stream(request)
+        stream.close()
+        stream.close()
+        assert not manager._users
+
+    def test_memory_budget(self):
+        '''The least recently used plugins should be deactivated to stay within the budget'''
+        manager = self.senpy.residency
+        self.analyse('slowplugin')
+        self.analyse('heavyplugin')
+        self.slow.activation_memory = 100
+        self.heavy.activation_memory = 100
+        manager.memory_budget = 150
+        assert manager.enforce() == [self.slow]
+        assert self.heavy.is_activated
+        self.analyse('slowplugin')
+        assert self.slow.is_activated
+        self.slow.activation_memory = 100
+        assert manager.enforce() == [self.heavy]
+        assert manager.evictions == 2
@@ -0,0 +1,75 @@
+#
+#    Copyright 2014 Grupo de Sistemas Inteligentes (GSI) DIT, UPM
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#    limitations under the License.
+#
+import json
+import multiprocessing
+import os
+import signal
+import socket
+import time
+
+from urllib.request import urlopen
+from unittest import TestCase, skipIf
+
+from flask import Flask
+
+from senpy import parallel, server
+from senpy.extensions import Senpy
+
+
+def free_port():
+    sock = socket.socket()
+    sock.bind(('127.0.0.1', 0))
+    port = sock.getsockname()[1]
+    sock.close()
+    return port
+
+
+def get(url, timeout=10):
+    start = time.time()
+    while True:
+        try:
+            with urlopen(url, timeout=timeout) as response:
+                return json.loads(response.read().decode('utf-8'))
+        except OSError:
+            if time.time() - start > timeout:
+                raise
+            time.sleep(0.1)
+
+
+@skipIf(not parallel.available(), 'Processes cannot be forked in this platform')
+class ServerTest(TestCase):
+
+    def test_workers(self):
+        '''The workers should serve the plugins activated in the master, and stop with it'''
+        examples = os.path.join(os.path.dirname(__file__), '..', 'example-plugins')
+        app = Flask('test_server')
+        senpy = Senpy(app=app, plugin_folder=examples)
+        senpy.activate_plugin('Dummy', sync=True)
+        port = free_port()
+
+        master = multiprocessing.get_context('fork').Process(
+            target=server.serve, args=(app, '127.0.0.1', port, 2))
+        master.start()
+        try:
+            url = 'http://127.0.0.1:{}/api/?algo=dummy&i=hello'.format(port)
+            for _ in range(4):
+                res = get(url)
+                assert res['entries'][0]['nif:isString'] == 'olleh'
+        finally:
+            os.kill(master.pid, signal.SIGTERM)
+            master.join(10)
+        assert not master.is_alive()
+        assert master.exitcode == 0